@@ -7,10 +7,30 @@ import sys
 # 添加 backend 目录到 Python 路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
-# 导入并启动应用
-from app import app
-
 if __name__ == "__main__":
     # 魔搭社区创空间需要监听 7860 端口
     port = int(os.getenv("PORT", 7860))
-    app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
+    debug = os.getenv("FLASK_DEBUG", "False").lower() == "true"
+
+    # 生产环境优先使用 gunicorn（Windows 和调试模式下回退到 Flask 开发服务器）
+    # 在导入后端之前 exec，避免加载一遍存储后又被丢弃
+    if not debug and os.name != "nt":
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            root = os.path.dirname(os.path.abspath(__file__))
+            os.chdir(root)
+            os.environ.setdefault("PORT", str(port))
+            os.execvp(sys.executable, [
+                sys.executable, "-m", "gunicorn",
+                "-c", os.path.join(root, "gunicorn.conf.py"),
+                "wsgi:app",
+            ])
+
+# 导入并启动应用
+from app import app  # noqa: E402
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=port, debug=debug)
@@ -1,13 +1,40 @@
 import os
 import json
-import pickle
+import time
+import hmac
+import logging
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import numpy as np
 from pathlib import Path
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, g, has_request_context
 from flask_cors import CORS
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from storage import IdeaStore, with_embedding
+from shared_index import SharedEmbeddingIndex
+from chunk_index import ChunkIndex
+from embedding_cache import EmbeddingCache
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
+from bm25_index import BM25Index
+from entity_index import EntityIndex
+from entity_resolution import EntityResolver
+from graph_index import GraphIndex, GRAPH_MAX_HOPS
+from communities import CommunityIndex
+from upstream import InstrumentedClient, upstream_status
+from cassette import Cassette, CassettePlayer, CassetteRecorder, CASSETTE_MODE, CASSETTE_LATENCY_SCALE
+from tracing import traced, current_span
+from token_budget import ContextBudget, RAG_CONTEXT_TOKENS, context_budget, estimate_tokens
+from profiling import Profiler
+from memory_stats import TracemallocSession, store_breakdown, process_memory
+from logging_config import configure_logging, request_id_var, new_request_id, should_log_body, body_preview
+import logging_config
+import metrics
+import tracing
+
 # Load environment variables from multiple possible locations
 # Priority: 1. System env vars (production) 2. Local .env files (development)
 load_dotenv()  # Load from backend/.env (if exists)
@@ -17,29 +44,177 @@ load_dotenv("../config/.env")  # Load from config/.env (project standard locatio
 # 配置静态文件目录（Docker 环境中前端构建产物在 /app/dist）
 DIST_DIR = Path(__file__).parent.parent / "dist"
 
+logger = configure_logging()
+
 app = Flask(__name__, static_folder=str(DIST_DIR), static_url_path='')
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+CORS(app, resources={r"/api/*": {"origins": "*", "expose_headers": ["X-Request-ID"]}})
 
 # Add request logging
 @app.before_request
 def log_request():
-    print(f"[{request.method}] {request.path}")
-    # Only log JSON body for POST requests with JSON content
-    if request.is_json and request.json:
-        print(f"Body: {str(request.json)[:200]}...")
+    g.request_start = time.perf_counter()
+    # Reuse the caller's id (proxy / frontend) so logs can be correlated end to end
+    g.request_id = (request.headers.get("X-Request-ID") or new_request_id())[:64]
+    request_id_var.set(g.request_id)
+    g.trace = tracing.start_trace(f"{request.method} {request.path}", request.headers.get("traceparent"),
+                                  request_id=g.request_id)
+    if profiler.armed:  # the only profiling cost while nothing is armed
+        g.profile = profiler.start(request.endpoint, request.path)
+    # Sampled, and logged from the raw bytes: the view parses the JSON itself
+    if request.content_length and logger.isEnabledFor(logging.DEBUG) and should_log_body():
+        logger.debug("Body: %s...", body_preview(request.get_data(cache=True)))
 
 @app.after_request
 def log_response(response):
-    print(f"Response: {response.status}")
+    response.headers["X-Request-ID"] = g.get("request_id", "-")
+    trace = g.get("trace")
+    if trace is not None:
+        response.headers["X-Trace-Id"] = trace.trace_id
+        trace.set(route=_route(), status=response.status_code)
+    record_request(response.status_code)
     return response
 
-# Vector Database Storage (use backend/data directory)
+@app.teardown_request
+def reset_request_id(exc):
+    profile = g.pop("profile", None)
+    if profile is not None:
+        logger.info("Profile written: %s", profiler.stop(profile).name)
+    trace = g.pop("trace", None)
+    if trace is not None:
+        if exc is not None:
+            trace.error = f"{type(exc).__name__}: {exc}"
+        tracing.finish_trace(trace)
+    # Worker threads are reused; don't leak the id into later log lines
+    request_id_var.set("-")
+
+
+def _route():
+    return request.endpoint or "unmatched"
+
+
+def record_request(status_code):
+    """Count the current request and record its total latency"""
+    route = _route()
+    metrics.requests_total.inc(route=route, method=request.method, status=status_code)
+    if status_code >= 500:
+        metrics.request_errors_total.inc(route=route)
+    start = g.get("request_start")
+    if start is not None:
+        duration = time.perf_counter() - start
+        metrics.request_duration.observe(duration, route=route)
+        logger.info("%s %s %s", request.method, request.path, status_code,
+                    extra={"route": route, "status": status_code, "duration_ms": round(duration * 1000, 1)})
+    metrics.registry.maybe_dump()
+
+
+@contextmanager
+def stage(name):
+    """Time one stage (LLM call, DB write, ...) of the current route as a span and a histogram sample"""
+    with tracing.span(name) as stage_span:
+        yield stage_span
+    metrics.observe_stage(_route() if has_request_context() else "background", name, stage_span.duration)
+
+# Vector Database Storage (backend/data unless IDEAGRAPH_DATA_DIR is set, e.g. for load tests)
 BACKEND_DIR = Path(__file__).parent
-DATA_DIR = BACKEND_DIR / "data"
-DATA_DIR.mkdir(exist_ok=True)
+DATA_DIR = Path(os.getenv("IDEAGRAPH_DATA_DIR") or BACKEND_DIR / "data")
+DATA_DIR.mkdir(parents=True, exist_ok=True)
 VECTOR_DB_PATH = DATA_DIR / "vector_db.pkl"
 IDEAS_DB_PATH = DATA_DIR / "ideas_db.pkl"
 
+store = None
+embedding_index = None
+chunk_index = None
+keyword_index = None
+bm25_index = None
+entity_index = None
+entity_resolver = None
+graph_index = None
+community_index = None
+
+def init_storage(data_dir):
+    """Create the idea store and its indexes for data_dir (tests point this at a temp dir)"""
+    global store, embedding_index, chunk_index, keyword_index, bm25_index, entity_index, entity_resolver, graph_index, \
+        community_index
+    # Shared by all requests; safe to use from several worker processes
+    store = IdeaStore(data_dir)
+    # Embedding matrix memory-mapped once for all worker processes
+    embedding_index = SharedEmbeddingIndex(store, Path(data_dir) / "index")
+    # Passages of each idea's content, embedded in the background after saves
+    chunk_index = ChunkIndex(Path(data_dir) / "chunks", embed_batch, idea_content)
+    # Graph nodes of all ideas by entity name and type (/api/entities)
+    entity_index = EntityIndex(store)
+    # Entity names (through entity_index), tags and summaries for keyword retrieval (per process, updated on every change)
+    keyword_index = KeywordIndex(store, entity_index)
+    # Inverted index for exact-term search (/api/search)
+    bm25_index = BM25Index(store)
+    # Entities merged across ideas into one global graph, resolved in the background (/api/graph/global)
+    entity_resolver = EntityResolver(store, Path(data_dir) / "entities", embed_batch)
+    # Lineage links and shared entities between ideas, for multi-hop chat retrieval
+    graph_index = GraphIndex(store, entity_resolver)
+    # Clusters of related ideas with LLM summaries, for global questions (/api/communities)
+    community_index = CommunityIndex(store, graph_index, embedding_index, Path(data_dir) / "communities",
+                                     summarize_community)
+    # Databases from older versions stored every embedding twice
+    migrated = store.migrate()
+    if migrated:
+        logger.info("Removed duplicated embeddings from %d stored ideas", migrated)
+
+def embed_batch(texts):
+    """Embeddings for a batch of passages or entity names (called from background indexer threads)"""
+    if not embedding_client:
+        raise RuntimeError("Embedding API not configured")
+    with stage("batch_embedding_call"):
+        response = embedding_client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    return [item.embedding for item in response.data]
+
+def summarize_community(ideas):
+    """Title, summary and themes of a community from its most central ideas (called from the detector thread)"""
+    if not llm_client:
+        raise RuntimeError("LLM API not configured")
+    lines = []
+    for idea in ideas:
+        distilled = idea.get('distilled_data', {})
+        lines.append(f"- {distilled.get('one_liner', 'Untitled')} [{', '.join(distilled.get('tags', []))}]: "
+                     f"{distilled.get('summary', '')[:300]}")
+    result = llm_json("community_llm_call", COMMUNITY_SUMMARY_PROMPT,
+                      "Summarize this community of ideas:\n\n" + "\n".join(lines))
+    themes = result.get("themes")
+    return {
+        "title": str(result.get("title") or "Untitled"),
+        "summary": str(result.get("summary") or ""),
+        "themes": [t for t in themes if isinstance(t, str)] if isinstance(themes, list) else [],
+    }
+
+def idea_content(idea_id):
+    """Current raw content of an idea, or None if it was deleted"""
+    idea = store.get(idea_id)
+    return None if idea is None else idea.get('content_raw', '')
+
+init_storage(DATA_DIR)
+
+# Armed through /api/debug/profile; created before gunicorn forks so all workers share it
+profiler = Profiler(DATA_DIR / "profiles")
+memory_tracer = TracemallocSession(DATA_DIR / "profiles")
+
+# Reported by /api/health/live
+PROCESS_STARTED_AT = time.time()
+
+# Token for the /api/debug/* admin endpoints (disabled when unset)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def admin_required(view):
+    """Only allow requests carrying the ADMIN_TOKEN in the X-Admin-Token header"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled. Set ADMIN_TOKEN to enable them"}), 403
+        token = request.headers.get("X-Admin-Token", "")
+        if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({"error": "Invalid admin token"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
 # Get API configuration
 LLM_API_KEY = os.getenv("LLM_API_KEY")
 LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.openai.com/v1")
@@ -49,30 +224,53 @@ EMBEDDING_API_KEY = os.getenv("EMBEDDING_API_KEY") or LLM_API_KEY
 EMBEDDING_BASE_URL = os.getenv("EMBEDDING_BASE_URL") or LLM_BASE_URL
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
+# Optional record / replay of upstream traffic (see cassette.py)
+CASSETTE_PATH = Path(os.getenv("CASSETTE_PATH") or DATA_DIR / "cassettes" / "upstream.jsonl")
+upstream_cassette = Cassette(CASSETTE_PATH) if CASSETTE_MODE in ("record", "replay") else None
+
 # Check if API key is configured
-if not LLM_API_KEY:
-    print("=" * 60)
-    print("⚠️  WARNING: LLM_API_KEY not configured!")
-    print("=" * 60)
-    print("Please create backend/.env or .env.local with your API key:")
-    print("  LLM_API_KEY=your_api_key_here")
-    print("  LLM_BASE_URL=https://api.openai.com/v1")
-    print("=" * 60)
+if not LLM_API_KEY and CASSETTE_MODE != "replay":
+    logger.warning("LLM_API_KEY not configured! Create config/.env (or backend/.env) with LLM_API_KEY=... and LLM_BASE_URL=https://api.openai.com/v1")
 
 # Initialize OpenAI-compatible clients
 llm_client = None
 embedding_client = None
 
-if LLM_API_KEY:
-    llm_client = OpenAI(
-        api_key=LLM_API_KEY,
-        base_url=LLM_BASE_URL
-    )
-    
-    embedding_client = OpenAI(
-        api_key=EMBEDDING_API_KEY,
-        base_url=EMBEDDING_BASE_URL
-    )
+def upstream_client(api_key, base_url, provider):
+    """
+    OpenAI-compatible client for one provider.
+
+    Wrapped so every upstream call records latency, errors and token usage;
+    recorded to or replayed from the cassette when CASSETTE_MODE is set.
+    """
+    if CASSETTE_MODE == "replay":
+        return InstrumentedClient(CassettePlayer(upstream_cassette, provider, CASSETTE_LATENCY_SCALE), provider=provider)
+    client = OpenAI(api_key=api_key, base_url=base_url)
+    if CASSETTE_MODE == "record":
+        client = CassetteRecorder(client, upstream_cassette, provider)
+    return InstrumentedClient(client, provider=provider)
+
+if LLM_API_KEY or CASSETTE_MODE == "replay":
+    llm_client = upstream_client(LLM_API_KEY, LLM_BASE_URL, "llm")
+    embedding_client = upstream_client(EMBEDDING_API_KEY, EMBEDDING_BASE_URL, "embedding")
+    if upstream_cassette is not None:
+        logger.info("Upstream calls %s cassette %s", "replayed from" if CASSETTE_MODE == "replay" else "recorded to", CASSETTE_PATH)
+
+# Store gauges are read at scrape time (store may be swapped by init_storage)
+metrics.registry.gauge("ideagraph_store_ideas", "Ideas in the store", lambda: store.count())
+metrics.registry.gauge("ideagraph_store_version", "Store commit sequence number", lambda: store.version)
+metrics.registry.gauge("ideagraph_index_rows", "Rows in the mapped embedding index",
+                       lambda: embedding_index.stats()["rows"])
+metrics.registry.gauge("ideagraph_index_pending_changes", "Ideas changed since the mapped index generation",
+                       lambda: embedding_index.stats()["pending_changes"])
+metrics.registry.gauge("ideagraph_chunks", "Indexed passages of idea content",
+                       lambda: chunk_index.stats()["chunks"])
+metrics.registry.gauge("ideagraph_canonical_entities", "Entities in the resolved global graph",
+                       lambda: entity_resolver.status()["canonical_entities"])
+metrics.registry.gauge("ideagraph_communities", "Detected communities of related ideas",
+                       lambda: community_index.status()["communities"])
+metrics.registry.gauge("ideagraph_process_resident_bytes", "Resident set size of the worker serving the scrape",
+                       lambda: process_memory().get("vmrss", 0))
 
 # Valid entity and relation types
 VALID_ENTITY_TYPES = {"Concept", "Tool", "Person", "Problem", "Solution", "Methodology", "Metric"}
@@ -146,6 +344,9 @@ If the user's input significantly changes the idea, explicitly suggest an update
 {context_data}
 """
 
+# Size of the chat prompt without its context (counted against the context window)
+CHAT_PROMPT_TOKENS = estimate_tokens(CHAT_SYSTEM_PROMPT)
+
 SYSTEM_PROMPT_KEYWORDS = """
 ---Role---
 You are a retrieval specialist for a personal knowledge base.
@@ -160,8 +361,52 @@ Extract keywords to find relevant notes and ideas in the user's database.
 JSON object with `high_level_keywords` and `low_level_keywords`.
 """
 
+COMMUNITY_SUMMARY_PROMPT = """
+---Role---
+You are an analyst of a personal knowledge base.
+
+---Goal---
+Describe what a group of related ideas is about, as a whole.
+
+---Instructions---
+* Write in the language the ideas are written in.
+* `title`: a short name for the group (max 8 words).
+* `summary`: 2-4 sentences on the group's shared theme, its main threads and how the ideas relate.
+* `themes`: 3-5 recurring themes.
+
+---Output Format---
+JSON object with `title`, `summary` and `themes`.
+"""
+
+GLOBAL_MAP_PROMPT = """
+---Role---
+You are helping answer a question about the user's whole knowledge base, one group of ideas at a time.
+
+---Goal---
+List the points of the given group summary that help answer the question.
+
+---Instructions---
+* Use only the group summary; do not invent facts.
+* Give each point a `score` from 0 (irrelevant) to 100 (essential to the answer).
+* Return an empty list if the group is not relevant.
+
+---Output Format---
+JSON object with `points`: [{"description": "...", "score": 80}].
+"""
+
 # ============ Validation Functions ============
 
+def parse_llm_json(text):
+    """JSON object from an LLM reply, with or without a markdown code block around it"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        for fence in ("```json", "```"):
+            if fence in text:
+                start = text.find(fence) + len(fence)
+                return json.loads(text[start:text.find("```", start)].strip())
+        raise
+
 def truncate_one_liner(text, max_words=20):
     """Truncate one-liner to max_words at word boundary"""
     words = text.split()
@@ -197,7 +442,7 @@ def validate_and_fix_distilled_data(data):
         original_one_liner = fixed_data['one_liner']
         fixed_data['one_liner'] = truncate_one_liner(original_one_liner, max_words=20)
         if fixed_data['one_liner'] != original_one_liner:
-            print(f"⚠️  Truncated one_liner from {len(original_one_liner.split())} to 20 words")
+            logger.warning("Truncated one_liner from %d to 20 words", len(original_one_liner.split()))
     
     # Validate tags is a list
     if 'tags' in fixed_data and not isinstance(fixed_data['tags'], list):
@@ -302,29 +547,19 @@ def validate_and_fix_distilled_data(data):
 
 # ============ Vector Database Functions ============
 
+@traced("store.load")
 def load_vector_db():
-    """Load vector database from disk"""
-    if VECTOR_DB_PATH.exists() and IDEAS_DB_PATH.exists():
-        with open(VECTOR_DB_PATH, 'rb') as f:
-            vectors = pickle.load(f)
-        with open(IDEAS_DB_PATH, 'rb') as f:
-            ideas = pickle.load(f)
-        return vectors, ideas
-    return {}, {}
-
-def save_vector_db(vectors, ideas):
-    """Save vector database to disk"""
-    with open(VECTOR_DB_PATH, 'wb') as f:
-        pickle.dump(vectors, f)
-    with open(IDEAS_DB_PATH, 'wb') as f:
-        pickle.dump(ideas, f)
+    """
+    Return (vectors, ideas) from the current store snapshot.
+    
+    The dicts are shared with other requests and must be treated as read-only;
+    use store.transaction() / store.update() to make changes.
+    """
+    return store.load()
 
 def add_to_vector_db(idea_id, embedding, idea_data):
     """Add an idea and its embedding to the vector database"""
-    vectors, ideas = load_vector_db()
-    vectors[idea_id] = np.array(embedding)
-    ideas[idea_id] = idea_data
-    save_vector_db(vectors, ideas)
+    store.put(idea_id, np.array(embedding), idea_data)
 
 def cosine_similarity(vec1, vec2):
     """Calculate cosine similarity between two vectors"""
@@ -345,69 +580,20 @@ def cosine_similarity(vec1, vec2):
     # Clamp to [-1, 1] to handle floating point errors
     return float(np.clip(similarity, -1.0, 1.0))
 
+@traced()
 def search_similar_ideas(query_embedding, top_k=3, exclude_id=None):
-    """Search for similar ideas using cosine similarity"""
+    """Search for similar ideas using cosine similarity (shared embedding index)"""
     try:
-        vectors, ideas = load_vector_db()
-        
-        if not vectors:
-            print("⚠️  Vector database is empty")
+        if not store.count():
+            logger.warning("Vector database is empty")
             return []
         
-        query_vec = np.array(query_embedding)
-        similarities = []
-        
-        for idea_id, vec in vectors.items():
-            if idea_id == exclude_id:
-                continue
-            
-            try:
-                # Ensure vec is a numpy array
-                vec = np.array(vec)
-                
-                # Check dimensions match
-                if len(query_vec) != len(vec):
-                    print(f"⚠️  Dimension mismatch for idea {idea_id}: query={len(query_vec)}, stored={len(vec)}")
-                    continue
-                
-                sim = cosine_similarity(query_vec, vec)
-                
-                # Get idea data, handle missing ideas
-                if idea_id in ideas:
-                    similarities.append((idea_id, sim, ideas[idea_id]))
-                else:
-                    print(f"⚠️  Idea {idea_id} has vector but no data")
-                    
-            except Exception as e:
-                print(f"⚠️  Error calculating similarity for idea {idea_id}: {e}")
-                continue
-        
-        # Sort by similarity (descending)
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        
-        return similarities[:top_k]
+        return embedding_index.search(query_embedding, top_k, exclude_id)
         
     except Exception as e:
-        print(f"❌ Error in search_similar_ideas: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in search_similar_ideas: %s", e)
         return []
 
-def traverse_graph(idea_data, max_depth=1):
-    """Traverse the graph structure to find related concepts"""
-    graph = idea_data.get('distilled_data', {}).get('graph_structure', {})
-    nodes = graph.get('nodes', [])
-    edges = graph.get('edges', [])
-    
-    # Extract key concepts and relationships
-    concepts = [node['name'] for node in nodes]
-    relations = [f"{edge['source']} {edge['relation']} {edge['target']}" for edge in edges]
-    
-    return {
-        'concepts': concepts,
-        'relations': relations
-    }
-
 
 @app.route("/api/distill", methods=["POST"])
 def distill():
@@ -425,90 +611,88 @@ def distill():
         if not text:
             return jsonify({"error": "No text provided"}), 400
 
-        print(f"⏱️  Distilling text: {text[:100]}...")
+        logger.info("Distilling text: %.100s...", text)
         
         # 调用 LLM API
-        llm_start = time.time()
-        
-        # 构建请求参数（某些模型不支持 response_format）
-        request_params = {
-            "model": LLM_MODEL,
-            "messages": [
-                {"role": "system", "content": DISTILL_SYSTEM_PROMPT},
-                {"role": "user", "content": f"Distill this idea:\n\n{text}"}
-            ],
-            "temperature": 0.7
-        }
-        
-        # 只有 OpenAI 和部分兼容模型支持 response_format
-        # DeepSeek 等模型可能不支持，所以我们在提示词中明确要求 JSON
-        try:
-            request_params["response_format"] = {"type": "json_object"}
-            response = llm_client.chat.completions.create(**request_params)
-        except Exception as e:
-            print(f"⚠️  response_format 不支持，使用普通模式: {e}")
-            del request_params["response_format"]
-            response = llm_client.chat.completions.create(**request_params)
+        with stage("llm_call") as llm_span:
+            # 构建请求参数（某些模型不支持 response_format）
+            request_params = {
+                "model": LLM_MODEL,
+                "messages": [
+                    {"role": "system", "content": DISTILL_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Distill this idea:\n\n{text}"}
+                ],
+                "temperature": 0.7
+            }
         
-        llm_time = time.time() - llm_start
-        print(f"   LLM call: {llm_time:.2f}s")
+            # 只有 OpenAI 和部分兼容模型支持 response_format
+            # DeepSeek 等模型可能不支持，所以我们在提示词中明确要求 JSON
+            try:
+                request_params["response_format"] = {"type": "json_object"}
+                response = llm_client.chat.completions.create(**request_params)
+            except Exception as e:
+                logger.warning("response_format 不支持，使用普通模式: %s", e)
+                del request_params["response_format"]
+                response = llm_client.chat.completions.create(**request_params)
+        llm_time = llm_span.duration
+        logger.debug("LLM call: %.2fs", llm_time)
         
         result_text = response.choices[0].message.content
         
         # 调试：打印 LLM 返回的原始内容
-        print(f"   LLM raw response: {result_text[:200]}...")
+        logger.debug("LLM raw response: %.200s...", result_text)
         
         # 尝试解析 JSON
         try:
             distilled = json.loads(result_text)
         except json.JSONDecodeError as e:
-            print(f"❌ JSON 解析失败: {e}")
-            print(f"   原始响应: {result_text}")
+            logger.error("JSON 解析失败: %s", e)
+            logger.debug("原始响应: %s", result_text)
             # 尝试提取 JSON（有些模型会在 markdown 代码块中返回 JSON）
             if "```json" in result_text:
                 json_start = result_text.find("```json") + 7
                 json_end = result_text.find("```", json_start)
                 result_text = result_text[json_start:json_end].strip()
-                print(f"   提取的 JSON: {result_text[:200]}...")
+                logger.debug("提取的 JSON: %.200s...", result_text)
                 distilled = json.loads(result_text)
             elif "```" in result_text:
                 json_start = result_text.find("```") + 3
                 json_end = result_text.find("```", json_start)
                 result_text = result_text[json_start:json_end].strip()
-                print(f"   提取的 JSON: {result_text[:200]}...")
+                logger.debug("提取的 JSON: %.200s...", result_text)
                 distilled = json.loads(result_text)
             else:
                 raise
         
         # 验证并修复蒸馏数据
-        validation_start = time.time()
-        is_valid, fixed_distilled, validation_errors = validate_and_fix_distilled_data(distilled)
-        validation_time = time.time() - validation_start
+        with stage("validation") as validation_span:
+            is_valid, fixed_distilled, validation_errors = validate_and_fix_distilled_data(distilled)
+        validation_time = validation_span.duration
         
         if validation_errors:
-            print(f"⚠️  Validation issues found ({len(validation_errors)}): {validation_errors[:3]}")
-            print(f"   Validation & fix: {validation_time:.3f}s")
+            logger.warning("Validation issues found (%d): %s", len(validation_errors), validation_errors[:3])
+            logger.debug("Validation & fix: %.3fs", validation_time)
         else:
-            print(f"✅ Schema validation passed: {validation_time:.3f}s")
+            logger.debug("Schema validation passed: %.3fs", validation_time)
         
         # Use fixed data
         distilled = fixed_distilled
         
         # Generate embedding for the idea
-        emb_start = time.time()
-        embedding_response = embedding_client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text
-        )
-        embedding_vector = embedding_response.data[0].embedding
-        emb_time = time.time() - emb_start
-        print(f"   Embedding call: {emb_time:.2f}s")
+        with stage("embedding_call") as emb_span:
+            embedding_response = embedding_client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=text
+            )
+            embedding_vector = embedding_response.data[0].embedding
+        emb_time = emb_span.duration
+        logger.debug("Embedding call: %.2fs", emb_time)
         
         # Add embedding to response
         distilled["embedding_vector"] = embedding_vector
         
         total_time = time.time() - start_time
-        print(f"✅ Total distill time: {total_time:.2f}s")
+        logger.info("Total distill time: %.2fs", total_time)
         
         return jsonify(distilled)
     
@@ -533,20 +717,21 @@ def save_idea():
         if not idea_id or not embedding or not idea_data:
             return jsonify({"error": "Missing required fields"}), 400
         
-        print(f"💾 Saving idea {idea_id[:8]}...")
+        logger.debug("Saving idea %.8s...", idea_id)
         
-        db_start = time.time()
-        add_to_vector_db(idea_id, embedding, idea_data)
-        db_time = time.time() - db_start
+        with stage("db_write") as db_span:
+            add_to_vector_db(idea_id, embedding, idea_data)
+        db_time = db_span.duration
+        chunk_index.schedule([idea_id])
         
         total_time = time.time() - start_time
-        print(f"   DB write: {db_time:.3f}s")
-        print(f"✅ Total save time: {total_time:.3f}s")
+        logger.debug("DB write: %.3fs", db_time)
+        logger.info("Saved idea %.8s in %.3fs", idea_id, total_time)
         
         return jsonify({"status": "success", "idea_id": idea_id})
     
     except Exception as e:
-        print(f"❌ Save failed: {e}")
+        logger.exception("Save failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -554,7 +739,6 @@ def save_idea():
 def search_similar():
     """Search for similar ideas using vector similarity"""
     import time
-    import traceback
     start_time = time.time()
     
     try:
@@ -566,9 +750,9 @@ def search_similar():
         if not query_embedding:
             return jsonify({"error": "No query embedding provided"}), 400
         
-        search_start = time.time()
-        similar_ideas = search_similar_ideas(query_embedding, top_k, exclude_id)
-        search_time = time.time() - search_start
+        with stage("vector_search") as search_span:
+            similar_ideas = search_similar_ideas(query_embedding, top_k, exclude_id)
+        search_time = search_span.duration
         
         results = [
             {
@@ -580,134 +764,702 @@ def search_similar():
         ]
         
         total_time = time.time() - start_time
-        print(f"🔍 Search similar: {search_time:.3f}s (found {len(results)} ideas)")
+        logger.info("Search similar: %.3fs (found %d ideas)", search_time, len(results))
         
         return jsonify({"results": results})
     
     except Exception as e:
-        print(f"❌ Search similar error: {e}")
-        print(f"   Traceback: {traceback.format_exc()}")
+        logger.exception("Search similar error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
-def build_rag_context(current_idea, current_embedding, current_id, selected_idea_ids=None):
+@app.route("/api/entities", methods=["GET"])
+def entities():
+    """
+    Look up knowledge-graph entities across all ideas.
+    
+    Query parameters (all optional):
+      prefix   - normalized name prefix ("obs" finds "Obsidian")
+      name     - exact entity name; returns every node naming it
+      type     - only entities with a node of this type (e.g. Problem)
+      limit    - entities to return (default 20, at most 200)
+      mentions - nodes listed per entity (default 20)
+    
+    Returns:
+    {
+        "entities": [{"name", "display_name", "types", "idea_count", "mention_count", "mentions": [...]}],
+        "total": 42
+    }
+    """
+    try:
+        limit = min(int(request.args.get("limit", 20)), 200)
+        mentions = int(request.args.get("mentions", 20))
+        if limit < 1 or mentions < 0:
+            return jsonify({"error": "limit must be positive and mentions not negative"}), 400
+    except ValueError:
+        return jsonify({"error": "limit and mentions must be integers"}), 400
+    entity_type = request.args.get("type")
+    
+    name = request.args.get("name")
+    if name is not None:
+        postings = [{"idea_id": idea_id, "node_id": node_id, "type": node_type}
+                    for idea_id, node_id, node_type in entity_index.lookup(name)
+                    if not entity_type or node_type == entity_type]
+        return jsonify({"name": name, "mentions": postings, "total": len(postings)})
+    
+    with stage("entity_search"):
+        results, total = entity_index.search(request.args.get("prefix", ""), entity_type, limit, mentions)
+    return jsonify({"entities": results, "total": total})
+
+
+@app.route("/api/graph/global", methods=["GET"])
+def global_graph():
+    """
+    Level 2 graph of canonical entities merged across all ideas.
+    
+    Entity resolution runs in the background after changes; this serves the
+    last persisted result and schedules a pass if it is behind the store.
+    
+    Query parameters (all optional):
+      min_ideas - only entities mentioned by at least this many ideas (default 1)
+      type      - only entities of this type
+    
+    Returns:
+    {
+        "level": 2,
+        "nodes": [{"id", "label", "type", "desc", "aliases", "idea_ids", "mention_count"}],
+        "edges": [{"source", "target", "relation", "weight", "idea_ids"}],
+        "version": 12,     # store version the graph was resolved at (null before the first pass)
+        "stale": false     # true while a newer store version awaits resolution
+    }
+    """
+    try:
+        min_ideas = int(request.args.get("min_ideas", 1))
+    except ValueError:
+        return jsonify({"error": "min_ideas must be an integer"}), 400
+    entity_type = request.args.get("type")
+    
+    with stage("global_graph"):
+        graph = entity_resolver.graph()
+        nodes = [node for node in graph["nodes"]
+                 if len(node["idea_ids"]) >= min_ideas and (not entity_type or node["type"] == entity_type)]
+        if len(nodes) != len(graph["nodes"]):
+            kept = {node["id"] for node in nodes}
+            graph = dict(graph, nodes=nodes,
+                         edges=[e for e in graph["edges"] if e["source"] in kept and e["target"] in kept])
+    stale = graph["version"] != store.version
+    if stale:
+        entity_resolver.schedule()
+    return jsonify(dict(graph, stale=stale))
+
+
+@app.route("/api/communities", methods=["GET"])
+def communities():
+    """
+    Communities of related ideas and their summaries (used by global chat).
+    
+    Detection runs in the background after changes; this serves the last
+    persisted result and schedules a pass if it is behind the store.
+    
+    Query parameters (all optional):
+      limit - communities to return, largest first (default 50)
+    
+    Returns:
+    {
+        "communities": [{"id", "size", "idea_ids", "summary": {"title", "summary", "themes"} or null,
+                         "summarized_at"}],
+        "total": 7,
+        "version": 12,     # store version the communities were detected at (null before the first pass)
+        "stale": false
+    }
+    """
+    try:
+        limit = int(request.args.get("limit", 50))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    with stage("communities"):
+        found = community_index.communities()
+        version = community_index.state()["version"]
+    stale = version != store.version
+    if stale:
+        community_index.schedule()
+    return jsonify({
+        "communities": [{k: v for k, v in c.items() if k != "summarized_ids"} for c in found[:max(limit, 0)]],
+        "total": len(found),
+        "version": version,
+        "stale": stale
+    })
+
+
+def idea_projection(idea_id, idea):
+    """The few fields a search result list shows (no content, graph or chat history)"""
+    distilled = idea.get('distilled_data', {})
+    return {
+        "idea_id": idea_id,
+        "one_liner": distilled.get('one_liner', ''),
+        "tags": distilled.get('tags', []),
+        "summary": distilled.get('summary', '')[:200],
+        "created_at": idea.get('created_at')
+    }
+
+
+def idea_filter(filters):
+    """
+    Predicate for search filters (all optional):
+    tags (any of, case-insensitive), created_after / created_before (ISO
+    timestamps, compared as strings), exclude_ids.
+    """
+    tags = {str(t).lower() for t in filters.get("tags") or []}
+    created_after = filters.get("created_after")
+    created_before = filters.get("created_before")
+    exclude_ids = set(filters.get("exclude_ids") or [])
+    
+    def matches(idea_id, idea):
+        if idea_id in exclude_ids:
+            return False
+        if tags and not tags & {t.lower() for t in idea.get('distilled_data', {}).get('tags', []) if isinstance(t, str)}:
+            return False
+        created_at = idea.get('created_at') or ''
+        if created_after and created_at <= created_after:
+            return False
+        if created_before and created_at >= created_before:
+            return False
+        return True
+    return matches
+
+
+@app.route("/api/search_text", methods=["POST"])
+def search_text():
+    """
+    Vector search from free text, for the search box: the query is embedded
+    server-side (through the query embedding cache). top_k is capped at 200.
+    
+    Request body:
+    {
+        "query": "search text",
+        "top_k": 10,
+        "min_similarity": 0.2,
+        "filters": {"tags": ["ai"], "created_after": "2025-01-01", "created_before": "...", "exclude_ids": [...]}
+    }
+    
+    Returns:
+    {
+        "results": [{"idea_id", "one_liner", "tags", "summary", "created_at", "similarity"}, ...]
+    }
+    """
+    try:
+        data = request.json or {}
+        query = (data.get("query") or "").strip()
+        top_k = min(int(data.get("top_k", 10)), 200)
+        min_similarity = float(data.get("min_similarity", -1.0))
+        filters = data.get("filters")
+        if filters is None:
+            filters = {}
+        
+        if not query:
+            return jsonify({"error": "No query provided"}), 400
+        if top_k < 1:
+            return jsonify({"error": "top_k must be positive"}), 400
+        if not isinstance(filters, dict):
+            return jsonify({"error": "filters must be an object"}), 400
+        if not embedding_client:
+            return jsonify({"error": "API not configured. Please set LLM_API_KEY in backend/.env"}), 500
+        
+        query_embedding = embed_query(query)
+        if query_embedding is None:
+            return jsonify({"error": "Failed to embed query"}), 502
+        
+        # Filters are applied after ranking: widen the search until enough ideas pass
+        matches = idea_filter(filters)
+        total = store.count()
+        candidates = top_k * 4
+        with stage("vector_search"):
+            while True:
+                hits = search_similar_ideas(query_embedding, top_k=candidates)
+                results = [dict(idea_projection(idea_id, idea), similarity=float(sim))
+                           for idea_id, sim, idea in hits if sim >= min_similarity and matches(idea_id, idea)]
+                if len(results) >= top_k or candidates >= total or (hits and hits[-1][1] < min_similarity):
+                    break
+                candidates *= 4
+        
+        logger.info("Search text %r: %d results from %d candidates", query[:50], min(len(results), top_k), len(hits))
+        return jsonify({"results": results[:top_k]})
+    
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+    except Exception as e:
+        logger.exception("Search text error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/search", methods=["POST"])
+def search():
+    """
+    Hybrid search over ideas from raw query text.
+    
+    BM25 over the ideas' text catches exact terms (names, acronyms) that
+    embedding similarity dilutes; the query is also embedded server-side
+    and both rankings are fused by reciprocal rank. top_k is capped at 200.
+    
+    Request body:
+    {
+        "query": "search text",
+        "top_k": 10,
+        "exclude_id": "optional uuid"
+    }
+    
+    Returns:
+    {
+        "results": [{"idea_id", "score", "bm25_score", "bm25_rank", "similarity", "vector_rank", "idea_data"}, ...],
+        "strategy": "hybrid" | "bm25" | "vector"
+    }
+    """
+    try:
+        data = request.json or {}
+        query = (data.get("query") or "").strip()
+        top_k = min(int(data.get("top_k", 10)), 200)
+        exclude_id = data.get("exclude_id")
+        
+        if not query:
+            return jsonify({"error": "No query provided"}), 400
+        if top_k < 1:
+            return jsonify({"error": "top_k must be positive"}), 400
+        
+        candidates = max(top_k * 2, RAG_FUSION_CANDIDATES)
+        with stage("bm25_search"):
+            bm25_hits = [(idea_id, score) for idea_id, score in bm25_index.search(query, candidates + 1)
+                         if idea_id != exclude_id][:candidates]
+        
+        query_embedding = embed_query(query)
+        vector_hits = []
+        if query_embedding is not None:
+            with stage("vector_search"):
+                vector_hits = search_similar_ideas(query_embedding, top_k=candidates, exclude_id=exclude_id)
+        
+        bm25_ranks = {idea_id: (rank, score) for rank, (idea_id, score) in enumerate(bm25_hits, start=1)}
+        vector_ranks = {idea_id: (rank, sim) for rank, (idea_id, sim, _) in enumerate(vector_hits, start=1)}
+        fused = reciprocal_rank_fusion([[idea_id for idea_id, _ in bm25_hits],
+                                        [idea_id for idea_id, _, _ in vector_hits]])
+        
+        ideas = store.snapshot().ideas
+        results = []
+        for idea_id, score in fused:
+            if idea_id not in ideas:
+                continue
+            bm25_rank, bm25_score = bm25_ranks.get(idea_id, (None, None))
+            vector_rank, similarity = vector_ranks.get(idea_id, (None, None))
+            results.append({
+                "idea_id": idea_id,
+                "score": round(score, 6),
+                "bm25_score": round(bm25_score, 4) if bm25_score is not None else None,
+                "bm25_rank": bm25_rank,
+                "similarity": float(similarity) if similarity is not None else None,
+                "vector_rank": vector_rank,
+                "idea_data": ideas[idea_id]
+            })
+            if len(results) == top_k:
+                break
+        
+        strategy = "hybrid" if query_embedding is not None else "bm25"
+        if query_embedding is not None and not bm25_hits:
+            strategy = "vector"
+        logger.info("Search %r: %d results (%s, %d bm25 / %d vector candidates)", query[:50], len(results),
+                    strategy, len(bm25_hits), len(vector_hits))
+        
+        return jsonify({"results": results, "strategy": strategy})
+    
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+    except Exception as e:
+        logger.exception("Search error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# Sections of the chat context, in prompt order
+RAG_SECTIONS = [
+    ("primary", "=== PRIMARY IDEA ==="),
+    ("entities", "\n=== KNOWLEDGE GRAPH STRUCTURE ===\nEntities:"),
+    ("relationships", "\nRelationships:"),
+    ("chunks", "\n=== DOCUMENT CONTENT ==="),
+    ("selected", "\n=== SELECTED IDEAS IN CONTEXT ==="),
+    ("related", "\n=== RELATED IDEAS (Vector Search) ==="),
+    ("linked", "\n=== LINKED IDEAS (Graph) ==="),
+]
+# Longest excerpt of one passage, and how many passages / similar ideas compete for the budget
+RAG_CHUNK_MAX_CHARS = 800
+RAG_CHUNK_CANDIDATES = 8
+RAG_RELATED_CANDIDATES = 5
+RAG_GRAPH_CANDIDATES = 5
+# Share of the user's question in the retrieval vector (the rest is the current idea)
+RAG_QUERY_WEIGHT = float(os.getenv("RAG_QUERY_WEIGHT", "0.6"))
+# "vector", or "dual" to also extract keywords from the question and match them (see keyword_related_ideas)
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "vector").lower()
+# Candidates taken from each ranking before fusion
+RAG_FUSION_CANDIDATES = 20
+
+
+def retrieval_vector(query_embedding, idea_embedding, query_weight=RAG_QUERY_WEIGHT):
+    """
+    Vector to retrieve related ideas and passages with, and how it was made.
+
+    Both embeddings are normalized before mixing so neither dominates by
+    magnitude. Falls back to whichever one is available (or has the
+    dimension of the other's model). Returns (vector or None, strategy dict).
+    """
+    query = np.asarray(query_embedding, dtype=np.float64) if query_embedding is not None and len(query_embedding) else None
+    idea = np.asarray(idea_embedding, dtype=np.float64) if idea_embedding is not None and len(idea_embedding) else None
+    if query is not None and idea is not None and len(query) == len(idea) and 0 < query_weight < 1:
+        q_norm, i_norm = np.linalg.norm(query), np.linalg.norm(idea)
+        if q_norm > 0 and i_norm > 0:
+            vector = query_weight * query / q_norm + (1 - query_weight) * idea / i_norm
+            return vector, {"strategy": "blended", "query_weight": query_weight, "idea_weight": round(1 - query_weight, 6)}
+    if query is not None and query_weight > 0:
+        return query, {"strategy": "query", "query_weight": 1.0, "idea_weight": 0.0}
+    if idea is not None:
+        return idea, {"strategy": "idea", "query_weight": 0.0, "idea_weight": 1.0}
+    return None, {"strategy": "none", "query_weight": 0.0, "idea_weight": 0.0}
+
+
+@traced()
+def keyword_related_ideas(search_vector, keywords, exclude_id=None, top_k=RAG_RELATED_CANDIDATES):
+    """
+    Dual-level retrieval: low-level keywords matched against entity names,
+    high-level keywords against tags and summaries, fused with the vector
+    ranking by reciprocal rank.
+    
+    Returns up to top_k (idea_id, similarity or None, idea_data, match info) tuples, best first.
+    """
+    vector_hits = []
+    if search_vector is not None:
+        vector_hits = search_similar_ideas(search_vector, top_k=RAG_FUSION_CANDIDATES, exclude_id=exclude_id)
+    low_level = [k for k in keywords.get("low_level_keywords") or [] if isinstance(k, str)]
+    high_level = [k for k in keywords.get("high_level_keywords") or [] if isinstance(k, str)]
+    entity_hits = keyword_index.match_entities(low_level)[:RAG_FUSION_CANDIDATES]
+    theme_hits = keyword_index.match_themes(high_level)[:RAG_FUSION_CANDIDATES]
+    
+    similarity = {idea_id: sim for idea_id, sim, _ in vector_hits}
+    entities = {idea_id: (score, names) for idea_id, score, names in entity_hits}
+    themes = {idea_id: (score, names) for idea_id, score, names in theme_hits}
+    fused = reciprocal_rank_fusion([
+        [idea_id for idea_id, _, _ in vector_hits],
+        [idea_id for idea_id, _, _ in entity_hits if idea_id != exclude_id],
+        [idea_id for idea_id, _, _ in theme_hits if idea_id != exclude_id],
+    ])
+    
+    ideas = store.snapshot().ideas
+    results = []
+    for idea_id, rrf_score in fused:
+        if idea_id not in ideas:
+            continue
+        keyword_score = min(1.0, entities.get(idea_id, (0.0,))[0] + themes.get(idea_id, (0.0,))[0])
+        results.append((idea_id, similarity.get(idea_id), ideas[idea_id], {
+            "rrf": round(rrf_score, 6),
+            "keyword_score": round(keyword_score, 4),
+            "matched_entities": entities.get(idea_id, (0.0, []))[1],
+            "matched_themes": themes.get(idea_id, (0.0, []))[1],
+        }))
+        if len(results) == top_k:
+            break
+    return results
+
+
+@traced()
+def build_rag_context(current_idea, current_embedding, current_id, selected_idea_ids=None,
+                      max_tokens=RAG_CONTEXT_TOKENS, query_embedding=None, keywords=None):
     """
     Build comprehensive RAG context including:
     - Knowledge Graph Data (structure and relationships)
     - Document Chunks (detailed content)
-    - Similar ideas from vector search
-    
-    Returns: (context_string, citations_list)
+    - Selected ideas and similar ideas from vector search
+    
+    Related ideas and passages are retrieved with a blend of the
+    `query_embedding` (the user's latest message) and the current idea's
+    embedding (see retrieval_vector); the strategy and weights are recorded
+    in the citations of retrieved items. Passages come from the current,
+    selected and related ideas' chunk index; without a question the current
+    idea's leading paragraphs are used instead. With `keywords` (from
+    extract_query_keywords) related ideas come from dual-level keyword
+    retrieval fused with the vector ranking.
+    
+    Every candidate gets a relevance score and the most relevant ones are
+    kept until `max_tokens` (estimated locally) is used up; the primary idea
+    itself is always included.
+    
+    Ideas connected to the current and selected ones by lineage (split,
+    merge, links) or shared entities are added by bounded graph expansion
+    (GraphIndex.expand), scored by path weight; their citations carry the
+    path.
+    
+    Returns: (context_string, citations_list, token_usage)
     """
-    citations = []
-    citation_idx = 1
+    budget = ContextBudget(max_tokens, RAG_SECTIONS)
     
     # Start with current idea as primary context
     distilled = current_idea.get('distilled_data', {})
     idea_name = distilled.get('one_liner', 'Current Idea')
-    
-    context_parts = []
-    context_parts.append("=== PRIMARY IDEA ===")
-    context_parts.append(f"Title: {idea_name}")
-    context_parts.append(f"Tags: {', '.join(distilled.get('tags', []))}")
-    context_parts.append(f"Summary: {distilled.get('summary', 'N/A')}")
-    
-    # Add citation for current idea
-    citations.append({
-        "index": citation_idx,
+    budget.add("primary", "\n".join([
+        f"Title: {idea_name}",
+        f"Tags: {', '.join(distilled.get('tags', []))}",
+        f"Summary: {distilled.get('summary', 'N/A')}",
+        "{cite}",
+    ]), required=True, citation={
         "idea_id": current_id,
         "idea_name": idea_name,
         "snippet": distilled.get('summary', '')[:200]
     })
-    context_parts.append(f"[{citation_idx}]")
-    citation_idx += 1
     
-    # Add Knowledge Graph Data (structure)
+    # Knowledge Graph Data: well-connected entities matter most
     graph_structure = distilled.get('graph_structure', {})
     nodes = graph_structure.get('nodes', [])
     edges = graph_structure.get('edges', [])
+    degree = {}
+    for edge in edges:
+        for end in (edge.get('source'), edge.get('target')):
+            degree[end] = degree.get(end, 0) + 1
+    max_degree = max(degree.values(), default=1)
+    node_score = {node.get('id'): 0.5 + 0.4 * degree.get(node.get('id'), 0) / max_degree for node in nodes}
+    
+    for node in nodes:
+        budget.add("entities", f"  - {node.get('name', 'N/A')} ({node.get('type', 'N/A')}): {node.get('desc', 'N/A')}",
+                   score=node_score[node.get('id')])
+    for edge in edges:
+        relation_desc = f"  - {edge.get('source', 'N/A')} --[{edge.get('relation', 'N/A')}]--> {edge.get('target', 'N/A')}"
+        if edge.get('desc'):
+            relation_desc += f": {edge['desc']}"
+        score = 0.9 * (node_score.get(edge.get('source'), 0.5) + node_score.get(edge.get('target'), 0.5)) / 2
+        budget.add("relationships", relation_desc, score=score)
+    
+    # Selected ideas (multi-idea context): chosen by the user, so ranked high
+    ideas = store.snapshot().ideas
+    selected = []
+    if selected_idea_ids and len(selected_idea_ids) > 1:
+        selected = [sel_id for sel_id in selected_idea_ids if sel_id != current_id and sel_id in ideas]
+    for sel_id in selected:
+        sel_distilled = ideas[sel_id].get('distilled_data', {})
+        sel_name = sel_distilled.get('one_liner', 'Untitled')
+        budget.add("selected", "\n".join([
+            f"\nIdea: {sel_name}",
+            f"Tags: {', '.join(sel_distilled.get('tags', []))}",
+            f"Summary: {sel_distilled.get('summary', 'N/A')}",
+            "{cite}",
+        ]), score=0.85, citation={
+            "idea_id": sel_id,
+            "idea_name": sel_name,
+            "snippet": sel_distilled.get('summary', '')[:200]
+        })
     
-    if nodes:
-        context_parts.append("\n=== KNOWLEDGE GRAPH STRUCTURE ===")
-        context_parts.append("Entities:")
-        for node in nodes[:10]:  # Limit to first 10 nodes
-            context_parts.append(f"  - {node.get('name', 'N/A')} ({node.get('type', 'N/A')}): {node.get('desc', 'N/A')}")
-    
-    if edges:
-        context_parts.append("\nRelationships:")
-        for edge in edges[:10]:  # Limit to first 10 edges
-            relation_desc = f"  - {edge.get('source', 'N/A')} --[{edge.get('relation', 'N/A')}]--> {edge.get('target', 'N/A')}"
-            if edge.get('desc'):
-                relation_desc += f": {edge['desc']}"
-            context_parts.append(relation_desc)
-    
-    # Add Document Chunks from raw content
-    raw_content = current_idea.get('content_raw', '')
-    if raw_content:
-        context_parts.append("\n=== DOCUMENT CONTENT ===")
-        # Split into chunks (simple approach - split by paragraphs)
+    # RAG: similar ideas to the question and the idea, scored by that similarity
+    search_vector, retrieval = retrieval_vector(query_embedding, current_embedding)
+    similar_ideas = []
+    if keywords:
+        retrieval = dict(retrieval, mode="dual")
+        similar_ideas = keyword_related_ideas(search_vector, keywords, exclude_id=current_id)
+    else:
+        retrieval = dict(retrieval, mode="vector")
+        if search_vector is not None:
+            similar_ideas = [(idea_id, sim, idea_data, {}) for idea_id, sim, idea_data
+                             in search_similar_ideas(search_vector, top_k=RAG_RELATED_CANDIDATES, exclude_id=current_id)]
+    for idea_id, sim, idea_data, match in similar_ideas:
+        sim_distilled = idea_data.get('distilled_data', {})
+        sim_name = sim_distilled.get('one_liner', 'Untitled')
+        matched = match.get('matched_entities', []) + match.get('matched_themes', [])
+        if sim is not None:
+            label = f"similarity: {sim:.2f}"
+        else:
+            label = f"matches: {', '.join(matched)}"
+        budget.add("related", "\n".join([
+            f"\n{{cite}} {sim_name} ({label})",
+            f"Tags: {', '.join(sim_distilled.get('tags', []))}",
+            f"Summary: {sim_distilled.get('summary', 'N/A')[:200]}...",
+        ]), score=max(float(sim or 0.0), 0.8 * match.get('keyword_score', 0.0)), citation={
+            "idea_id": idea_id,
+            "idea_name": sim_name,
+            "snippet": sim_distilled.get('summary', '')[:200],
+            "retrieval": dict(retrieval, **match)
+        })
+    
+    # Graph expansion: ideas a few lineage / shared-entity hops away that vector search missed
+    seeds = dict.fromkeys(selected, 0.85)
+    if current_id:
+        seeds[current_id] = 1.0
+    linked = []
+    if seeds and GRAPH_MAX_HOPS > 0:
+        retrieved = {idea_id for idea_id, _, _, _ in similar_ideas}
+        linked = [hit for hit in graph_index.expand(seeds, exclude=retrieved, top_k=RAG_GRAPH_CANDIDATES)
+                  if hit[0] in ideas]
+    for idea_id, path_weight, path in linked:
+        linked_distilled = ideas[idea_id].get('distilled_data', {})
+        linked_name = linked_distilled.get('one_liner', 'Untitled')
+        via = " -> ".join(hop['relation'] for hop in path)
+        budget.add("linked", "\n".join([
+            f"\n{{cite}} {linked_name} (via: {via})",
+            f"Tags: {', '.join(linked_distilled.get('tags', []))}",
+            f"Summary: {linked_distilled.get('summary', 'N/A')[:200]}...",
+        ]), score=0.3 + 0.6 * path_weight, citation={
+            "idea_id": idea_id,
+            "idea_name": linked_name,
+            "snippet": linked_distilled.get('summary', '')[:200],
+            "retrieval": {"mode": "graph", "hops": len(path), "path_weight": path_weight, "path": path}
+        })
+    
+    # Document Chunks: passages closest to the question across all ideas in context
+    source_ids = [i for i in [current_id] + selected + [idea_id for idea_id, _, _, _ in similar_ideas]
+                  + [idea_id for idea_id, _, _ in linked] if i]
+    unindexed = [i for i in source_ids if i in ideas and ideas[i].get('content_raw') and not chunk_index.indexed(i)]
+    if unindexed:
+        chunk_index.schedule(unindexed)  # saved before passages were indexed, or indexing failed
+    passages = []
+    if query_embedding is not None and len(query_embedding):
+        passages = chunk_index.search(search_vector, source_ids, top_k=RAG_CHUNK_CANDIDATES)
+    for passage in passages:
+        is_current = passage['idea_id'] == current_id
+        name = idea_name if is_current else ideas.get(passage['idea_id'], {}).get('distilled_data', {}).get('one_liner', 'Untitled')
+        text = passage['text']
+        excerpt = text if len(text) <= RAG_CHUNK_MAX_CHARS else text[:RAG_CHUNK_MAX_CHARS] + "..."
+        source = "" if is_current else f"(from {name}) "
+        budget.add("chunks", f"{{cite}} {source}{excerpt}", score=0.4 + 0.6 * max(passage['similarity'], 0.0), citation={
+            "idea_id": passage['idea_id'],
+            "idea_name": name,
+            "snippet": text[:200],
+            "chunk": passage['position'],
+            "retrieval": retrieval
+        })
+    
+    # Without passages for the current idea: its paragraphs, earlier ones first
+    if not any(passage['idea_id'] == current_id for passage in passages):
+        raw_content = current_idea.get('content_raw', '')
         chunks = [c.strip() for c in raw_content.split('\n\n') if c.strip()]
-        for chunk in chunks[:3]:  # Limit to first 3 chunks
-            context_parts.append(f"[{citation_idx}] {chunk[:300]}...")
-            citations.append({
-                "index": citation_idx,
+        for position, chunk in enumerate(chunks):
+            excerpt = chunk if len(chunk) <= RAG_CHUNK_MAX_CHARS else chunk[:RAG_CHUNK_MAX_CHARS] + "..."
+            budget.add("chunks", f"{{cite}} {excerpt}", score=0.7 / (1 + 0.2 * position), citation={
                 "idea_id": current_id,
                 "idea_name": idea_name,
                 "snippet": chunk[:200]
             })
-            citation_idx += 1
     
-    # Add selected ideas if provided (multi-idea context)
-    if selected_idea_ids and len(selected_idea_ids) > 1:
-        vectors, ideas = load_vector_db()
-        context_parts.append("\n=== SELECTED IDEAS IN CONTEXT ===")
-        
-        for sel_id in selected_idea_ids:
-            if sel_id == current_id:
-                continue  # Skip current idea, already added
-            
-            if sel_id in ideas:
-                sel_idea = ideas[sel_id]
-                sel_distilled = sel_idea.get('distilled_data', {})
-                sel_name = sel_distilled.get('one_liner', 'Untitled')
-                
-                context_parts.append(f"\nIdea: {sel_name}")
-                context_parts.append(f"Tags: {', '.join(sel_distilled.get('tags', []))}")
-                context_parts.append(f"Summary: {sel_distilled.get('summary', 'N/A')}")
-                context_parts.append(f"[{citation_idx}]")
-                
-                citations.append({
-                    "index": citation_idx,
-                    "idea_id": sel_id,
-                    "idea_name": sel_name,
-                    "snippet": sel_distilled.get('summary', '')[:200]
-                })
-                citation_idx += 1
-    
-    # RAG: Search for similar ideas using vector similarity
-    if current_embedding:
-        similar_ideas = search_similar_ideas(current_embedding, top_k=3, exclude_id=current_id)
-        
-        if similar_ideas:
-            context_parts.append("\n=== RELATED IDEAS (Vector Search) ===")
-            for idea_id, sim, idea_data in similar_ideas:
-                sim_distilled = idea_data.get('distilled_data', {})
-                sim_name = sim_distilled.get('one_liner', 'Untitled')
-                
-                context_parts.append(f"\n[{citation_idx}] {sim_name} (similarity: {sim:.2f})")
-                context_parts.append(f"Tags: {', '.join(sim_distilled.get('tags', []))}")
-                context_parts.append(f"Summary: {sim_distilled.get('summary', 'N/A')[:200]}...")
-                
-                citations.append({
-                    "index": citation_idx,
-                    "idea_id": idea_id,
-                    "idea_name": sim_name,
-                    "snippet": sim_distilled.get('summary', '')[:200]
-                })
-                citation_idx += 1
+    context_string, citations, usage = budget.build()
+    rag_span = current_span()
+    if rag_span is not None:
+        rag_span.set(context_tokens=usage["used"], context_budget=max_tokens, context_dropped=usage["dropped"],
+                     retrieval_strategy=retrieval["strategy"])
+    return context_string, citations, usage
+
+
+# Sections of the context for global questions
+GLOBAL_SECTIONS = [
+    ("communities", "=== THEMES ACROSS ALL IDEAS ==="),
+]
+# Community summaries a global question is mapped over (the closest to the question)
+GLOBAL_MAP_COMMUNITIES = int(os.getenv("GLOBAL_MAP_COMMUNITIES", "8"))
+
+
+def llm_json(stage_name, system_prompt, user_prompt, temperature=0.3):
+    """Call the LLM for a JSON object (falls back to plain mode if response_format is unsupported)"""
+    request_params = {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": temperature,
+        "response_format": {"type": "json_object"}
+    }
+    with stage(stage_name):
+        try:
+            response = llm_client.chat.completions.create(**request_params)
+        except Exception as e:
+            logger.warning("response_format not supported, using normal mode: %s", e)
+            del request_params["response_format"]
+            response = llm_client.chat.completions.create(**request_params)
+    return parse_llm_json(response.choices[0].message.content)
+
+
+def map_community(question, community):
+    """Map step of a global question: scored points from one community summary"""
+    summary = community["summary"]
+    result = llm_json("global_map_llm_call", GLOBAL_MAP_PROMPT, "\n".join([
+        "Answer from this community summary:",
+        f"Title: {summary['title']}",
+        f"Themes: {', '.join(summary['themes'])}",
+        f"Summary: {summary['summary']}",
+        "",
+        f"Question: {question}",
+    ]))
+    points = []
+    for point in result.get("points") or []:
+        if isinstance(point, dict) and isinstance(point.get("description"), str):
+            try:
+                score = min(max(float(point.get("score", 0)), 0.0), 100.0)
+            except (TypeError, ValueError):
+                score = 0.0
+            if score > 0:
+                points.append((point["description"], score))
+    return points
+
+
+@traced()
+def build_global_context(question, query_embedding, max_tokens=RAG_CONTEXT_TOKENS):
+    """
+    Map-reduce context for questions about the whole knowledge base.
+    
+    Map: the GLOBAL_MAP_COMMUNITIES community summaries closest to the
+    question are asked, in parallel, for points that help answer it, each
+    scored 0-100. Reduce: the best points across communities are kept
+    until `max_tokens` is used; the chat model then answers from them.
+    
+    Returns: (context_string, citations_list, token_usage, map_info)
+    """
+    communities = community_index.relevant(query_embedding, GLOBAL_MAP_COMMUNITIES)
+    futures = [retrieval_executor.submit(contextvars.copy_context().run, map_community, question, community)
+               for community in communities]
+    budget = ContextBudget(max_tokens, GLOBAL_SECTIONS)
+    mapped = failed = 0
+    for community, future in zip(communities, futures):
+        try:
+            points = future.result()
+        except Exception as e:
+            logger.warning("Map step failed for community %s: %s", community["id"], e)
+            failed += 1
+            continue
+        mapped += 1
+        title = community["summary"]["title"]
+        for description, score in points:
+            budget.add("communities", f"{{cite}} [{title}] {description}", score=score / 100, citation={
+                "idea_id": community["idea_ids"][0],
+                "idea_name": title,
+                "snippet": description[:200],
+                "community_id": community["id"],
+                "idea_ids": community["idea_ids"][:20],
+                "retrieval": {"mode": "global", "score": score, "similarity": community.get("similarity")}
+            })
+    context_string, citations, usage = budget.build()
+    return context_string, citations, usage, {"communities": mapped, "failed": failed}
+
+
+# Chat questions are often repeated (retries, regenerate, several tabs)
+query_embedding_cache = EmbeddingCache("query_embedding")
+
+# Runs upstream calls of one request side by side (threads start lazily, after the fork)
+retrieval_executor = ThreadPoolExecutor(max_workers=int(os.getenv("RETRIEVAL_THREADS", "8")),
+                                        thread_name_prefix="retrieval")
+
+
+def embed_query(text):
+    """Embedding of a chat message for retrieval (cached), or None (no text, no client, or the call failed)"""
+    if not text or not embedding_client:
+        return None
     
-    context_string = "\n".join(context_parts)
-    return context_string, citations
+    def compute(text):
+        with stage("query_embedding_call"):
+            response = embedding_client.embeddings.create(model=EMBEDDING_MODEL, input=text)
+        return response.data[0].embedding
+    
+    try:
+        return query_embedding_cache.get(EMBEDDING_MODEL, text, compute)
+    except Exception as e:
+        logger.warning("Query embedding failed, using leading paragraphs: %s", e)
+        return None
 
 
 def detect_evolution_opportunity(user_message, response_text, current_idea):
@@ -769,18 +1521,51 @@ def chat():
         
         # Get current idea embedding for similarity search
         current_embedding = current_idea.get("embedding_vector")
+        if current_embedding is None and current_idea.get("idea_id"):
+            # Ideas loaded without embeddings: use the stored vector
+            current_embedding = store.snapshot().vectors.get(current_idea["idea_id"])
         current_id = current_idea.get("idea_id")
         
-        # Build comprehensive RAG context
-        rag_start = time.time()
-        context_data, citations = build_rag_context(
-            current_idea, 
-            current_embedding, 
-            current_id,
-            selected_idea_ids
-        )
-        rag_time = time.time() - rag_start
-        print(f"⏱️  RAG context building: {rag_time:.3f}s ({len(citations)} citations)")
+        # Embed the latest message to retrieve what answers it; in dual mode
+        # its keywords are extracted at the same time
+        user_message = history[-1]["text"] if history else ""
+        retrieval_mode = (data.get("retrieval_mode") or RAG_RETRIEVAL_MODE).lower()
+        if retrieval_mode == "global" and not community_index.relevant(limit=1):
+            community_index.schedule()
+            logger.info("No community summaries yet, answering from the current idea's context")
+            retrieval_mode = RAG_RETRIEVAL_MODE if RAG_RETRIEVAL_MODE != "global" else "vector"
+        keywords_future = None
+        if retrieval_mode == "dual" and user_message:
+            keywords_future = retrieval_executor.submit(contextvars.copy_context().run,
+                                                        extract_query_keywords, user_message)
+        query_embedding = embed_query(user_message)
+        keywords = None
+        if keywords_future is not None:
+            try:
+                keywords = keywords_future.result()
+            except Exception as e:
+                logger.warning("Keyword extraction failed, using vector retrieval: %s", e)
+        
+        # Build comprehensive RAG context in whatever room the history leaves
+        history_tokens = sum(estimate_tokens(msg.get("text")) for msg in history)
+        global_search = None
+        with stage("rag_build") as rag_span:
+            if retrieval_mode == "global":
+                context_data, citations, context_usage, global_search = build_global_context(
+                    user_message, query_embedding, max_tokens=context_budget(CHAT_PROMPT_TOKENS, history_tokens))
+            else:
+                context_data, citations, context_usage = build_rag_context(
+                    current_idea,
+                    current_embedding,
+                    current_id,
+                    selected_idea_ids,
+                    max_tokens=context_budget(CHAT_PROMPT_TOKENS, history_tokens),
+                    query_embedding=query_embedding,
+                    keywords=keywords
+                )
+        rag_time = rag_span.duration
+        logger.debug("RAG context building: %.3fs (%d citations, %d/%d tokens)", rag_time, len(citations),
+                     context_usage["used"], context_usage["budget"])
         
         # Format system prompt with context
         system_prompt = CHAT_SYSTEM_PROMPT.replace("{context_data}", context_data)
@@ -795,50 +1580,62 @@ def chat():
             messages.append({"role": role, "content": msg["text"]})
         
         # Call LLM API
-        llm_start = time.time()
-        response = llm_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=messages,
-            temperature=0.8
-        )
-        llm_time = time.time() - llm_start
-        print(f"   LLM call: {llm_time:.2f}s")
+        with stage("llm_call") as llm_span:
+            response = llm_client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=0.8
+            )
+        llm_time = llm_span.duration
+        logger.debug("LLM call: %.2fs", llm_time)
         
         reply = response.choices[0].message.content
         
         # Detect evolution opportunities
-        user_message = history[-1]["text"] if history else ""
         evolution_suggestion = detect_evolution_opportunity(user_message, reply, current_idea)
         
         total_time = time.time() - start_time
-        print(f"✅ Total chat time: {total_time:.2f}s")
+        logger.info("Total chat time: %.2fs", total_time)
         
         response_data = {
             "text": reply,
-            "citations": citations
+            "citations": citations,
+            "context_tokens": context_usage
         }
         
+        if keywords:
+            response_data["keywords"] = keywords
+        
+        if global_search is not None:
+            response_data["global_search"] = global_search
+        
         if evolution_suggestion:
             response_data["evolution_suggestion"] = evolution_suggestion
-            print(f"   💡 Evolution opportunity detected: {evolution_suggestion['type']}")
+            logger.info("Evolution opportunity detected: %s", evolution_suggestion['type'])
         
         return jsonify(response_data)
     
     except Exception as e:
-        import traceback
-        print(f"❌ Chat error: {e}")
-        print(traceback.format_exc())
+        logger.exception("Chat error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/get_all_ideas", methods=["GET"])
 def get_all_ideas():
-    """Get all ideas from the vector database"""
+    """
+    Get all ideas from the vector database.
+
+    Embeddings are stored apart from the idea documents and only included
+    with `?include_embeddings=true`.
+    """
     try:
         vectors, ideas = load_vector_db()
         
         # Convert ideas dict to list and sort by created_at (newest first)
-        ideas_list = list(ideas.values())
+        if request.args.get("include_embeddings", "false").lower() == "true":
+            ideas_list = [with_embedding(idea, vectors.get(idea_id)) for idea_id, idea in ideas.items()]
+        else:
+            ideas_list = list(ideas.values())
         ideas_list.sort(key=lambda x: x.get('created_at', ''), reverse=True)
         
         return jsonify({"ideas": ideas_list})
@@ -873,26 +1670,15 @@ def delete_idea():
         if not idea_id:
             return jsonify({"error": "No idea_id provided"}), 400
         
-        print(f"🗑️  Deleting idea: {idea_id[:8]}...")
-        
-        # Load current database
-        vectors, ideas = load_vector_db()
+        logger.info("Deleting idea: %.8s...", idea_id)
         
-        # Check if idea exists
-        if idea_id not in ideas:
+        # Remove from both vectors and ideas
+        if not store.delete([idea_id]):
             return jsonify({"error": f"Idea not found: {idea_id}"}), 404
-        
-        # Remove from both dictionaries
-        if idea_id in vectors:
-            del vectors[idea_id]
-        if idea_id in ideas:
-            del ideas[idea_id]
-        
-        # Save updated database
-        save_vector_db(vectors, ideas)
+        chunk_index.schedule([idea_id])
         
         total_time = time.time() - start_time
-        print(f"✅ Idea deleted in {total_time:.3f}s")
+        logger.info("Idea deleted in %.3fs", total_time)
         
         return jsonify({
             "status": "success",
@@ -900,9 +1686,7 @@ def delete_idea():
         })
     
     except Exception as e:
-        import traceback
-        print(f"❌ Delete failed: {e}")
-        print(traceback.format_exc())
+        logger.exception("Delete failed: %s", e)
         return jsonify({"error": f"Delete operation failed: {str(e)}"}), 500
 
 
@@ -937,35 +1721,18 @@ def delete_ideas_batch():
         if not isinstance(idea_ids, list):
             return jsonify({"error": "idea_ids must be a list"}), 400
         
-        print(f"🗑️  Batch deleting {len(idea_ids)} ideas...")
+        logger.info("Batch deleting %d ideas...", len(idea_ids))
         
-        # Load current database
-        vectors, ideas = load_vector_db()
+        # Delete all found ideas in a single write
+        deleted_ids = store.delete(idea_ids)
+        chunk_index.schedule(deleted_ids)
+        deleted_set = set(deleted_ids)
+        not_found_ids = [idea_id for idea_id in idea_ids if idea_id not in deleted_set]
         
-        deleted_ids = []
-        not_found_ids = []
-        
-        # Process each idea
-        for idea_id in idea_ids:
-            if idea_id in ideas:
-                # Remove from both dictionaries
-                if idea_id in vectors:
-                    del vectors[idea_id]
-                if idea_id in ideas:
-                    del ideas[idea_id]
-                deleted_ids.append(idea_id)
-                print(f"   ✓ Deleted: {idea_id[:8]}...")
-            else:
-                not_found_ids.append(idea_id)
-                print(f"   ⚠️  Not found: {idea_id[:8]}...")
-        
-        # Save updated database once
-        if deleted_ids:
-            save_vector_db(vectors, ideas)
         
         total_time = time.time() - start_time
-        print(f"✅ Batch delete completed in {total_time:.3f}s")
-        print(f"   Deleted: {len(deleted_ids)}, Not found: {len(not_found_ids)}")
+        logger.info("Batch delete completed in %.3fs", total_time)
+        logger.info("Deleted: %d, Not found: %d", len(deleted_ids), len(not_found_ids))
         
         return jsonify({
             "status": "success",
@@ -975,9 +1742,7 @@ def delete_ideas_batch():
         })
     
     except Exception as e:
-        import traceback
-        print(f"❌ Batch delete failed: {e}")
-        print(traceback.format_exc())
+        logger.exception("Batch delete failed: %s", e)
         return jsonify({"error": f"Batch delete operation failed: {str(e)}"}), 500
 
 
@@ -1004,24 +1769,13 @@ def clear_chat_history():
         if not idea_id:
             return jsonify({"error": "No idea_id provided"}), 400
         
-        print(f"🧹 Clearing chat history for idea: {idea_id[:8]}...")
-        
-        # Load current database
-        vectors, ideas = load_vector_db()
+        logger.info("Clearing chat history for idea: %.8s...", idea_id)
         
-        # Check if idea exists
-        if idea_id not in ideas:
+        # Clear chat history (atomic read-modify-write on the latest version)
+        if store.update(idea_id, lambda idea: idea.pop('chat_history', None)) is None:
             return jsonify({"error": f"Idea not found: {idea_id}"}), 404
         
-        # Clear chat history
-        idea = ideas[idea_id]
-        if 'chat_history' in idea:
-            del idea['chat_history']
-        
-        # Save updated database
-        save_vector_db(vectors, ideas)
-        
-        print(f"✅ Chat history cleared for {idea_id[:8]}")
+        logger.info("Chat history cleared for %.8s", idea_id)
         
         return jsonify({
             "status": "success",
@@ -1029,12 +1783,26 @@ def clear_chat_history():
         })
     
     except Exception as e:
-        import traceback
-        print(f"❌ Clear chat history failed: {e}")
-        print(traceback.format_exc())
+        logger.exception("Clear chat history failed: %s", e)
         return jsonify({"error": f"Clear operation failed: {str(e)}"}), 500
 
 
+def extract_query_keywords(query):
+    """
+    High-level (themes) and low-level (entities) keywords of a query, from the LLM.
+    
+    Returns: {"high_level_keywords": [...], "low_level_keywords": [...]}
+    """
+    keywords = llm_json("keyword_llm_call", SYSTEM_PROMPT_KEYWORDS, f"Extract keywords from this query:\n\n{query}")
+    
+    # Validate structure
+    if "high_level_keywords" not in keywords:
+        keywords["high_level_keywords"] = []
+    if "low_level_keywords" not in keywords:
+        keywords["low_level_keywords"] = []
+    return keywords
+
+
 @app.route("/api/extract_keywords", methods=["POST"])
 def extract_keywords():
     """
@@ -1064,75 +1832,24 @@ def extract_keywords():
         if not query:
             return jsonify({"error": "No query provided"}), 400
         
-        print(f"🔑 Extracting keywords from: {query[:100]}...")
-        
-        # Call LLM API for keyword extraction
-        llm_start = time.time()
-        
-        request_params = {
-            "model": LLM_MODEL,
-            "messages": [
-                {"role": "system", "content": SYSTEM_PROMPT_KEYWORDS},
-                {"role": "user", "content": f"Extract keywords from this query:\n\n{query}"}
-            ],
-            "temperature": 0.3
-        }
-        
-        # Try with JSON response format
-        try:
-            request_params["response_format"] = {"type": "json_object"}
-            response = llm_client.chat.completions.create(**request_params)
-        except Exception as e:
-            print(f"⚠️  response_format not supported, using normal mode: {e}")
-            del request_params["response_format"]
-            response = llm_client.chat.completions.create(**request_params)
-        
-        llm_time = time.time() - llm_start
-        print(f"   LLM call: {llm_time:.2f}s")
-        
-        result_text = response.choices[0].message.content
-        
-        # Parse JSON response
-        try:
-            keywords = json.loads(result_text)
-        except json.JSONDecodeError:
-            # Try to extract JSON from markdown code blocks
-            if "```json" in result_text:
-                json_start = result_text.find("```json") + 7
-                json_end = result_text.find("```", json_start)
-                result_text = result_text[json_start:json_end].strip()
-                keywords = json.loads(result_text)
-            elif "```" in result_text:
-                json_start = result_text.find("```") + 3
-                json_end = result_text.find("```", json_start)
-                result_text = result_text[json_start:json_end].strip()
-                keywords = json.loads(result_text)
-            else:
-                raise
-        
-        # Validate structure
-        if "high_level_keywords" not in keywords:
-            keywords["high_level_keywords"] = []
-        if "low_level_keywords" not in keywords:
-            keywords["low_level_keywords"] = []
+        logger.info("Extracting keywords from: %.100s...", query)
+        keywords = extract_query_keywords(query)
         
         total_time = time.time() - start_time
-        print(f"✅ Keyword extraction: {total_time:.2f}s")
-        print(f"   High-level: {keywords['high_level_keywords']}")
-        print(f"   Low-level: {keywords['low_level_keywords']}")
+        logger.info("Keyword extraction: %.2fs", total_time)
+        logger.debug("High-level: %s", keywords['high_level_keywords'])
+        logger.debug("Low-level: %s", keywords['low_level_keywords'])
         
         return jsonify(keywords)
     
     except Exception as e:
-        import traceback
-        print(f"❌ Keyword extraction error: {e}")
-        print(traceback.format_exc())
+        logger.exception("Keyword extraction error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/health", methods=["GET"])
 def health():
-    """Health check endpoint"""
+    """Health check endpoint (configuration summary; never loads the databases)"""
     return jsonify({
         "status": "ok" if llm_client else "not_configured",
         "api_configured": llm_client is not None,
@@ -1141,10 +1858,142 @@ def health():
         "llm_base_url": LLM_BASE_URL,
         "embedding_base_url": EMBEDDING_BASE_URL,
         "vector_db_exists": VECTOR_DB_PATH.exists(),
-        "ideas_count": len(load_vector_db()[0]) if VECTOR_DB_PATH.exists() else 0
+        "ideas_count": store.status()["ideas"]
+    })
+
+
+@app.route("/api/health/live", methods=["GET"])
+def health_live():
+    """Liveness: the worker is up and answering requests"""
+    return jsonify({
+        "status": "alive",
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.time() - PROCESS_STARTED_AT, 3)
+    })
+
+
+@app.route("/api/health/ready", methods=["GET"])
+def health_ready():
+    """
+    Readiness from in-memory state only: store loaded, index state, queue
+    depths and upstream circuit state. 503 until the store has been loaded.
+    """
+    store_status = store.status()
+    upstream = upstream_status()
+    ready = store_status["loaded"]
+    degraded = any(p["state"] != "closed" for p in upstream.values())
+    body = {
+        "status": "degraded" if ready and degraded else "ready" if ready else "not_ready",
+        "api_configured": llm_client is not None,
+        "store": store_status,
+        "index": embedding_index.stats(),
+        "queues": {
+            "log_records": logging_config.queue_depth(),
+            "trace_exports": tracing.export_queue_depths(),
+        },
+        "upstream": upstream,
+    }
+    return jsonify(body), 200 if ready else 503
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics (request latency per route and stage, upstream usage, store size)"""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/debug/traces", methods=["GET"])
+@admin_required
+def debug_traces():
+    """Slowest recent requests with their span trees (?limit=20&route=/api/chat)"""
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify({
+        "buffered": len(tracing.recent_traces),
+        "traces": tracing.recent_traces.slowest(limit, request.args.get("route"))
     })
 
 
+@app.route("/api/debug/profile", methods=["GET", "POST", "DELETE"])
+@admin_required
+def debug_profile():
+    """
+    Profile the next N requests of a route.
+
+    POST {"route": "chat" | "/api/chat", "count": 5, "mode": "cprofile" | "sampling", "interval_ms": 5}
+    GET lists the armed state and the result files, DELETE disarms.
+    """
+    if request.method == "POST":
+        data = request.json or {}
+        try:
+            status = profiler.arm(
+                data.get("route", ""),
+                int(data.get("count", 1)),
+                data.get("mode", "cprofile"),
+                int(data.get("interval_ms", 5))
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        logger.info("Profiling armed: %s", status)
+        return jsonify(status)
+    if request.method == "DELETE":
+        profiler.disarm()
+    return jsonify({**profiler.status(), "results": profiler.results()})
+
+
+@app.route("/api/debug/profile/<name>", methods=["GET"])
+@admin_required
+def download_profile(name):
+    """Download a .pstats (load with pstats / snakeviz) or .collapsed (flamegraph.pl / speedscope) file"""
+    path = profiler.result_path(name)
+    if path is None:
+        return jsonify({"error": f"Profile not found: {name}"}), 404
+    return send_from_directory(path.parent, path.name, as_attachment=True)
+
+
+@app.route("/api/debug/memory", methods=["GET", "POST"])
+@admin_required
+def debug_memory():
+    """
+    Memory accounting for this worker process.
+
+    GET reports RSS, the store breakdown and the shared index mapping;
+    `?diff=<snapshot>[&current=<snapshot>][&top=20]` also diffs two tracemalloc snapshots.
+    POST {"action": "start" | "snapshot" | "stop", "frames": 1} controls tracemalloc.
+    """
+    if request.method == "POST":
+        data = request.json or {}
+        action = data.get("action")
+        if action == "start":
+            memory_tracer.start(int(data.get("frames", 1)))
+        elif action == "stop":
+            memory_tracer.stop()
+        elif action == "snapshot":
+            try:
+                return jsonify({"snapshot": memory_tracer.take_snapshot(), **memory_tracer.status()})
+            except RuntimeError as e:
+                return jsonify({"error": str(e)}), 409
+        else:
+            return jsonify({"error": "action must be one of: start, snapshot, stop"}), 400
+        return jsonify(memory_tracer.status())
+
+    index_stats = embedding_index.stats()
+    result = {
+        "process": process_memory(),
+        "store": store_breakdown(store.snapshot()),
+        "shared_index": {"rows": index_stats["rows"], "mapped_bytes": index_stats["mapped_bytes"]},
+        "tracemalloc": memory_tracer.status(),
+    }
+    base = request.args.get("diff")
+    if base:
+        try:
+            result["diff"] = memory_tracer.diff(base, request.args.get("current"), request.args.get("top", 20, type=int))
+        except FileNotFoundError as e:
+            return jsonify({"error": f"Snapshot not found: {e}"}), 404
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 409
+    return jsonify(result)
+
+
 # ============ Evolution Command Endpoints ============
 
 from evolution_processor import EvolutionProcessor
@@ -1177,7 +2026,6 @@ def merge_ideas():
     }
     """
     import time
-    import traceback
     start_time = time.time()
     
     try:
@@ -1194,40 +2042,38 @@ def merge_ideas():
         if len(idea_ids) < 2:
             return jsonify({"error": "At least 2 ideas required for merge"}), 400
         
-        print(f"🔀 Merging {len(idea_ids)} ideas: {[id[:8] for id in idea_ids]}")
+        logger.info("Merging %d ideas: %s", len(idea_ids), [id[:8] for id in idea_ids])
         
         # Load ideas from database
-        vectors, ideas = load_vector_db()
+        ideas_to_merge = [store.get(id) for id in idea_ids]
         
         # Verify all ideas exist
-        missing_ids = [id for id in idea_ids if id not in ideas]
+        missing_ids = [id for id, idea in zip(idea_ids, ideas_to_merge) if idea is None]
         if missing_ids:
             return jsonify({
                 "error": f"Ideas not found: {missing_ids}"
             }), 404
         
-        # Get idea objects
-        ideas_to_merge = [ideas[id] for id in idea_ids]
-        
         # Perform merge
-        merge_start = time.time()
-        merged_idea = evolution_processor.merge_ideas(ideas_to_merge)
-        merge_time = time.time() - merge_start
-        print(f"   Merge processing: {merge_time:.2f}s")
+        with stage("merge") as merge_span:
+            merged_idea = evolution_processor.merge_ideas(ideas_to_merge)
+        merge_time = merge_span.duration
+        logger.debug("Merge processing: %.2fs", merge_time)
         
         # Save merged idea to database
-        db_start = time.time()
-        add_to_vector_db(
-            merged_idea['idea_id'],
-            merged_idea['embedding_vector'],
-            merged_idea
-        )
-        db_time = time.time() - db_start
-        print(f"   DB save: {db_time:.3f}s")
+        with stage("db_write") as db_span:
+            add_to_vector_db(
+                merged_idea['idea_id'],
+                merged_idea['embedding_vector'],
+                merged_idea
+            )
+        db_time = db_span.duration
+        chunk_index.schedule([merged_idea['idea_id']])
+        logger.debug("DB save: %.3fs", db_time)
         
         total_time = time.time() - start_time
-        print(f"✅ Merge completed in {total_time:.2f}s")
-        print(f"   New idea: {merged_idea['idea_id'][:8]} - {merged_idea['distilled_data'].get('one_liner', 'N/A')}")
+        logger.info("Merge completed in %.2fs", total_time)
+        logger.info("New idea: %.8s - %s", merged_idea['idea_id'], merged_idea['distilled_data'].get('one_liner', 'N/A'))
         
         return jsonify({
             "status": "success",
@@ -1235,12 +2081,11 @@ def merge_ideas():
         })
     
     except ValueError as e:
-        print(f"❌ Merge validation error: {e}")
+        logger.error("Merge validation error: %s", e)
         return jsonify({"error": str(e)}), 400
     
     except Exception as e:
-        print(f"❌ Merge failed: {e}")
-        print(f"   Traceback: {traceback.format_exc()}")
+        logger.exception("Merge failed: %s", e)
         return jsonify({"error": f"Merge operation failed: {str(e)}"}), 500
 
 
@@ -1261,7 +2106,6 @@ def split_idea():
     }
     """
     import time
-    import traceback
     start_time = time.time()
     
     try:
@@ -1275,47 +2119,39 @@ def split_idea():
         if not idea_id:
             return jsonify({"error": "No idea_id provided"}), 400
         
-        print(f"✂️  Splitting idea: {idea_id[:8]}")
+        logger.info("Splitting idea: %.8s", idea_id)
         
         # Load idea from database
-        vectors, ideas = load_vector_db()
+        idea = store.get(idea_id)
         
-        if idea_id not in ideas:
+        if idea is None:
             return jsonify({"error": f"Idea not found: {idea_id}"}), 404
         
-        idea = ideas[idea_id]
-        
         # Perform split
-        split_start = time.time()
-        sub_ideas = evolution_processor.split_idea(idea)
-        split_time = time.time() - split_start
-        print(f"   Split processing: {split_time:.2f}s (created {len(sub_ideas)} sub-ideas)")
-        
-        # Update parent idea with child_idea_ids
-        idea['child_idea_ids'] = [sub['idea_id'] for sub in sub_ideas]
-        if 'linked_idea_ids' not in idea:
-            idea['linked_idea_ids'] = []
-        idea['linked_idea_ids'].extend(idea['child_idea_ids'])
-        
-        # Save all sub-ideas and updated parent to database
-        db_start = time.time()
-        for sub_idea in sub_ideas:
-            add_to_vector_db(
-                sub_idea['idea_id'],
-                sub_idea['embedding_vector'],
-                sub_idea
-            )
-        
-        # Re-save parent with updated relationships
-        add_to_vector_db(idea_id, vectors[idea_id], idea)
-        
-        db_time = time.time() - db_start
-        print(f"   DB save: {db_time:.3f}s")
+        with stage("split") as split_span:
+            sub_ideas = evolution_processor.split_idea(idea)
+        split_time = split_span.duration
+        logger.debug("Split processing: %.2fs (created %d sub-ideas)", split_time, len(sub_ideas))
+        
+        child_ids = [sub['idea_id'] for sub in sub_ideas]
+        
+        def link_children(parent):
+            parent['child_idea_ids'] = child_ids
+            parent.setdefault('linked_idea_ids', []).extend(child_ids)
+        
+        # Save all sub-ideas and link them from the parent in one atomic write
+        with stage("db_write") as db_span:
+            with store.transaction() as txn:
+                for sub_idea in sub_ideas:
+                    txn.put(sub_idea['idea_id'], sub_idea['embedding_vector'], sub_idea)
+                idea = txn.update(idea_id, link_children) or idea
+                idea = with_embedding(idea, txn.vector(idea_id))
+        db_time = db_span.duration
+        chunk_index.schedule(child_ids)
+        logger.debug("DB save: %.3fs", db_time)
         
         total_time = time.time() - start_time
-        print(f"✅ Split completed in {total_time:.2f}s")
-        for idx, sub in enumerate(sub_ideas, 1):
-            print(f"   Sub-idea {idx}: {sub['idea_id'][:8]} - {sub['distilled_data'].get('one_liner', 'N/A')}")
+        logger.info("Split completed in %.2fs", total_time)
         
         return jsonify({
             "status": "success",
@@ -1324,12 +2160,11 @@ def split_idea():
         })
     
     except ValueError as e:
-        print(f"❌ Split validation error: {e}")
+        logger.error("Split validation error: %s", e)
         return jsonify({"error": str(e)}), 400
     
     except Exception as e:
-        print(f"❌ Split failed: {e}")
-        print(f"   Traceback: {traceback.format_exc()}")
+        logger.exception("Split failed: %s", e)
         return jsonify({"error": f"Split operation failed: {str(e)}"}), 500
 
 
@@ -1351,7 +2186,6 @@ def refine_idea():
     }
     """
     import time
-    import traceback
     start_time = time.time()
     
     try:
@@ -1369,37 +2203,43 @@ def refine_idea():
         if not new_context:
             return jsonify({"error": "No new_context provided"}), 400
         
-        print(f"✨ Refining idea: {idea_id[:8]}")
-        print(f"   New context: {new_context[:100]}...")
+        logger.info("Refining idea: %.8s", idea_id)
+        logger.debug("New context: %.100s...", new_context)
         
         # Load idea from database
-        vectors, ideas = load_vector_db()
+        idea = store.get(idea_id)
         
-        if idea_id not in ideas:
+        if idea is None:
             return jsonify({"error": f"Idea not found: {idea_id}"}), 404
         
-        idea = ideas[idea_id]
-        
         # Perform refinement
-        refine_start = time.time()
-        refined_idea = evolution_processor.refine_idea(idea, new_context)
-        refine_time = time.time() - refine_start
-        print(f"   Refine processing: {refine_time:.2f}s")
-        
-        # Save refined idea to database
-        db_start = time.time()
-        add_to_vector_db(
-            refined_idea['idea_id'],
-            refined_idea['embedding_vector'],
-            refined_idea
-        )
-        db_time = time.time() - db_start
-        print(f"   DB save: {db_time:.3f}s")
+        with stage("refine") as refine_span:
+            refined_idea = evolution_processor.refine_idea(idea, new_context)
+        refine_time = refine_span.duration
+        logger.debug("Refine processing: %.2fs", refine_time)
+        
+        # Save refined idea to database. Apply the refined fields to the latest
+        # version so changes made while the LLM was running are not lost.
+        with stage("db_write") as db_span:
+            refined_fields = ['distilled_data', 'content_raw', 'last_modified', 'version']
+            embedding_vector = refined_idea['embedding_vector']
+            refined_idea = store.update(
+                idea_id,
+                lambda latest: latest.update({field: refined_idea[field] for field in refined_fields}),
+                vector=embedding_vector
+            )
+            if refined_idea is None:
+                return jsonify({"error": f"Idea was deleted during refinement: {idea_id}"}), 404
+            refined_idea = with_embedding(refined_idea, embedding_vector)
+        db_time = db_span.duration
+        # Only the appended passage is embedded; earlier ones keep their vectors
+        chunk_index.schedule([idea_id])
+        logger.debug("DB save: %.3fs", db_time)
         
         total_time = time.time() - start_time
-        print(f"✅ Refine completed in {total_time:.2f}s")
-        print(f"   Updated: {refined_idea['distilled_data'].get('one_liner', 'N/A')}")
-        print(f"   Version: {refined_idea.get('version', 1)}")
+        logger.info("Refine completed in %.2fs", total_time)
+        logger.info("Updated: %s", refined_idea['distilled_data'].get('one_liner', 'N/A'))
+        logger.debug("Version: %s", refined_idea.get('version', 1))
         
         return jsonify({
             "status": "success",
@@ -1407,12 +2247,11 @@ def refine_idea():
         })
     
     except ValueError as e:
-        print(f"❌ Refine validation error: {e}")
+        logger.error("Refine validation error: %s", e)
         return jsonify({"error": str(e)}), 400
     
     except Exception as e:
-        print(f"❌ Refine failed: {e}")
-        print(f"   Traceback: {traceback.format_exc()}")
+        logger.exception("Refine failed: %s", e)
         return jsonify({"error": f"Refine operation failed: {str(e)}"}), 500
 
 
@@ -1438,6 +2277,29 @@ def serve_static(path):
             return jsonify({"error": "Frontend not built. Please run 'npm run build' first."}), 404
 
 
+def preload():
+    """
+    Load the databases before the WSGI server forks its workers.
+
+    Called once from wsgi.py. With gunicorn's preload_app the master process
+    does the work and the workers inherit it copy-on-write instead of each
+    paying the startup cost: the module-level store, the shared embedding
+    index and the in-memory keyword / BM25 / entity / graph indexes.
+    """
+    store.refresh()
+    embedding_index.sync()
+    for index in (keyword_index, bm25_index, entity_index, graph_index):
+        index.warm()
+    logger.info("Preloaded %d ideas (store version %d, index %s)", store.count(), store.version, embedding_index.state)
+
+
+def shutdown():
+    """Flush pending journal records into the snapshot files on worker exit"""
+    store.compact()
+    chunk_index.compact()
+    metrics.registry.dump()
+
+
 if __name__ == "__main__":
     # 魔搭社区创空间需要监听 7860 端口
     port = int(os.getenv("PORT", 7860))
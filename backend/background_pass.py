@@ -0,0 +1,155 @@
+"""
+Background Pass for IdeaGraph AI
+State derived from the whole store, recomputed on a background thread and shared by all workers through a file
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from forking import reset_after_fork
+
+try:
+    import fcntl
+except ImportError:  # Windows: passes are only coordinated within one process
+    fcntl = None
+
+logger = logging.getLogger("ideagraph.passes")
+
+
+class BackgroundPass:
+    """
+    A JSON state file recomputed from a store snapshot after writes settle.
+
+    Every store change schedules a pass, which runs on a background thread
+    once writes have been quiet for `delay` seconds, so bursts of writes
+    share one pass. A pass holds a file lock (other processes skip theirs
+    meanwhile) and writes the state atomically; `state()` reloads it only
+    when another process wrote a newer one.
+
+    Subclasses name their files (`state_file`, `lock_file`) and implement
+    `_empty_state()` and `_pass(snap, previous)`, which returns counts for
+    the log and writes the new state with `_write()`.
+    """
+
+    state_file = "state.json"
+    lock_file = "pass.lock"
+    thread_name = "background-pass"
+    description = "Background pass"
+    log = logger
+
+    def __init__(self, store, data_dir, delay: float):
+        self.store = store
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.state_path = self.data_dir / self.state_file
+        self.lock_path = self.data_dir / self.lock_file
+        self.delay = delay
+        self._state: Optional[Dict[str, Any]] = None
+        self._state_stamp = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._thread: Optional[threading.Thread] = None
+
+        store.subscribe(self._on_store_change)
+        reset_after_fork(self)
+
+    # ============ State ============
+
+    def state(self) -> Dict[str, Any]:
+        """Last persisted pass (reloaded when another process wrote a newer one)"""
+        try:
+            st = self.state_path.stat()
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return self._empty_state()
+        if stamp != self._state_stamp:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            self._loaded(state)
+            self._state, self._state_stamp = state, stamp
+        return self._state
+
+    @property
+    def pending(self) -> bool:
+        return self._dirty or (self._thread is not None)
+
+    def _empty_state(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _loaded(self, state: Dict[str, Any]) -> None:
+        """Called with every state read from disk, before it is served"""
+
+    def _write(self, state: Dict[str, Any], path: Optional[Path] = None) -> None:
+        """Atomically write the state (or another file of the pass, at `path`)"""
+        path = path or self.state_path
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # ============ Passes ============
+
+    def run_pass(self) -> Dict[str, int]:
+        """Run one pass now; {} if another process is running one or the state is current"""
+        with open(self.lock_path, 'a+b') as lock_file:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return {}
+            snap = self.store.snapshot()
+            previous = self.state()
+            if self._is_current(previous, snap):
+                return {}
+            return self._pass(snap, previous)
+
+    def _is_current(self, previous: Dict[str, Any], snap) -> bool:
+        return previous["version"] == snap.version
+
+    def _pass(self, snap, previous: Dict[str, Any]) -> Dict[str, int]:
+        raise NotImplementedError
+
+    # ============ Scheduling ============
+
+    def _on_store_change(self, snapshot, changes) -> None:
+        self.schedule()
+
+    def schedule(self) -> None:
+        """Run a pass on a background thread once writes have been quiet for `delay` seconds"""
+        with self._lock:
+            self._dirty = True
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.delay)
+            with self._lock:
+                if not self._dirty:
+                    self._thread = None
+                    return
+                self._dirty = False
+            try:
+                self.run_pass()
+            except Exception as e:
+                self.log.warning("%s failed: %s", self.description, e)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait for scheduled passes to finish"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._thread = None
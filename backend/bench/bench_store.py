@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Storage / Search Benchmarks for IdeaGraph AI
+
+Times our own hot paths against synthetic corpora (no provider calls):
+load, save, search_similar_ideas, build_rag_context, get_all_ideas
+serialization and delete, plus memory use. Results are written as JSON so
+runs can be compared:
+
+    python bench/bench_store.py --sizes 1000 10000 --dim 1536 --output before.json
+    python bench/bench_store.py --sizes 1000 10000 --dim 1536 --output after.json --compare before.json
+
+Sizes up to 1M work, but need roughly size * dim * 8 bytes of RAM and disk
+for the vectors alone (12 GB for 1M at 1536 dimensions).
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+
+import app as backend_app
+from corpus import generate_corpus, populate
+from memory_stats import process_memory, store_breakdown
+from storage import IdeaStore
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Latency summary in milliseconds"""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "count": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "min_ms": round(float(ms.min()), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def timed(func: Callable, repeat: int) -> List[float]:
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _rss() -> int:
+    return process_memory().get("vmrss", 0)
+
+
+def bench_size(size: int, dim: int, repeat: int, seed: int, work_dir: Path) -> Dict[str, Any]:
+    """Run every benchmark against one freshly generated corpus"""
+    data_dir = work_dir / f"corpus-{size}"
+    result: Dict[str, Any] = {"size": size, "dim": dim}
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    ids = populate(IdeaStore(data_dir), size, dim, seed)
+    result["generate_seconds"] = round(time.perf_counter() - start, 3)
+    result["disk_bytes"] = sum(p.stat().st_size for p in data_dir.iterdir() if p.is_file())
+    gc.collect()
+
+    # Cold load of the snapshot files, as a freshly started worker does
+    rss_before = _rss()
+    load_samples = timed(lambda i: IdeaStore(data_dir).refresh(), max(1, min(repeat, 5)))
+    result["load"] = summarize(load_samples)
+    gc.collect()
+
+    backend_app.init_storage(data_dir)
+    store = backend_app.store
+    store.refresh()
+    start = time.perf_counter()
+    backend_app.embedding_index.sync()
+    result["index_build_seconds"] = round(time.perf_counter() - start, 3)
+    result["memory"] = {
+        "rss_delta_after_load": _rss() - rss_before,
+        "store": store_breakdown(store.snapshot())["bytes"],
+    }
+
+    queries = np.random.default_rng(seed + 2).standard_normal((repeat, dim))
+    result["search_similar_ideas"] = summarize(timed(
+        lambda i: backend_app.search_similar_ideas(queries[i], top_k=3), repeat))
+
+    snap = store.snapshot()
+    rag_ids = [rng.choice(ids) for _ in range(repeat)]
+    result["build_rag_context"] = summarize(timed(
+        lambda i: backend_app.build_rag_context(snap.ideas[rag_ids[i]], snap.vectors[rag_ids[i]], rag_ids[i]),
+        repeat))
+
+    client = backend_app.app.test_client()
+    body_sizes = []
+
+    def get_all(i):
+        body_sizes.append(len(client.get("/api/get_all_ideas").data))
+
+    result["get_all_ideas"] = summarize(timed(get_all, max(1, min(repeat, 10))))
+    result["get_all_ideas"]["response_bytes"] = body_sizes[-1]
+
+    new_ideas = list(generate_corpus(repeat, dim, seed + 3))
+
+    def save(i):
+        idea_id, vector, idea = new_ideas[i]
+        response = client.post("/api/save_idea", json={
+            "idea_id": idea_id, "embedding_vector": vector.tolist(), "idea_data": idea})
+        assert response.status_code == 200, response.data
+
+    result["save"] = summarize(timed(save, repeat))
+
+    def delete(i):
+        response = client.post("/api/delete_idea", json={"idea_id": new_ideas[i][0]})
+        assert response.status_code == 200, response.data
+
+    result["delete"] = summarize(timed(delete, repeat))
+    backend_app.embedding_index.wait()
+    backend_app.chunk_index.wait()
+    backend_app.entity_resolver.wait()
+    return result
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+OPERATIONS = ["load", "search_similar_ideas", "build_rag_context", "get_all_ideas", "save", "delete"]
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], metric: str = "p50_ms") -> List[str]:
+    """One line per (size, operation) present in both runs, with the relative change"""
+    lines = []
+    base_by_size = {r["size"]: r for r in baseline["results"]}
+    for run in current["results"]:
+        base = base_by_size.get(run["size"])
+        if base is None:
+            continue
+        for op in OPERATIONS:
+            if op in run and op in base and base[op][metric]:
+                change = (run[op][metric] - base[op][metric]) / base[op][metric] * 100
+                lines.append(f"{run['size']:>9} {op:<22} {base[op][metric]:>10.3f} -> "
+                             f"{run[op][metric]:>10.3f} ms ({change:+.1f}%)")
+    return lines
+
+
+def run(sizes: List[int], dim: int, repeat: int, seed: int = 0,
+        work_dir: Optional[str] = None) -> Dict[str, Any]:
+    # Per-request INFO logs would be timed too; restored so callers (tests) keep their logging
+    logger = logging.getLogger("ideagraph")
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+            results = []
+            for size in sizes:
+                print(f"🔍 Benchmarking {size} ideas ({dim} dimensions)...")
+                result = bench_size(size, dim, repeat, seed, Path(tmp))
+                for op in OPERATIONS:
+                    print(f"   {op:<22} p50 {result[op]['p50_ms']:>10.3f} ms   p95 {result[op]['p95_ms']:>10.3f} ms")
+                results.append(result)
+    finally:
+        logger.setLevel(level)
+    return {"environment": environment(), "dim": dim, "repeat": repeat, "seed": seed, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="corpus sizes to benchmark (e.g. 1000 10000 100000 1000000)")
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="where to write the temporary corpora (default: system temp)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare p50 latencies against")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Storage / Search Benchmarks")
+    print("=" * 60)
+    report = run(args.sizes, args.dim, args.repeat, args.seed, args.work_dir)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\n✅ Results written to {args.output}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print("\nChange in p50 latency vs", args.compare)
+        for line in compare(report, baseline):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Synthetic Idea Corpus for IdeaGraph AI benchmarks
+Random embeddings plus idea documents shaped like real distill output
+"""
+
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+
+ENTITY_TYPES = ["Concept", "Tool", "Person", "Problem", "Solution", "Methodology", "Metric"]
+RELATIONS = ["solves", "causes", "contradicts", "consists_of", "depends_on",
+             "enables", "disrupts", "powered_by", "relates_to"]
+
+# Shared vocabulary so entity names repeat across ideas like they do in practice
+_WORDS = (
+    "adaptive agent analytics architecture attention baseline battery benchmark budget cache "
+    "carbon circuit cluster cognitive community compiler consensus context contract curriculum "
+    "dataset decision design diffusion distributed ecosystem edge embedding energy entropy "
+    "experiment feedback finance framework gateway gradient graph habit hardware heuristic "
+    "incentive index inference interface journal kernel knowledge language latency ledger "
+    "learning market memory metric migration model momentum network neuron notebook onboarding "
+    "optimizer orchestration pipeline platform policy pricing privacy protocol quality query "
+    "queue ranking reasoning recall reliability retrieval robotics routing runtime sampling "
+    "scheduler schema search security sensor signal simulation storage strategy streaming "
+    "supply sustainability synthesis telemetry tensor throughput token transformer trust "
+    "vector verification virtual workflow workload"
+).split()
+
+
+def _phrase(rng: random.Random, low: int, high: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _sentence(rng: random.Random) -> str:
+    text = _phrase(rng, 8, 20)
+    return text[0].upper() + text[1:] + "."
+
+
+def generate_idea(rng: random.Random, idea_id: str, created_at: datetime,
+                  chat_probability: float = 0.2) -> Dict[str, Any]:
+    """One idea document (without its embedding, as the store keeps it)"""
+    node_count = rng.randint(4, 12)
+    nodes = [{"id": "core", "name": _phrase(rng, 2, 4).title(), "type": "Concept",
+              "desc": _sentence(rng)}]
+    for i in range(1, node_count):
+        nodes.append({"id": f"node{i}", "name": _phrase(rng, 1, 3).title(),
+                      "type": rng.choice(ENTITY_TYPES), "desc": _sentence(rng)})
+    edges = []
+    for i in range(1, node_count):
+        edges.append({"source": "core", "target": f"node{i}",
+                      "relation": rng.choice(RELATIONS), "desc": _sentence(rng)})
+    for _ in range(rng.randint(0, node_count)):
+        a, b = rng.sample(range(1, node_count), 2)
+        edges.append({"source": nodes[a]["id"], "target": nodes[b]["id"],
+                      "relation": rng.choice(RELATIONS), "desc": ""})
+
+    raw = " ".join(_sentence(rng) for _ in range(rng.randint(3, 15)))
+    idea = {
+        "idea_id": idea_id,
+        "created_at": created_at.isoformat(),
+        "content_raw": raw,
+        "distilled_data": {
+            "one_liner": _phrase(rng, 6, 18).capitalize(),
+            "tags": sorted({rng.choice(_WORDS) for _ in range(rng.randint(3, 5))}),
+            "summary": " ".join(_sentence(rng) for _ in range(rng.randint(2, 5))),
+            "graph_structure": {"nodes": nodes, "edges": edges},
+        },
+        "linked_idea_ids": [],
+    }
+    if rng.random() < chat_probability:
+        idea["chat_history"] = [
+            {"id": str(uuid.UUID(int=rng.getrandbits(128))), "role": "user" if i % 2 == 0 else "model",
+             "content": " ".join(_sentence(rng) for _ in range(rng.randint(1, 6))),
+             "timestamp": (created_at + timedelta(minutes=i)).isoformat()}
+            for i in range(rng.randint(2, 12))
+        ]
+    return idea
+
+
+def generate_corpus(count: int, dim: int = 1536, seed: int = 0,
+                    chat_probability: float = 0.2) -> Iterator[Tuple[str, np.ndarray, Dict[str, Any]]]:
+    """
+    Yield (idea_id, embedding, idea) triples; the same seed gives the same corpus.
+
+    Streams so that large corpora never need to be held twice in memory.
+    """
+    rng = random.Random(seed)
+    vectors = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        idea_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        idea = generate_idea(rng, idea_id, start + timedelta(minutes=i), chat_probability)
+        yield idea_id, vectors.standard_normal(dim), idea
+
+
+def populate(store, count: int, dim: int = 1536, seed: int = 0, batch: int = 1000,
+             chat_probability: float = 0.2) -> List[str]:
+    """Write a synthetic corpus into an IdeaStore in batches; returns the idea ids"""
+    ids: List[str] = []
+    pending = []
+    for item in generate_corpus(count, dim, seed, chat_probability):
+        ids.append(item[0])
+        pending.append(item)
+        if len(pending) >= batch:
+            store.put_many(pending)
+            pending = []
+    if pending:
+        store.put_many(pending)
+    # Link some ideas to each other so lineage-following code has work to do
+    rng = random.Random(seed + 1)
+    if len(ids) > 1:
+        with store.transaction() as txn:
+            for idea_id in rng.sample(ids, max(1, len(ids) // 20)):
+                others = rng.sample(ids, min(3, len(ids)))
+                txn.update(idea_id, lambda doc, o=others: doc["linked_idea_ids"].extend(
+                    x for x in o if x != doc["idea_id"]))
+    store.compact()
+    return ids
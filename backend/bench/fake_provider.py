@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Fake LLM / Embedding Provider for IdeaGraph AI
+
+A local OpenAI-compatible server (`/v1/chat/completions`, `/v1/embeddings`,
+`/v1/models`) so the backend can be tested and load-tested without network
+access or an API key. Responses depend only on the request:
+
+  - distill, merge, split, refine, keyword, community summary and global
+    map prompts get well-formed JSON built from the words of the input;
+    anything else gets a chat reply
+  - embeddings are hashed bags of words of the configured dimension, so
+    texts sharing words are similar
+
+Latency and failures are drawn from configurable distributions. With
+`--cassette` the recorded responses and timings of real traffic (see
+backend/cassette.py) are served instead, falling back to the above for
+requests the cassette does not cover:
+
+    python bench/fake_provider.py --port 8001 --chat-latency lognormal:800:0.5 \\
+        --embedding-latency normal:120:30 --failure-rate 0.01
+
+    python bench/fake_provider.py --port 8001 --cassette data/cassettes/upstream.jsonl --latency-scale 0.5
+
+    LLM_API_KEY=fake LLM_BASE_URL=http://127.0.0.1:8001/v1 python app.py
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cassette import Cassette
+
+
+_WORD = re.compile(r"[^\W\d_]{3,}", re.UNICODE)
+_STOPWORDS = set(
+    "the and for with that this from into your you are was were have has had not but its "
+    "their they them then than there these those what which when where who why how about "
+    "idea ideas text json return only each should must will can one more most other some "
+    "such also just like into over under very summary tags liner original information".split()
+)
+ENTITY_TYPES = ["Concept", "Tool", "Person", "Problem", "Solution", "Methodology", "Metric"]
+RELATIONS = ["enables", "depends_on", "relates_to", "solves", "consists_of"]
+
+
+class LatencyModel:
+    """
+    Delay distribution parsed from "kind:arg1:arg2" (all times in milliseconds):
+
+      fixed:MS, uniform:LOW:HIGH, normal:MEAN:STDDEV, lognormal:MEDIAN:SIGMA
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.args = [float(p) for p in parts[1:]]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.args) != expected[self.kind]:
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+        self.spec = spec
+
+    def sample(self, rng: random.Random) -> float:
+        """Delay in seconds"""
+        if self.kind == "fixed":
+            ms = self.args[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.args)
+        elif self.kind == "normal":
+            ms = rng.gauss(*self.args)
+        else:
+            ms = self.args[0] * rng.lognormvariate(0.0, self.args[1])
+        return max(0.0, ms) / 1000
+
+
+# ============ Deterministic payloads ============
+
+def _keywords(text: str, limit: int) -> List[str]:
+    """Most frequent non-trivial words, ties broken by first appearance"""
+    counts: Dict[str, int] = {}
+    for word in _WORD.findall(text.lower()):
+        if word not in _STOPWORDS:
+            counts[word] = counts.get(word, 0) + 1
+    ranked = sorted(counts, key=lambda w: -counts[w])  # stable: keeps first-seen order
+    return ranked[:limit] or ["idea"]
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+def distilled_data(text: str, variant: int = 0) -> Dict[str, Any]:
+    """A distill-style JSON object built from the words of text"""
+    words = _keywords(text, 12 + variant)[variant:] or ["idea"]
+    h = _digest(text) + variant
+    core = " ".join(w.title() for w in words[:2])
+    nodes = [{"id": "core", "name": core, "type": "Concept", "desc": f"Central idea about {core.lower()}"}]
+    edges = []
+    for i, word in enumerate(words[2:8], 1):
+        nodes.append({"id": f"node{i}", "name": word.title(), "type": ENTITY_TYPES[(h + i) % len(ENTITY_TYPES)],
+                      "desc": f"{word.title()} as it appears in the idea"})
+        edges.append({"source": "core", "target": f"node{i}", "relation": RELATIONS[(h + i) % len(RELATIONS)],
+                      "desc": ""})
+    return {
+        "one_liner": f"{core} shapes how {' '.join(words[2:5]) or 'this idea'} work together",
+        "tags": words[:min(4, len(words))],
+        "summary": f"This idea connects {', '.join(words[:6])}. It is a deterministic stand-in produced locally.",
+        "graph_structure": {"nodes": nodes, "edges": edges},
+    }
+
+
+def classify(messages: List[Dict[str, Any]]) -> str:
+    """Which backend operation a chat request comes from"""
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    if "Distill this idea" in user:
+        return "distill"
+    if "Extract keywords from this query" in user:
+        return "keywords"
+    if "synthesizing multiple related ideas" in user:
+        return "merge"
+    if "decomposing complex ideas" in user:
+        return "split"
+    if "updating an existing idea" in user:
+        return "refine"
+    if "Summarize this community of ideas" in user:
+        return "community"
+    if "Answer from this community summary" in user:
+        return "global_map"
+    if "Second Brain" in system:
+        return "chat"
+    return "completion"
+
+
+# Where the idea text sits inside each prompt template (start marker, end marker)
+_INPUT_MARKERS = {
+    "distill": ("Distill this idea:", None),
+    "keywords": ("Extract keywords from this query:", None),
+    "merge": ("Given these ideas:", "Create a new synthesized idea"),
+    "split": ("Given this idea:", "Identify 2-5 distinct"),
+    "refine": ("Original idea:", "Generate an updated"),
+    "community": ("Summarize this community of ideas:", None),
+    "global_map": ("Answer from this community summary:", None),
+}
+
+
+def _prompt_input(operation: str, prompt: str) -> str:
+    """The user-supplied part of a templated prompt, so payloads reflect it and not the template"""
+    if operation not in _INPUT_MARKERS:
+        return prompt
+    start, end = _INPUT_MARKERS[operation]
+    text = prompt.split(start, 1)[-1]
+    return text.split(end, 1)[0] if end else text
+
+
+def chat_content(messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """(operation, response text) for a chat completion request"""
+    operation = classify(messages)
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    user = _prompt_input(operation, user)
+    if operation in ("distill", "merge", "refine"):
+        return operation, json.dumps(distilled_data(user))
+    if operation == "split":
+        count = 2 + _digest(user) % 2
+        return operation, json.dumps({"sub_ideas": [distilled_data(user, i * 3) for i in range(count)]})
+    if operation == "keywords":
+        words = _keywords(user, 6)
+        return operation, json.dumps({"high_level_keywords": words[:2], "low_level_keywords": words[2:]})
+    if operation == "community":
+        words = _keywords(user, 5) or ["ideas"]
+        return operation, json.dumps({"title": " ".join(words[:2]).title(), "themes": words[:3],
+                                      "summary": f"Ideas about {', '.join(words)}."})
+    if operation == "global_map":
+        words = _keywords(user.split("Question:")[0], 3) or ["ideas"]
+        return operation, json.dumps({"points": [{"description": f"The group covers {w}.", "score": 90 - 20 * i}
+                                                 for i, w in enumerate(words)]})
+    words = _keywords(user, 5)
+    return operation, (f"Thinking about {', '.join(words)}: these points connect to the ideas in your "
+                       f"context [1]. A useful next step is to explore how {words[0]} relates to the rest.")
+
+
+@lru_cache(maxsize=50000)
+def _token_vector(token: str, dim: int) -> np.ndarray:
+    return np.random.default_rng(_digest(token)).standard_normal(dim).astype(np.float32)
+
+
+def embed(text: str, dim: int) -> np.ndarray:
+    """Unit-length hashed bag-of-words embedding (texts sharing words are similar)"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _WORD.findall(text.lower()) or [text]:
+        vector += _token_vector(word, dim)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ============ Server ============
+
+class FakeProvider:
+    """Request handling and settings shared by all server threads"""
+
+    def __init__(self, dim: int = 1536, chat_latency: str = "fixed:0", embedding_latency: str = "fixed:0",
+                 failure_rate: float = 0.0, failure_status: int = 500, seed: Optional[int] = None,
+                 cassette: Optional[str] = None, latency_scale: float = 1.0):
+        self.dim = dim
+        self.cassette = Cassette(cassette) if cassette else None
+        self.latency_scale = latency_scale
+        self.chat_latency = LatencyModel(chat_latency)
+        self.embedding_latency = LatencyModel(embedding_latency)
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+
+    def _draw(self, latency: LatencyModel) -> Tuple[float, bool]:
+        with self._lock:
+            return latency.sample(self._rng), self._rng.random() < self.failure_rate
+
+    def _count(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def handle(self, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if self.cassette is not None:
+            replayed = self._replay(path, body)
+            if replayed is not None:
+                return replayed
+        if path.endswith("/chat/completions"):
+            delay, fail = self._draw(self.chat_latency)
+            operation, content = chat_content(body.get("messages") or [])
+            response = self._chat_response(body, content)
+        elif path.endswith("/embeddings"):
+            delay, fail = self._draw(self.embedding_latency)
+            operation = "embeddings"
+            response = self._embedding_response(body)
+        else:
+            return 404, {"error": {"message": f"Unknown path {path}", "type": "invalid_request_error"}}
+        self._count(operation)
+        time.sleep(delay)
+        if fail:
+            return self.failure_status, {"error": {"message": "Injected failure", "type": "server_error"}}
+        return 200, response
+
+    def _replay(self, path: str, body: Dict[str, Any]) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Recorded response for the request, after its recorded (scaled) latency"""
+        operation = "chat.completions" if path.endswith("/chat/completions") else "embeddings"
+        entry = self.cassette.find(operation, body)
+        if entry is None:
+            return None
+        self._count("replayed")
+        time.sleep(entry["duration"] * self.latency_scale)
+        if entry.get("error"):
+            return self.failure_status, {"error": {"message": entry["error"], "type": "server_error"}}
+        response = entry["response"]
+        if operation == "embeddings" and body.get("encoding_format") == "base64":
+            response = dict(response, data=[
+                dict(item, embedding=base64.b64encode(np.asarray(item["embedding"], dtype="<f4").tobytes()).decode("ascii"))
+                for item in response["data"]])
+        return 200, response
+
+    def _chat_response(self, body: Dict[str, Any], content: str) -> Dict[str, Any]:
+        prompt = sum(_tokens(m.get("content") or "") for m in body.get("messages") or [])
+        completion = _tokens(content)
+        return {
+            "id": f"chatcmpl-fake-{_digest(content):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt, "completion_tokens": completion,
+                      "total_tokens": prompt + completion},
+        }
+
+    def _embedding_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dim = int(body.get("dimensions") or self.dim)
+        data = []
+        for i, text in enumerate(inputs):
+            vector = embed(str(text), dim)
+            if body.get("encoding_format") == "base64":
+                encoded: Any = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                encoded = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": encoded})
+        tokens = sum(_tokens(str(t)) for t in inputs)
+        return {"object": "list", "data": data, "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    provider: FakeProvider
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"message": "Invalid JSON", "type": "invalid_request_error"}})
+            return
+        self._send(*self.server.provider.handle(self.path, body))
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send(200, {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "local"}]})
+        else:
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # one line per request would dominate load-test output
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **settings) -> ThreadingHTTPServer:
+    """
+    Serve a FakeProvider from a daemon thread; port 0 picks a free port.
+
+    The base URL to give an OpenAI client is `base_url(server)`; call
+    `server.shutdown()` to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.provider = FakeProvider(**settings)
+    threading.Thread(target=server.serve_forever, name="fake-provider", daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for the LLM and embedding APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--chat-latency", default="fixed:0", help="e.g. lognormal:800:0.5 (ms)")
+    parser.add_argument("--embedding-latency", default="fixed:0", help="e.g. normal:120:30 (ms)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of calls answered with an error")
+    parser.add_argument("--failure-status", type=int, default=500, help="HTTP status of injected failures (e.g. 429)")
+    parser.add_argument("--seed", type=int, help="seed for latency and failure draws")
+    parser.add_argument("--cassette", help="serve recorded responses from this cassette file")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiplier for recorded latencies (0 = no delay)")
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, dim=args.dim, chat_latency=args.chat_latency,
+                          embedding_latency=args.embedding_latency, failure_rate=args.failure_rate,
+                          failure_status=args.failure_status, seed=args.seed,
+                          cassette=args.cassette, latency_scale=args.latency_scale)
+    print(f"🤖 Fake provider listening on {base_url(server)}")
+    print(f"   LLM_API_KEY=fake LLM_BASE_URL={base_url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
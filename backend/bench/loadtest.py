@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+HTTP Load Test for IdeaGraph AI
+
+Replays a realistic mix of distill, save, search, chat, get_all_ideas,
+keyword and evolution calls at a fixed concurrency and reports throughput
+and p50/p95/p99 latency per route. Exits with status 1 when a latency
+budget or the error budget is exceeded, so it can gate deployments:
+
+    # Start the fake provider and a gunicorn backend on a temporary data dir
+    python bench/loadtest.py --spawn --concurrency 16 --duration 60 \\
+        --budget p95=500 --budget chat:p95=1500 --max-error-rate 0.01
+
+    # Or point it at a server that is already running
+    python bench/loadtest.py --base-url http://127.0.0.1:7860 --requests 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+
+from corpus import generate_corpus
+from fake_provider import base_url as provider_url, embed, start_server
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+# Relative frequency of each call, roughly what the UI produces
+DEFAULT_MIX = {
+    "distill": 10,
+    "save_idea": 15,
+    "search_similar": 25,
+    "chat": 20,
+    "get_all_ideas": 10,
+    "extract_keywords": 5,
+    "refine_idea": 5,
+    "merge_ideas": 5,
+    "split_idea": 5,
+}
+
+
+class Workload:
+    """Builds requests for each route from a shared pool of saved ideas"""
+
+    def __init__(self, dim: int, seed: int = 0):
+        self.dim = dim
+        self._corpus = generate_corpus(10 ** 9, dim=dim, seed=seed)
+        self._lock = threading.Lock()
+        self.ideas: List[Dict[str, Any]] = []
+
+    def new_idea(self) -> Tuple[Dict[str, Any], List[float]]:
+        with self._lock:
+            _, _, idea = next(self._corpus)
+        return idea, embed(idea["content_raw"], self.dim).tolist()
+
+    def saved(self, idea: Dict[str, Any]) -> None:
+        with self._lock:
+            self.ideas.append(idea)
+
+    def pick(self, rng: random.Random, count: int = 1) -> List[Dict[str, Any]]:
+        with self._lock:
+            return rng.sample(self.ideas, min(count, len(self.ideas)))
+
+    def request(self, route: str, rng: random.Random) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        """(method, path, JSON body) for one call to route"""
+        if route == "get_all_ideas":
+            return "GET", "/api/get_all_ideas", None
+        if route == "save_idea":
+            idea, vector = self.new_idea()
+            return "POST", "/api/save_idea", {"idea_id": idea["idea_id"], "embedding_vector": vector, "idea_data": idea}
+        picked = self.pick(rng, 2)
+        if not picked:
+            return self.request("save_idea", rng)
+        idea = picked[0]
+        text = idea["content_raw"]
+        if route == "distill":
+            return "POST", "/api/distill", {"text": text}
+        if route == "search_similar":
+            return "POST", "/api/search_similar", {"query_embedding": embed(text, self.dim).tolist(), "top_k": 3}
+        if route == "chat":
+            question = " ".join(rng.sample(text.split(), min(12, len(text.split())))) + "?"
+            return "POST", "/api/chat", {"history": [{"role": "user", "text": question}],
+                                         "current_idea": idea, "selected_idea_ids": [idea["idea_id"]]}
+        if route == "extract_keywords":
+            return "POST", "/api/extract_keywords", {"query": idea["distilled_data"]["one_liner"]}
+        if route == "refine_idea":
+            return "POST", "/api/refine_idea", {"idea_id": idea["idea_id"],
+                                                "new_context": idea["distilled_data"]["summary"]}
+        if route == "merge_ideas":
+            return "POST", "/api/merge_ideas", {"idea_ids": [i["idea_id"] for i in picked]}
+        if route == "split_idea":
+            return "POST", "/api/split_idea", {"idea_id": idea["idea_id"]}
+        raise ValueError(f"Unknown route: {route}")
+
+
+def call(base: str, method: str, path: str, body: Optional[Dict[str, Any]], timeout: float) -> int:
+    """Perform one request and return the HTTP status (0 for connection errors)"""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(base + path, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return 0
+
+
+def seed_ideas(base: str, workload: Workload, count: int, timeout: float = 30.0) -> None:
+    """Save `count` ideas (not timed) so reads and evolution calls have data"""
+    for _ in range(count):
+        method, path, body = workload.request("save_idea", random.Random())
+        status = call(base, method, path, body, timeout)
+        if status != 200:
+            raise RuntimeError(f"Seeding failed: {path} returned {status}")
+        workload.saved(body["idea_data"])
+
+
+def run_load(base: str, workload: Workload, mix: Dict[str, int], concurrency: int,
+             duration: Optional[float] = None, requests: Optional[int] = None,
+             timeout: float = 60.0, seed: int = 0) -> Dict[str, Any]:
+    """
+    Issue requests from `concurrency` threads until `duration` seconds pass or
+    `requests` calls were made; returns per-route latency samples and errors.
+    """
+    routes = list(mix)
+    weights = [mix[r] for r in routes]
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_slot() -> bool:
+        with lock:
+            if requests is not None and issued[0] >= requests:
+                return False
+            issued[0] += 1
+        return deadline is None or time.perf_counter() < deadline
+
+    def worker(index: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        while next_slot():
+            route = rng.choices(routes, weights)[0]
+            method, path, body = workload.request(route, rng)
+            route = path.rsplit("/", 1)[-1]  # a save replaces reads while no idea is saved yet
+            start = time.perf_counter()
+            status = call(base, method, path, body, timeout)
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples[route].append(elapsed)
+                if status != 200:
+                    errors[route] += 1
+            if status == 200 and route == "save_idea":
+                workload.saved(body["idea_data"])
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return report(samples, errors, time.perf_counter() - started, concurrency)
+
+
+def report(samples: Dict[str, List[float]], errors: Dict[str, int], elapsed: float,
+           concurrency: int) -> Dict[str, Any]:
+    routes = {}
+    for route, values in sorted(samples.items()):
+        ms = np.asarray(values) * 1000
+        routes[route] = {
+            "requests": len(values),
+            "errors": errors.get(route, 0),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "max_ms": round(float(ms.max()), 2),
+        }
+    total = sum(r["requests"] for r in routes.values())
+    failed = sum(r["errors"] for r in routes.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": total,
+        "errors": failed,
+        "error_rate": round(failed / total, 4) if total else 0.0,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "routes": routes,
+    }
+
+
+def parse_budget(spec: str) -> Tuple[str, str, float]:
+    """"chat:p95=1500" -> ("chat", "p95", 1500.0); "p99=800" applies to every route ("*")"""
+    target, _, limit = spec.partition("=")
+    route, _, percentile = target.rpartition(":")
+    if percentile not in ("p50", "p95", "p99") or not limit:
+        raise argparse.ArgumentTypeError(f"Invalid budget {spec!r} (expected [route:]p50|p95|p99=MS)")
+    return route or "*", percentile, float(limit)
+
+
+def check_budgets(result: Dict[str, Any], budgets: List[Tuple[str, str, float]],
+                  max_error_rate: Optional[float] = None) -> List[str]:
+    """Human-readable list of exceeded budgets (empty when everything is within budget)"""
+    violations = []
+    for route, percentile, limit in budgets:
+        for name, stats in result["routes"].items():
+            if route in ("*", name) and stats[f"{percentile}_ms"] > limit:
+                violations.append(f"{name} {percentile} {stats[f'{percentile}_ms']:.1f} ms > {limit:.1f} ms")
+    if max_error_rate is not None and result["error_rate"] > max_error_rate:
+        violations.append(f"error rate {result['error_rate']:.2%} > {max_error_rate:.2%}")
+    return violations
+
+
+def _wait_ready(base: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with status {process.returncode}")
+        if call(base, "GET", "/api/health/ready", None, 2.0) == 200:
+            return
+        time.sleep(0.2)
+    raise RuntimeError("Backend did not become ready in time")
+
+
+@contextmanager
+def spawned_backend(port: int, workers: int, threads: int, dim: int, chat_latency: str,
+                    embedding_latency: str, failure_rate: float, cassette: Optional[str] = None,
+                    latency_scale: float = 1.0):
+    """Fake provider in this process plus a gunicorn backend on a throwaway data directory"""
+    provider = start_server(dim=dim, chat_latency=chat_latency, embedding_latency=embedding_latency,
+                            failure_rate=failure_rate, cassette=cassette, latency_scale=latency_scale)
+    data_dir = tempfile.mkdtemp(prefix="ideagraph-load-")
+    env = dict(os.environ,
+               PORT=str(port), WEB_CONCURRENCY=str(workers), WEB_THREADS=str(threads),
+               IDEAGRAPH_DATA_DIR=data_dir, METRICS_MULTIPROC_DIR=os.path.join(data_dir, "metrics"),
+               LLM_API_KEY="fake", LLM_BASE_URL=provider_url(provider),
+               EMBEDDING_API_KEY="fake", EMBEDDING_BASE_URL=provider_url(provider),
+               LOG_LEVEL="WARNING", WEB_ACCESS_LOG="/dev/null")
+    os.makedirs(env["METRICS_MULTIPROC_DIR"])
+    log = open(os.path.join(data_dir, "backend.log"), "wb")
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                               cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(base, process)
+        yield base
+    finally:
+        process.terminate()
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+        provider.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"\n{'route':<18}{'reqs':>7}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, s in result["routes"].items():
+        print(f"{route:<18}{s['requests']:>7}{s['errors']:>6}{s['throughput_rps']:>9.1f}"
+              f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+    print(f"\nTotal: {result['requests']} requests in {result['elapsed_seconds']:.1f}s "
+          f"({result['throughput_rps']:.1f} req/s), error rate {result['error_rate']:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the IdeaGraph backend and check latency budgets")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--base-url", help="backend to test, e.g. http://127.0.0.1:7860")
+    target.add_argument("--spawn", action="store_true", help="start the fake provider and a gunicorn backend")
+    parser.add_argument("--port", type=int, default=7861, help="port for --spawn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for --spawn")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker for --spawn")
+    parser.add_argument("--chat-latency", default="lognormal:300:0.4", help="fake provider chat latency (--spawn)")
+    parser.add_argument("--embedding-latency", default="normal:50:10", help="fake provider embedding latency (--spawn)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fake provider failure rate (--spawn)")
+    parser.add_argument("--cassette", help="replay recorded upstream traffic from this cassette (--spawn)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier for recorded latencies")
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, help="seconds to run (default 30 unless --requests is set)")
+    parser.add_argument("--requests", type=int, help="total requests to issue")
+    parser.add_argument("--seed-ideas", type=int, default=100, help="ideas saved before the timed run")
+    parser.add_argument("--mix", help='JSON weights per route, e.g. \'{"chat": 5, "search_similar": 1}\'')
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[],
+                        help="latency budget [route:]p50|p95|p99=MS (repeatable)")
+    parser.add_argument("--max-error-rate", type=float, help="fail when more requests than this fraction fail")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown:
+        parser.error(f"Unknown routes in --mix: {', '.join(sorted(unknown))}")
+    duration = args.duration if args.duration or args.requests else 30.0
+
+    print("=" * 60)
+    print("HTTP Load Test")
+    print("=" * 60)
+
+    @contextmanager
+    def existing():
+        yield args.base_url.rstrip("/")
+
+    backend = spawned_backend(args.port, args.workers, args.threads, args.dim, args.chat_latency,
+                              args.embedding_latency, args.failure_rate, args.cassette,
+                              args.latency_scale) if args.spawn else existing()
+    with backend as base:
+        workload = Workload(args.dim, args.seed)
+        print(f"🌱 Seeding {args.seed_ideas} ideas on {base}...")
+        seed_ideas(base, workload, args.seed_ideas)
+        print(f"🚀 Running with concurrency {args.concurrency}...")
+        result = run_load(base, workload, mix, args.concurrency, duration, args.requests, args.timeout, args.seed)
+
+    print_report(result)
+    result["budgets"] = [f"{r}:{p}={limit}" for r, p, limit in args.budget]
+    violations = check_budgets(result, args.budget, args.max_error_rate)
+    result["violations"] = violations
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+    if violations:
+        print("\n❌ Budget exceeded:")
+        for v in violations:
+            print(f"   {v}")
+        sys.exit(1)
+    print("\n✅ Within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+BM25 Index for IdeaGraph AI
+In-memory inverted index over idea text for exact-term search, kept in step with the store
+"""
+
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from keyword_index import tokenize
+from store_index import StoreIndex, entity_nodes
+from tracing import traced
+
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_CJK_RUN = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]{2,}")
+
+
+def terms(text: Optional[str]) -> List[str]:
+    """Search terms: word tokens, with runs of CJK characters split into overlapping bigrams"""
+    result = []
+    for token in tokenize(text):
+        if _CJK_RUN.fullmatch(token):
+            result.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            result.append(token)
+    return result
+
+
+def idea_terms(idea: Dict[str, Any]) -> List[str]:
+    """Terms of one idea; the one-liner, tags and entity names count twice (they name the idea)"""
+    distilled = idea.get('distilled_data') or {}
+    names = [spelling for _, _, _, spelling in entity_nodes(idea)]
+    tags = [tag for tag in distilled.get('tags', []) if isinstance(tag, str)]
+    title = " ".join([distilled.get('one_liner') or ""] + tags + names)
+    summary = distilled.get('summary') if isinstance(distilled.get('summary'), str) else ""
+    return terms(title) * 2 + terms(summary) + terms(idea.get('content_raw'))
+
+
+class BM25Index(StoreIndex):
+    """
+    Okapi BM25 over each idea's content_raw, one-liner, summary, tags and
+    entity names.
+
+    Postings, document lengths and document frequencies are updated per
+    changed idea as the store publishes changes, so a save, refine or
+    delete costs one document's worth of work. A full reload of the store
+    marks the index stale and it is rebuilt on the next search.
+    """
+
+    def __init__(self, store, k1: float = BM25_K1, b: float = BM25_B):
+        super().__init__(store)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}  # term -> {idea_id: term frequency}
+        self._lengths: Dict[str, int] = {}
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}  # idea_id -> its distinct terms
+        self._total_length = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"documents": len(self._lengths), "terms": len(self._postings), "stale": self._stale}
+
+    @traced("bm25.search")
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """(idea_id, score) pairs of the best matching ideas, best first"""
+        self._ensure_built()
+        query_terms = set(terms(query))
+        scores: Dict[str, float] = {}
+        with self._lock:
+            n = len(self._lengths)
+            if not n or not query_terms:
+                return []
+            avg_length = self._total_length / n
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for idea_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[idea_id] / avg_length)
+                    scores[idea_id] = scores.get(idea_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+
+    # ============ Maintenance ============
+
+    def _clear(self) -> None:
+        self._postings.clear()
+        self._lengths.clear()
+        self._doc_terms.clear()
+        self._total_length = 0
+
+    def _add(self, idea_id: str, idea: Dict[str, Any]) -> None:
+        doc_terms = idea_terms(idea)
+        counts: Dict[str, int] = {}
+        for term in doc_terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[idea_id] = tf
+        self._lengths[idea_id] = len(doc_terms)
+        self._doc_terms[idea_id] = tuple(counts)
+        self._total_length += len(doc_terms)
+
+    def _remove(self, idea_id: str) -> None:
+        length = self._lengths.pop(idea_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._doc_terms.pop(idea_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(idea_id, None)
+                if not postings:
+                    del self._postings[term]
@@ -0,0 +1,226 @@
+"""
+Upstream Cassettes for IdeaGraph AI
+Record real LLM / embedding traffic with its timings (secrets redacted) and replay it offline
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends from one process only
+    fcntl = None
+
+from upstream import _RESOURCES
+
+logger = logging.getLogger("ideagraph.cassette")
+
+
+# "record" wraps the real clients, "replay" answers from the cassette without network
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "").lower()
+# Multiplier for recorded latencies during replay (0 = answer immediately)
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+
+REDACTED = "<redacted>"
+_SECRET_PATTERNS = [
+    re.compile(r"sk-[A-Za-z0-9_\-]{16,}"),
+    re.compile(r"(?i)\bbearer\s+[A-Za-z0-9._\-]{8,}"),
+]
+# Request arguments that are transport settings, not part of the request
+_DROPPED_ARGS = {"extra_headers", "extra_query", "extra_body", "timeout"}
+
+
+class CassetteMiss(LookupError):
+    """No recorded response for a request"""
+
+
+class ReplayedError(Exception):
+    """An upstream error that was recorded and is raised again on replay"""
+
+
+def redact(value: Any, secrets: Iterable[str] = ()) -> Any:
+    """Copy of value with API keys and bearer tokens replaced in every string"""
+    secrets = [s for s in secrets if s]
+    if isinstance(value, str):
+        for secret in secrets:
+            value = value.replace(secret, REDACTED)
+        for pattern in _SECRET_PATTERNS:
+            value = pattern.sub(REDACTED, value)
+        return value
+    if isinstance(value, dict):
+        return {k: redact(v, secrets) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v, secrets) for v in value]
+    return value
+
+
+def request_key(operation: str, request: Dict[str, Any]) -> str:
+    """
+    Identity of a request for matching on replay: the operation and its
+    content (messages / input), not the model name or sampling settings.
+    """
+    content = {"operation": operation, "messages": request.get("messages"), "input": request.get("input")}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    A JSON-lines file of recorded calls, one object per line:
+
+        {"provider", "operation", "key", "request", "response", "error", "duration", "recorded_at"}
+
+    Appends are serialized with a file lock, so several worker processes can
+    record to the same cassette.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._by_key: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._by_operation: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(line)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _index(self) -> Dict[str, List[Dict[str, Any]]]:
+        if self._by_key is None:
+            by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for entry in self.entries():
+                by_key[entry["key"]].append(entry)
+                self._by_operation[entry["operation"]].append(entry)
+            self._by_key = by_key
+            logger.info("Loaded %d recorded calls from %s", sum(map(len, by_key.values())), self.path)
+        return self._by_key
+
+    def find(self, operation: str, request: Dict[str, Any], strict: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Recorded entry for a request. Repeated identical requests cycle through
+        their recordings in order. Unless strict, a request that was never
+        recorded gets the next recording of the same operation instead.
+        """
+        with self._lock:
+            index = self._index()
+            key = request_key(operation, request)
+            matches = index.get(key)
+            if not matches:
+                if strict or not self._by_operation.get(operation):
+                    return None
+                key, matches = operation, self._by_operation[operation]
+            entry = matches[self._cursor[key] % len(matches)]
+            self._cursor[key] += 1
+            return entry
+
+
+def _request_args(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in kwargs.items() if k not in _DROPPED_ARGS}
+
+
+def _dump(response: Any) -> Any:
+    if hasattr(response, "model_dump"):
+        return response.model_dump(mode="json")
+    return response
+
+
+def build_response(operation: str, data: Dict[str, Any]):
+    """Recorded JSON turned back into the OpenAI response type callers expect"""
+    if operation == "embeddings":
+        from openai.types import CreateEmbeddingResponse
+        return CreateEmbeddingResponse.model_validate(data)
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate(data)
+
+
+class CassetteRecorder:
+    """Proxy around an OpenAI client that appends every create() call to a cassette"""
+
+    def __init__(self, client, cassette: Cassette, provider: str, path: Tuple[str, ...] = (),
+                 secrets: Iterable[str] = ()):
+        self._client = client
+        self._cassette = cassette
+        self._provider = provider
+        self._path = path
+        self._secrets = list(secrets) or [getattr(client, "api_key", None)]
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name in _RESOURCES:
+            return CassetteRecorder(attr, self._cassette, self._provider, self._path + (name,), self._secrets)
+        if name == "create" and self._path:
+            return self._record(attr)
+        return attr
+
+    def _record(self, create):
+        operation = ".".join(self._path)
+
+        def recorded_create(*args, **kwargs):
+            request = _request_args(kwargs)
+            entry = {"provider": self._provider, "operation": operation,
+                     "key": request_key(operation, request), "recorded_at": time.time()}
+            start = time.perf_counter()
+            try:
+                response = create(*args, **kwargs)
+            except Exception as e:
+                entry.update(duration=time.perf_counter() - start, response=None,
+                             error=f"{type(e).__name__}: {e}")
+                self._cassette.append(redact(dict(entry, request=request), self._secrets))
+                raise
+            entry.update(duration=time.perf_counter() - start, response=_dump(response), error=None)
+            self._cassette.append(redact(dict(entry, request=request), self._secrets))
+            return response
+
+        return recorded_create
+
+
+class CassettePlayer:
+    """
+    Stand-in for an OpenAI client that answers create() calls from a cassette,
+    waiting the recorded duration times `latency_scale`.
+    """
+
+    def __init__(self, cassette: Cassette, provider: str, latency_scale: float = 1.0,
+                 strict: bool = False, path: Tuple[str, ...] = ()):
+        self._cassette = cassette
+        self._provider = provider
+        self._latency_scale = latency_scale
+        self._strict = strict
+        self._path = path
+
+    def __getattr__(self, name):
+        if name in _RESOURCES:
+            return CassettePlayer(self._cassette, self._provider, self._latency_scale, self._strict,
+                                  self._path + (name,))
+        if name == "create" and self._path:
+            return self._replay
+        raise AttributeError(name)
+
+    def _replay(self, *args, **kwargs):
+        operation = ".".join(self._path)
+        entry = self._cassette.find(operation, _request_args(kwargs), self._strict)
+        if entry is None:
+            raise CassetteMiss(f"No recorded {operation} call in {self._cassette.path}")
+        if self._latency_scale > 0:
+            time.sleep(entry["duration"] * self._latency_scale)
+        if entry.get("error"):
+            raise ReplayedError(entry["error"])
+        return build_response(operation, entry["response"])
@@ -0,0 +1,250 @@
+"""
+Chunk Index for IdeaGraph AI
+Passages of each idea's raw content with their own embeddings, re-embedded only when they change
+"""
+
+import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from forking import reset_after_fork
+from storage import IdeaStore
+from store_index import StoreIndex
+from tracing import traced
+
+logger = logging.getLogger("ideagraph.chunks")
+
+
+# Target passage length: shorter paragraphs are merged, longer ones split at sentence ends
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "800"))
+CHUNK_MIN_CHARS = int(os.getenv("CHUNK_MIN_CHARS", "200"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s*")
+
+
+def _split_long(paragraph: str, max_chars: int) -> List[str]:
+    """Split one paragraph at sentence ends (hard cut for sentences longer than max_chars)"""
+    pieces, current = [], ""
+    for sentence in filter(None, _SENTENCE_END.split(paragraph)):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_chunks(text: Optional[str], max_chars: int = CHUNK_MAX_CHARS,
+                 min_chars: int = CHUNK_MIN_CHARS) -> List[str]:
+    """
+    Split raw content into passages on blank lines.
+
+    Paragraphs shorter than `min_chars` are joined with the next ones, so
+    headings and one-line notes travel with their context. A passage only
+    depends on the text before it, so appending text leaves every passage
+    but the last one (and their embeddings) unchanged.
+    """
+    chunks, current = [], ""
+    for paragraph in (p.strip() for p in (text or "").split("\n\n")):
+        if not paragraph:
+            continue
+        for piece in _split_long(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph]:
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+            if len(current) >= min_chars:
+                chunks.append(current)
+                current = ""
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_key(idea_id: str, text: str) -> str:
+    """Id of a passage: the idea plus a hash of the passage text"""
+    return f"{idea_id}:{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}"
+
+
+class _IdeaPassages(StoreIndex):
+    """Passage ids of each idea with their positions, kept in step with the passage store"""
+
+    def __init__(self, store):
+        super().__init__(store)
+        self._by_idea: Dict[str, Dict[str, int]] = {}
+        self._idea_of: Dict[str, str] = {}
+
+    def chunk_ids(self, idea_id: str) -> List[str]:
+        self._ensure_built()
+        with self._lock:
+            positions = self._by_idea.get(idea_id, {})
+            return sorted(positions, key=positions.get)
+
+    def _clear(self) -> None:
+        self._by_idea, self._idea_of = {}, {}
+
+    def _add(self, key: str, doc: Dict[str, Any]) -> None:
+        self._idea_of[key] = doc["idea_id"]
+        self._by_idea.setdefault(doc["idea_id"], {})[key] = doc["position"]
+
+    def _remove(self, key: str) -> None:
+        idea_id = self._idea_of.pop(key, None)
+        if idea_id is None:
+            return
+        positions = self._by_idea[idea_id]
+        del positions[key]
+        if not positions:
+            del self._by_idea[idea_id]
+
+
+class ChunkIndex:
+    """
+    Passages of every idea, each stored with its own embedding.
+
+    Passages live in their own IdeaStore (one document per passage:
+    idea_id, position, text), so they get the same journaling and
+    multi-process safety as the ideas themselves. A passage is keyed by
+    the hash of its text: re-indexing an idea embeds only passages that
+    are new, moves the ones that shifted and drops the ones that are gone.
+
+    Indexing calls the embedding provider, so it runs on a background
+    thread: `schedule()` queues ideas and returns immediately. `source(idea_id)`
+    returns the idea's current raw content, or None once it was deleted.
+    """
+
+    def __init__(self, data_dir, embed: Callable[[List[str]], Sequence[Sequence[float]]],
+                 source: Callable[[str], Optional[str]]):
+        self.store = IdeaStore(data_dir)
+        self._embed = embed
+        self._source = source
+        self._passages = _IdeaPassages(self.store)
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        reset_after_fork(self)
+
+    # ============ Reading ============
+
+    def chunk_ids(self, idea_id: str) -> List[str]:
+        """Ids of an idea's passages in content order"""
+        self.store.refresh()  # publishes other processes' changes to the map
+        return self._passages.chunk_ids(idea_id)
+
+    def indexed(self, idea_id: str) -> bool:
+        return bool(self.chunk_ids(idea_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"chunks": self.store.count(), "pending": len(self._pending)}
+
+    @traced("chunks.search")
+    def search(self, query_embedding, idea_ids: Iterable[str], top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Most similar passages of the given ideas, as dicts with idea_id,
+        position, text and similarity, most similar first.
+        """
+        snap = self.store.snapshot()
+        query = np.asarray(query_embedding, dtype=np.float32)
+        keys = [k for idea_id in dict.fromkeys(idea_ids) for k in self.chunk_ids(idea_id)
+                if k in snap.vectors and len(snap.vectors[k]) == len(query)]
+        if not keys or top_k <= 0:
+            return []
+
+        matrix = np.asarray([snap.vectors[k] for k in keys], dtype=np.float32)
+        denom = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        sims = np.zeros(len(keys), dtype=np.float32)
+        np.divide(matrix @ query, denom, out=sims, where=denom > 0)
+        top = np.argsort(-sims)[:top_k]
+        return [dict(snap.ideas[keys[i]], similarity=float(np.clip(sims[i], -1.0, 1.0))) for i in top]
+
+    # ============ Indexing ============
+
+    @traced("chunks.index")
+    def index_idea(self, idea_id: str, content: Optional[str]) -> Dict[str, int]:
+        """
+        Bring an idea's passages in line with `content` (None removes them all).
+        Returns counts of added, kept and removed passages.
+        """
+        wanted: Dict[str, tuple] = {}
+        for position, text in enumerate(split_chunks(content) if content is not None else []):
+            wanted.setdefault(chunk_key(idea_id, text), (position, text))
+        existing = set(self.chunk_ids(idea_id))
+        added = [key for key in wanted if key not in existing]
+
+        # Embed outside the store lock; only passages not indexed yet
+        vectors = self._embed([wanted[key][1] for key in added]) if added else []
+
+        def reposition(position):
+            def mutate(doc):
+                doc["position"] = position
+            return mutate
+
+        with self.store.transaction() as txn:
+            for key, vector in zip(added, vectors):
+                position, text = wanted[key]
+                txn.put(key, vector, {"idea_id": idea_id, "position": position, "text": text})
+            for key in existing & wanted.keys():
+                doc = txn.get(key)
+                if doc is not None and doc["position"] != wanted[key][0]:
+                    txn.update(key, reposition(wanted[key][0]))
+            removed = sum(txn.delete(key) for key in existing - wanted.keys())
+        return {"added": len(added), "kept": len(existing & wanted.keys()), "removed": removed}
+
+    def schedule(self, idea_ids: Iterable[str]) -> None:
+        """Queue ideas for (re-)indexing from their current content"""
+        with self._lock:
+            for idea_id in idea_ids:
+                if idea_id not in self._pending:
+                    self._pending.add(idea_id)
+                    self._queue.put(idea_id)
+            if self._pending and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chunk-indexer", daemon=True)
+                self._thread.start()
+
+    def wait(self) -> None:
+        """Block until every queued idea has been indexed"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                idea_id = self._queue.get(timeout=5)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            with self._lock:
+                self._pending.discard(idea_id)
+            try:
+                counts = self.index_idea(idea_id, self._source(idea_id))
+                logger.debug("Indexed passages of %.8s: %s", idea_id, counts)
+            except Exception as e:
+                # Left unindexed; chat falls back to leading paragraphs and re-queues it
+                logger.warning("Passage indexing failed for %.8s: %s", idea_id, e)
+            finally:
+                self._queue.task_done()
+
+    def compact(self) -> None:
+        self.store.compact()
+
+    def _after_fork(self) -> None:
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
@@ -0,0 +1,335 @@
+"""
+Communities for IdeaGraph AI
+Clusters of related ideas with cached LLM summaries, detected in the background for global questions
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from background_pass import BackgroundPass
+from tracing import traced
+
+logger = logging.getLogger("ideagraph.communities")
+
+
+# Similarity edges: each idea is linked to its nearest neighbors above a minimum cosine similarity
+COMMUNITY_KNN = int(os.getenv("COMMUNITY_KNN", "5"))
+COMMUNITY_MIN_SIMILARITY = float(os.getenv("COMMUNITY_MIN_SIMILARITY", "0.5"))
+# Smaller communities are kept but not summarized
+COMMUNITY_MIN_SIZE = int(os.getenv("COMMUNITY_MIN_SIZE", "2"))
+# Share of a community's members that must change before its summary is regenerated
+COMMUNITY_REFRESH_CHANGE = float(os.getenv("COMMUNITY_REFRESH_CHANGE", "0.2"))
+# LLM summaries made per pass (largest communities first); the rest are left to the next pass
+COMMUNITY_MAX_SUMMARIES = int(os.getenv("COMMUNITY_MAX_SUMMARIES", "10"))
+# Seconds to wait after a change before detecting, so bursts of writes share one pass
+COMMUNITY_DETECTION_DELAY = float(os.getenv("COMMUNITY_DETECTION_DELAY", "30"))
+# Most central members shown to the LLM when summarizing a community
+COMMUNITY_SUMMARY_IDEAS = 20
+LABEL_PROPAGATION_ROUNDS = 20
+
+
+def _community_id(idea_id: str) -> str:
+    return "com_" + hashlib.sha1(idea_id.encode("utf-8")).hexdigest()[:10]
+
+
+def _fingerprint(vector) -> str:
+    return hashlib.sha1(np.asarray(vector, dtype=np.float32).tobytes()).hexdigest()[:16]
+
+
+def membership_change(old: List[str], new: List[str]) -> float:
+    """Share of members added or removed (0 = same members, 1 = disjoint)"""
+    old_set, new_set = set(old), set(new)
+    union = old_set | new_set
+    return len(old_set ^ new_set) / len(union) if union else 0.0
+
+
+class CommunityIndex(BackgroundPass):
+    """
+    Ideas grouped into communities by label propagation.
+
+    The graph has two kinds of weighted edges: lineage and shared-entity
+    edges from the GraphIndex, and the COMMUNITY_KNN nearest neighbors of
+    each idea by embedding (at least COMMUNITY_MIN_SIMILARITY), found with
+    the shared embedding index. Neighbor lists are kept in neighbors.json
+    and searched again only for ideas whose vector, or one of whose
+    neighbors, changed since the last pass. Each pass
+    starts from the previous labels, so communities keep their ids as ideas
+    come and go; a label whose members fall apart is split by connected
+    component.
+
+    Every community of COMMUNITY_MIN_SIZE or more ideas gets an LLM summary
+    (title, summary, themes) from `summarize(ideas)`. Summaries are cached
+    with the members they describe and regenerated only when more than
+    COMMUNITY_REFRESH_CHANGE of the members changed. A pass makes at most
+    `max_summaries` of them, largest communities first, and schedules
+    another pass for the rest. communities.json is served by every worker
+    (see BackgroundPass for scheduling and locking).
+    """
+
+    state_file = "communities.json"
+    lock_file = "detect.lock"
+    neighbors_file = "neighbors.json"
+    thread_name = "community-detector"
+    description = "Community detection"
+    log = logger
+
+    def __init__(self, store, graph_index, embedding_index, data_dir,
+                 summarize: Optional[Callable[[List[Dict[str, Any]]], Dict[str, Any]]],
+                 knn: int = COMMUNITY_KNN, min_similarity: float = COMMUNITY_MIN_SIMILARITY,
+                 min_size: int = COMMUNITY_MIN_SIZE, refresh_change: float = COMMUNITY_REFRESH_CHANGE,
+                 max_summaries: int = COMMUNITY_MAX_SUMMARIES, delay: float = COMMUNITY_DETECTION_DELAY):
+        super().__init__(store, data_dir, delay)
+        self.graph_index = graph_index
+        self.embedding_index = embedding_index
+        self.neighbors_path = self.data_dir / self.neighbors_file
+        self.knn = knn
+        self.min_similarity = min_similarity
+        self.min_size = min_size
+        self.refresh_change = refresh_change
+        self.max_summaries = max_summaries
+        self._summarize = summarize
+        self._centroids = {}
+
+    # ============ Reading ============
+
+    def _empty_state(self) -> Dict[str, Any]:
+        return {"version": None, "generated_at": None, "assignments": {}, "communities": {}, "unsummarized": 0}
+
+    def _loaded(self, state: Dict[str, Any]) -> None:
+        self._centroids = {cid: np.asarray(c["centroid"], dtype=np.float32)
+                           for cid, c in state["communities"].items() if c.get("centroid")}
+
+    def communities(self, summarized_only: bool = False) -> List[Dict[str, Any]]:
+        """Communities largest first, without their centroids"""
+        result = []
+        for cid, community in self.state()["communities"].items():
+            if summarized_only and not community.get("summary"):
+                continue
+            result.append(dict({k: v for k, v in community.items() if k != "centroid"}, id=cid))
+        return sorted(result, key=lambda c: (-c["size"], c["id"]))
+
+    def relevant(self, query_vector=None, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        Summarized communities to answer a global question from: the closest
+        to query_vector by centroid, or the largest without one.
+        """
+        communities = self.communities(summarized_only=True)
+        query = np.asarray(query_vector, dtype=np.float32) if query_vector is not None and len(query_vector) else None
+        if query is None or not np.linalg.norm(query):
+            return communities[:limit]
+        query = query / np.linalg.norm(query)
+
+        def similarity(community):
+            centroid = self._centroids.get(community["id"])
+            return float(centroid @ query) if centroid is not None and len(centroid) == len(query) else -1.0
+        scored = sorted(communities, key=lambda c: -similarity(c))[:limit]
+        return [dict(c, similarity=round(similarity(c), 4)) for c in scored]
+
+    def status(self) -> Dict[str, Any]:
+        state = self.state()
+        return {
+            "version": state["version"],
+            "store_version": self.store.version,
+            "communities": len(state["communities"]),
+            "summarized": sum(1 for c in state["communities"].values() if c.get("summary")),
+            "unsummarized": state.get("unsummarized", 0),
+            "pending": self.pending,
+        }
+
+    # ============ Detection ============
+
+    def detect(self) -> Dict[str, int]:
+        """
+        Run one pass now. Returns counts of communities and summaries made,
+        kept or deferred, or {} if another process is running a pass or
+        nothing changed.
+        """
+        return self.run_pass()
+
+    def _is_current(self, previous: Dict[str, Any], snap) -> bool:
+        # Summaries deferred by the per-pass cap still need a pass
+        return super()._is_current(previous, snap) and not previous.get("unsummarized")
+
+    @traced("communities.detect")
+    def _pass(self, snap, previous: Dict[str, Any]) -> Dict[str, int]:
+        ids = sorted(snap.ideas)
+        edges = self._edges(ids, snap)
+        labels = self._propagate(ids, edges, previous["assignments"])
+        members: Dict[str, List[str]] = {}
+        for idea_id in ids:
+            members.setdefault(labels[idea_id], []).append(idea_id)
+
+        communities = {}
+        stale = []  # communities whose summary is missing or describes other members
+        counts = {"communities": 0, "summarized": 0, "kept": 0, "failed": 0, "deferred": 0}
+        for cid, idea_ids in sorted(members.items()):
+            # Most central members first, so callers can cite the community by its first idea
+            idea_ids.sort(key=lambda i: (-sum(w for o, w in edges[i].items() if labels[o] == cid), i))
+            cached = previous["communities"].get(cid, {})
+            # Until it is re-summarized a community serves its old summary, if any
+            communities[cid] = {
+                "idea_ids": idea_ids,
+                "size": len(idea_ids),
+                "centroid": self._centroid(idea_ids, snap.vectors),
+                "summary": cached.get("summary"),
+                "summarized_ids": cached.get("summarized_ids", []),
+                "summarized_at": cached.get("summarized_at"),
+            }
+            counts["communities"] += 1
+            if len(idea_ids) < self.min_size:
+                communities[cid].update(summary=None, summarized_ids=[], summarized_at=None)
+            elif cached.get("summary") and membership_change(cached["summarized_ids"], idea_ids) <= self.refresh_change:
+                counts["kept"] += 1
+            elif self._summarize is not None:
+                stale.append(cid)
+
+        # Unsummarized communities first, then the largest
+        stale.sort(key=lambda cid: (communities[cid]["summary"] is not None, -communities[cid]["size"], cid))
+        for cid in stale[:self.max_summaries]:
+            community = communities[cid]
+            try:
+                summary = self._summarize([dict(snap.ideas[i], idea_id=i)
+                                           for i in community["idea_ids"][:COMMUNITY_SUMMARY_IDEAS]])
+                community.update(summary=summary, summarized_ids=community["idea_ids"], summarized_at=time.time())
+                counts["summarized"] += 1
+            except Exception as e:
+                logger.warning("Summarizing community %s failed: %s", cid, e)
+                counts["failed"] += 1
+        counts["deferred"] = max(0, len(stale) - self.max_summaries)
+
+        self._write({
+            "version": snap.version,
+            "generated_at": time.time(),
+            "assignments": labels,
+            "communities": communities,
+            "unsummarized": counts["deferred"],
+        })
+        logger.info("Detected communities at store version %d: %s", snap.version, counts)
+        if counts["deferred"]:
+            self.schedule()
+        return counts
+
+    def _edges(self, ids: List[str], snap) -> Dict[str, Dict[str, float]]:
+        """Symmetric weighted adjacency: graph links plus nearest neighbors by embedding"""
+        edges: Dict[str, Dict[str, float]] = {idea_id: {} for idea_id in ids}
+
+        def link(a, b, weight):
+            if a != b and weight > edges[a].get(b, 0.0):
+                edges[a][b] = edges[b][a] = weight
+
+        for idea_id in ids:
+            for other, weight, _ in self.graph_index.neighbors(idea_id):
+                if other in edges:
+                    link(idea_id, other, weight)
+
+        for idea_id, near in self._neighbors(ids, snap).items():
+            for other, sim in near:
+                if other in edges:
+                    link(idea_id, other, sim)
+        return edges
+
+    def _neighbors(self, ids: List[str], snap) -> Dict[str, List[List]]:
+        """
+        Nearest neighbors of each idea embedded by the current model, as
+        idea_id -> [[other, similarity]]. Lists from the previous pass are
+        reused unless the idea or one of its neighbors changed; the others
+        are searched in the shared embedding index.
+        """
+        dims: Dict[int, List[str]] = {}
+        for idea_id in ids:
+            vector = snap.vectors.get(idea_id)
+            if vector is not None and len(vector):
+                dims.setdefault(len(vector), []).append(idea_id)
+        if not dims or self.knn <= 0:
+            return {}
+        with_vectors = max(dims.values(), key=len)  # ideas embedded by the current model
+        fingerprints = {idea_id: _fingerprint(snap.vectors[idea_id]) for idea_id in with_vectors}
+
+        params = {"dim": len(snap.vectors[with_vectors[0]]), "knn": self.knn, "min_similarity": self.min_similarity}
+        previous = self._read_neighbors()
+        reusable = previous["ideas"] if previous and previous["params"] == params else {}
+        current = {}
+        for idea_id in with_vectors:
+            entry = reusable.get(idea_id)
+            if (entry is not None and entry["fingerprint"] == fingerprints[idea_id]
+                    and all(reusable.get(o, {}).get("fingerprint") == fingerprints.get(o) for o, _ in entry["near"])):
+                current[idea_id] = entry
+                continue
+            hits = self.embedding_index.search(snap.vectors[idea_id], top_k=self.knn, exclude_id=idea_id)
+            current[idea_id] = {"fingerprint": fingerprints[idea_id],
+                                "near": [[other, round(sim, 6)] for other, sim, _ in hits if sim >= self.min_similarity]}
+        self._write({"params": params, "ideas": current}, self.neighbors_path)
+        return {idea_id: entry["near"] for idea_id, entry in current.items()}
+
+    def _read_neighbors(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.neighbors_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _propagate(ids: List[str], edges, previous: Dict[str, str]) -> Dict[str, str]:
+        """Label propagation from the previous labels (new ideas start alone), then split disconnected labels"""
+        labels = {idea_id: previous.get(idea_id) or _community_id(idea_id) for idea_id in ids}
+        for _ in range(LABEL_PROPAGATION_ROUNDS):
+            changed = 0
+            for idea_id in ids:
+                if not edges[idea_id]:
+                    continue
+                weights: Dict[str, float] = {}
+                for other, weight in edges[idea_id].items():
+                    weights[labels[other]] = weights.get(labels[other], 0.0) + weight
+                best = max(weights.values())
+                if weights.get(labels[idea_id], 0.0) < best:
+                    labels[idea_id] = min(label for label, weight in weights.items() if weight == best)
+                    changed += 1
+            if not changed:
+                break
+
+        # One community per connected part of a label; the largest part keeps the id
+        used = set(labels.values())
+        seen = set()
+        parts: Dict[str, List[List[str]]] = {}
+        for idea_id in ids:
+            if idea_id in seen:
+                continue
+            part, queue = [], [idea_id]
+            seen.add(idea_id)
+            while queue:
+                current = queue.pop()
+                part.append(current)
+                for other in edges[current]:
+                    if other not in seen and labels[other] == labels[idea_id]:
+                        seen.add(other)
+                        queue.append(other)
+            parts.setdefault(labels[idea_id], []).append(part)
+        for label, label_parts in parts.items():
+            label_parts.sort(key=lambda p: (-len(p), min(p)))
+            for part in label_parts[1:]:
+                first, attempt = min(part), 0
+                new_label = _community_id(first)
+                while new_label in used:  # e.g. the id the largest part kept
+                    attempt += 1
+                    new_label = _community_id(f"{first}#{attempt}")
+                used.add(new_label)
+                for idea_id in part:
+                    labels[idea_id] = new_label
+        return labels
+
+    @staticmethod
+    def _centroid(idea_ids: List[str], vectors) -> Optional[List[float]]:
+        rows = [np.asarray(vectors[i], dtype=np.float32) for i in idea_ids if vectors.get(i) is not None]
+        if not rows:
+            return None
+        dim = max({len(r) for r in rows}, key=lambda d: sum(len(r) == d for r in rows))
+        rows = [r / (np.linalg.norm(r) or 1.0) for r in rows if len(r) == dim]
+        mean = np.mean(rows, axis=0)
+        norm = np.linalg.norm(mean)
+        return [round(float(x), 6) for x in (mean / norm if norm else mean)]
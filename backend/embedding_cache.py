@@ -0,0 +1,65 @@
+"""
+Embedding Cache for IdeaGraph AI
+In-process LRU of text embeddings so repeated chat questions skip the provider
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+import metrics
+
+
+# Entries kept per worker process (one 1536-d embedding is ~12 KB as a list of floats)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+
+class EmbeddingCache:
+    """
+    Least-recently-used embeddings keyed by model and text.
+
+    Text is normalized (surrounding whitespace, runs of whitespace) and
+    hashed, so the cache holds no message text. Lookups are counted in
+    `ideagraph_cache_requests_total{cache=<name>}`. Two threads missing on
+    the same text may both compute it; the later result wins.
+    """
+
+    def __init__(self, name: str, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, text: str) -> Tuple[str, str]:
+        normalized = " ".join(text.split())
+        return model, hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """Cached embedding of text, calling compute(text) on a miss"""
+        key = self.key(model, text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+        metrics.record_cache(self.name, embedding is not None)
+        if embedding is not None:
+            return embedding
+
+        embedding = compute(text)
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = embedding
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return embedding
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "max_entries": self.max_entries}
@@ -0,0 +1,148 @@
+"""
+Entity Index for IdeaGraph AI
+Global index of knowledge-graph entities across all ideas, kept in step with the store
+"""
+
+import bisect
+import heapq
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from keyword_index import tokenize
+from store_index import StoreIndex, entity_nodes, normalize
+from tracing import traced
+
+
+# (idea_id, node_id, type) of one node naming an entity
+Posting = Tuple[str, str, str]
+
+
+class EntityIndex(StoreIndex):
+    """
+    Every graph node of every idea, grouped by normalized entity name.
+
+      - postings: name -> {(idea_id, node_id): type}
+      - types:    type -> names of entities with a node of that type
+      - tokens:   word -> names containing it, for keyword matching
+      - a sorted list of names for prefix search
+
+    The index subscribes to the store and re-indexes only the ideas of
+    each published change, so saves and deletes keep it current without
+    scanning every idea. A full reload marks it stale; it is rebuilt on
+    the next lookup.
+    """
+
+    def __init__(self, store):
+        super().__init__(store)
+        self._postings: Dict[str, Dict[Tuple[str, str], str]] = {}
+        self._spellings: Dict[str, Counter] = {}
+        self._types: Dict[str, Set[str]] = {}
+        self._tokens: Dict[str, Set[str]] = {}
+        self._idea_nodes: Dict[str, List[Tuple[str, str, str, str]]] = {}  # idea_id -> (name, node_id, type, spelling)
+        self._names: List[str] = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entities": len(self._postings), "types": len(self._types), "stale": self._stale}
+
+    # ============ Lookups ============
+
+    def lookup(self, name: str) -> List[Posting]:
+        """Nodes naming this entity, as (idea_id, node_id, type)"""
+        self._ensure_built()
+        with self._lock:
+            return [(idea_id, node_id, node_type)
+                    for (idea_id, node_id), node_type in self._postings.get(normalize(name), {}).items()]
+
+    def matching(self, keyword: str) -> Dict[str, Set[str]]:
+        """Entities named `keyword` or sharing a word with it, with the ideas mentioning each"""
+        self._ensure_built()
+        key = normalize(keyword)
+        with self._lock:
+            names = {key} if key in self._postings else set()
+            for token in tokenize(keyword):
+                names |= self._tokens.get(token, set())
+            return {name: {idea_id for idea_id, _ in self._postings[name]} for name in names}
+
+    @traced("entities.search")
+    def search(self, prefix: str = "", entity_type: Optional[str] = None, limit: int = 20,
+               mentions: int = 20) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Entities whose normalized name starts with `prefix` (all when empty),
+        optionally only those with a node of `entity_type`, most mentioned
+        first. Returns (up to `limit` entity summaries, total matches).
+        """
+        self._ensure_built()
+        key = normalize(prefix)
+        with self._lock:
+            start = bisect.bisect_left(self._names, key)
+            end = bisect.bisect_left(self._names, key + "\uffff") if key else len(self._names)
+            names = self._names[start:end]
+            if entity_type:
+                typed = self._types.get(entity_type, set())
+                names = [name for name in names if name in typed]
+            top = heapq.nsmallest(limit, names, key=lambda name: (-len(self._postings[name]), name))
+            return [self._summary(name, mentions) for name in top], len(names)
+
+    def _summary(self, name: str, mentions: int) -> Dict[str, Any]:
+        postings = self._postings[name]
+        return {
+            "name": name,
+            "display_name": self._spellings[name].most_common(1)[0][0],
+            "types": dict(Counter(postings.values())),
+            "idea_count": len({idea_id for idea_id, _ in postings}),
+            "mention_count": len(postings),
+            "mentions": [{"idea_id": idea_id, "node_id": node_id, "type": node_type}
+                         for (idea_id, node_id), node_type in list(postings.items())[:mentions]],
+        }
+
+    # ============ Maintenance ============
+
+    def _rebuild(self, ideas: Dict[str, Dict[str, Any]]) -> None:
+        self._names = None  # sorted once at the end instead of on every insert
+        super()._rebuild(ideas)
+        self._names = sorted(self._postings)
+
+    def _clear(self) -> None:
+        for table in (self._postings, self._spellings, self._types, self._tokens, self._idea_nodes):
+            table.clear()
+
+    def _add(self, idea_id: str, idea: Dict[str, Any]) -> None:
+        entries = entity_nodes(idea)
+        for name, node_id, node_type, spelling in entries:
+            if name not in self._postings:
+                self._postings[name] = {}
+                self._spellings[name] = Counter()
+                for token in tokenize(name):
+                    self._tokens.setdefault(token, set()).add(name)
+                if self._names is not None:
+                    bisect.insort(self._names, name)
+            self._postings[name][(idea_id, node_id)] = node_type
+            self._spellings[name][spelling] += 1
+            self._types.setdefault(node_type, set()).add(name)
+        self._idea_nodes[idea_id] = entries
+
+    def _remove(self, idea_id: str) -> None:
+        for name, node_id, node_type, spelling in self._idea_nodes.pop(idea_id, ()):
+            postings = self._postings.get(name)
+            if postings is None or postings.pop((idea_id, node_id), None) is None:
+                continue
+            self._spellings[name][spelling] -= 1
+            self._spellings[name] += Counter()  # drop spellings no longer used
+            if not postings:
+                del self._postings[name]
+                del self._spellings[name]
+                for token in tokenize(name):
+                    names = self._tokens.get(token)
+                    if names is not None:
+                        names.discard(name)
+                        if not names:
+                            del self._tokens[token]
+                i = bisect.bisect_left(self._names, name)
+                if i < len(self._names) and self._names[i] == name:
+                    del self._names[i]
+            if not any(t == node_type for t in (postings or {}).values()):
+                names = self._types.get(node_type)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self._types[node_type]
@@ -0,0 +1,318 @@
+"""
+Entity Resolution for IdeaGraph AI
+Clusters graph nodes of all ideas into canonical entities and persists the merged global graph
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from background_pass import BackgroundPass
+from storage import IdeaStore
+from store_index import StoreIndex, normalize
+from tracing import traced
+
+logger = logging.getLogger("ideagraph.entities")
+
+
+# Cosine similarity of "name: description" embeddings above which two entities are one
+ENTITY_MERGE_SIMILARITY = float(os.getenv("ENTITY_MERGE_SIMILARITY", "0.9"))
+# Seconds to wait after a change before resolving, so bursts of writes share one pass
+ENTITY_RESOLUTION_DELAY = float(os.getenv("ENTITY_RESOLUTION_DELAY", "2.0"))
+EMBED_BATCH = 64
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def canonical_key(name: str) -> str:
+    """Spelling-insensitive key: punctuation dropped, simple plurals singularized"""
+    words = []
+    for word in _NON_WORD.sub(" ", name.lower()).split():
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+def acronym(name: str) -> Optional[str]:
+    """Initials of a multi-word name ("large language model" -> "llm")"""
+    words = canonical_key(name).split()
+    return "".join(w[0] for w in words) if len(words) >= 2 else None
+
+
+def _entity_id(name: str) -> str:
+    return "ent_" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+
+
+class _Mentions(StoreIndex):
+    """Graph nodes of every idea by entity name, and edges between names, kept in step with the store"""
+
+    def __init__(self, store):
+        super().__init__(store)
+        # name -> (idea_id, node_id) -> (type, spelling, desc)
+        self._mentions: Dict[str, Dict[Tuple[str, str], Tuple[str, str, str]]] = {}
+        self._idea_nodes: Dict[str, List[Tuple[str, str]]] = {}  # idea_id -> (name, node_id)
+        self._edges: Dict[str, List[Tuple[str, str, str]]] = {}  # idea_id -> (source name, target name, relation)
+
+    def copy(self) -> Tuple[Dict[str, List[tuple]], Dict[str, List[Tuple[str, str, str]]]]:
+        """(name -> [(idea_id, node_id, type, spelling, desc)], idea_id -> edges) for one pass"""
+        self._ensure_built()
+        with self._lock:
+            mentions = {name: [key + detail for key, detail in entries.items()]
+                        for name, entries in self._mentions.items()}
+            return mentions, dict(self._edges)
+
+    def _clear(self) -> None:
+        for table in (self._mentions, self._idea_nodes, self._edges):
+            table.clear()
+
+    def _add(self, idea_id: str, idea: Dict[str, Any]) -> None:
+        graph = (idea.get('distilled_data') or {}).get('graph_structure') or {}
+        names: Dict[str, str] = {}  # node_id -> name
+        for node in graph.get('nodes', []):
+            spelling = node.get('name')
+            name = normalize(spelling) if isinstance(spelling, str) else ""
+            if name:
+                node_id = str(node.get('id', name))
+                names[node_id] = name
+                self._mentions.setdefault(name, {})[(idea_id, node_id)] = (
+                    node.get('type') or "Concept", spelling.strip(), node.get('desc') or "")
+        self._idea_nodes[idea_id] = [(name, node_id) for node_id, name in names.items()]
+        edges = [(names[str(edge.get('source'))], names[str(edge.get('target'))], edge.get('relation') or "relates_to")
+                 for edge in graph.get('edges', [])
+                 if str(edge.get('source')) in names and str(edge.get('target')) in names]
+        if edges:
+            self._edges[idea_id] = edges
+
+    def _remove(self, idea_id: str) -> None:
+        for name, node_id in self._idea_nodes.pop(idea_id, ()):
+            entries = self._mentions.get(name)
+            if entries is not None:
+                entries.pop((idea_id, node_id), None)
+                if not entries:
+                    del self._mentions[name]
+        self._edges.pop(idea_id, None)
+
+
+class EntityResolver(BackgroundPass):
+    """
+    Canonical entities across ideas, resolved in the background.
+
+    Entities with the same normalized name are already one entry of the
+    entity index; a resolution pass also merges names that are spelling
+    variants ("Language Models" / "language model"), acronyms of each other
+    ("LLM" / "Large Language Model") or whose "name: description"
+    embeddings are closer than ENTITY_MERGE_SIMILARITY.
+
+    Passes are incremental: name -> canonical assignments are persisted, so
+    only names not seen before are embedded and matched (against existing
+    canonical entities), and names that disappeared are dropped. Mentions
+    are kept in step with the store's changes rather than re-read from
+    every idea. Name embeddings are kept in their own IdeaStore and dropped
+    with their last mention. Each pass persists the assignments and the
+    merged global graph (canonical nodes, relation edges aggregated across
+    ideas) to canonical.json, which every worker serves without
+    recomputing (see BackgroundPass for scheduling and locking).
+    """
+
+    state_file = "canonical.json"
+    lock_file = "resolve.lock"
+    thread_name = "entity-resolver"
+    description = "Entity resolution"
+    log = logger
+
+    def __init__(self, store, data_dir, embed: Optional[Callable[[List[str]], Sequence[Sequence[float]]]],
+                 threshold: float = ENTITY_MERGE_SIMILARITY, delay: float = ENTITY_RESOLUTION_DELAY):
+        super().__init__(store, data_dir, delay)
+        self.vectors = IdeaStore(self.data_dir / "names")
+        self.mentions = _Mentions(store)
+        self.threshold = threshold
+        self._embed = embed
+
+    # ============ Reading ============
+
+    def _empty_state(self) -> Dict[str, Any]:
+        return {"version": None, "generated_at": None, "names": {}, "graph": {"nodes": [], "edges": []}}
+
+    def graph(self) -> Dict[str, Any]:
+        state = self.state()
+        return dict(state["graph"], version=state["version"], generated_at=state["generated_at"])
+
+    def canonical_of(self, name: str) -> Optional[str]:
+        """Canonical entity id of an entity name, if resolved"""
+        return self.state()["names"].get(normalize(name))
+
+    def status(self) -> Dict[str, Any]:
+        state = self.state()
+        return {
+            "version": state["version"],
+            "store_version": self.store.version,
+            "canonical_entities": len(state["graph"]["nodes"]),
+            "names": len(state["names"]),
+            "pending": self.pending,
+        }
+
+    # ============ Resolution ============
+
+    def resolve(self) -> Dict[str, int]:
+        """
+        Run one pass now. Returns counts of new, removed and merged names,
+        or {} if another process is running a pass or nothing changed.
+        """
+        return self.run_pass()
+
+    @traced("entities.resolve")
+    def _pass(self, snap, previous: Dict[str, Any]) -> Dict[str, int]:
+        # name -> (idea_id, node_id, type, spelling, desc); at least as recent as snap
+        mentions, edges = self.mentions.copy()
+
+        assignments = {name: cid for name, cid in previous["names"].items() if name in mentions}
+        removed = len(previous["names"]) - len(assignments)
+        new_names = sorted(name for name in mentions if name not in assignments)
+        self._prune_name_vectors(mentions)
+        vectors = self._name_vectors(new_names, mentions, assignments)
+
+        # Lookup tables over the canonical entities that already exist
+        by_key: Dict[str, str] = {}
+        by_acronym: Dict[str, str] = {}
+        members: Dict[str, List[str]] = defaultdict(list)
+        for name, cid in assignments.items():
+            self._register(name, cid, by_key, by_acronym, members)
+        centroids = self._centroids(members, vectors)
+
+        merged = 0
+        for name in new_names:
+            cid = (by_key.get(canonical_key(name)) or by_acronym.get(canonical_key(name))
+                   or (by_key.get(acronym(name)) if acronym(name) else None)
+                   or self._nearest(vectors.get(name), centroids))
+            if cid is None:
+                cid = _entity_id(name)
+            else:
+                merged += 1
+            assignments[name] = cid
+            self._register(name, cid, by_key, by_acronym, members)
+            if name in vectors:
+                centroids[cid] = self._centroid([vectors[m] for m in members[cid] if m in vectors])
+
+        state = {
+            "version": snap.version,
+            "generated_at": time.time(),
+            "names": assignments,
+            "graph": self._build_graph(mentions, edges, assignments),
+        }
+        self._write(state)
+        counts = {"new": len(new_names), "removed": removed, "merged": merged,
+                  "canonical": len(state["graph"]["nodes"])}
+        logger.info("Resolved entities at store version %d: %s", snap.version, counts)
+        return counts
+
+    def _prune_name_vectors(self, mentions) -> None:
+        """Drop the embeddings of names no idea mentions any more"""
+        gone = [name for name in self.vectors.snapshot().ideas if name not in mentions]
+        if gone:
+            self.vectors.delete(gone)
+
+    def _name_vectors(self, new_names: List[str], mentions, assignments) -> Dict[str, np.ndarray]:
+        """Embeddings of all current names; only names never embedded before are sent to the provider"""
+        stored = self.vectors.snapshot()
+        # Includes names whose embedding failed on an earlier pass
+        missing = sorted(name for name in mentions if name not in stored.vectors)
+        if missing and self._embed is not None:
+            texts = []
+            for name in missing:
+                spelling, desc = mentions[name][0][3], max((m[4] for m in mentions[name]), key=len)
+                texts.append(f"{spelling}: {desc}" if desc else spelling)
+            embedded = []
+            try:
+                for start in range(0, len(missing), EMBED_BATCH):
+                    batch = self._embed(texts[start:start + EMBED_BATCH])
+                    embedded.extend(zip(missing[start:start + EMBED_BATCH], batch, texts[start:start + EMBED_BATCH]))
+            except Exception as e:
+                # Resolve the rest by spelling and acronyms only; they are embedded on a later pass
+                logger.warning("Embedding entity names failed: %s", e)
+            if embedded:
+                # Embedded outside the transaction so the name store is not locked across provider calls
+                self.vectors.put_many((name, vector, {"text": text}) for name, vector, text in embedded)
+            stored = self.vectors.snapshot()
+        return {name: np.asarray(stored.vectors[name], dtype=np.float32)
+                for name in list(assignments) + new_names if name in stored.vectors}
+
+    @staticmethod
+    def _register(name, cid, by_key, by_acronym, members) -> None:
+        members[cid].append(name)
+        by_key.setdefault(canonical_key(name), cid)
+        short = acronym(name)
+        if short:
+            by_acronym.setdefault(short, cid)
+
+    @staticmethod
+    def _centroid(vectors: List[np.ndarray]) -> Optional[np.ndarray]:
+        if not vectors or len({len(v) for v in vectors}) != 1:
+            return None
+        mean = np.mean([v / (np.linalg.norm(v) or 1.0) for v in vectors], axis=0)
+        norm = np.linalg.norm(mean)
+        return mean / norm if norm else None
+
+    def _centroids(self, members, vectors) -> Dict[str, Optional[np.ndarray]]:
+        return {cid: self._centroid([vectors[m] for m in names if m in vectors]) for cid, names in members.items()}
+
+    def _nearest(self, vector: Optional[np.ndarray], centroids) -> Optional[str]:
+        if vector is None:
+            return None
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        best, best_sim = None, self.threshold
+        for cid, centroid in centroids.items():
+            if centroid is not None and len(centroid) == len(vector):
+                sim = float(centroid @ vector) / norm
+                if sim >= best_sim:
+                    best, best_sim = cid, sim
+        return best
+
+    @staticmethod
+    def _build_graph(mentions, idea_edges, assignments) -> Dict[str, Any]:
+        """Level 2 shaped graph of canonical entities and relations aggregated across ideas"""
+        entities: Dict[str, Dict[str, Any]] = {}
+        for name, cid in assignments.items():
+            entity = entities.setdefault(cid, {"spellings": Counter(), "types": Counter(), "desc": "",
+                                               "ideas": set(), "aliases": set()})
+            for idea_id, _, node_type, spelling, desc in mentions[name]:
+                entity["spellings"][spelling] += 1
+                entity["types"][node_type] += 1
+                entity["ideas"].add(idea_id)
+                entity["aliases"].add(spelling)
+                if len(desc) > len(entity["desc"]):
+                    entity["desc"] = desc
+        nodes = [{
+            "id": cid,
+            "label": e["spellings"].most_common(1)[0][0],
+            "type": e["types"].most_common(1)[0][0],
+            "desc": e["desc"],
+            "aliases": sorted(e["aliases"]),
+            "idea_ids": sorted(e["ideas"]),
+            "mention_count": sum(e["spellings"].values()),
+        } for cid, e in sorted(entities.items())]
+
+        edges: Dict[tuple, Dict[str, Any]] = {}
+        for idea_id, name_edges in idea_edges.items():
+            for source_name, target_name, relation in name_edges:
+                source, target = assignments.get(source_name), assignments.get(target_name)
+                if not source or not target or source == target:
+                    continue
+                key = (source, target, relation)
+                entry = edges.setdefault(key, {"weight": 0, "ideas": set()})
+                entry["weight"] += 1
+                entry["ideas"].add(idea_id)
+        return {
+            "level": 2,
+            "nodes": nodes,
+            "edges": [{"source": s, "target": t, "relation": r, "weight": e["weight"], "idea_ids": sorted(e["ideas"])}
+                      for (s, t, r), e in sorted(edges.items())],
+        }
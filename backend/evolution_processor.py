@@ -4,12 +4,15 @@ Handles merge, split, and refine operations on ideas
 """
 
 import json
+import logging
 import uuid
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from openai import OpenAI
 import os
 
+logger = logging.getLogger("ideagraph.evolution")
+
 
 # Prompts for evolution operations
 MERGE_PROMPT = """You are an expert at synthesizing multiple related ideas into a unified concept.
@@ -329,6 +332,7 @@ Original text: {idea.get('content_raw', 'N/A')}
         try:
             return json.loads(text)
         except json.JSONDecodeError:
+            logger.debug("LLM response is not plain JSON, extracting code block: %.200s", text)
             # Try to extract JSON from markdown code blocks
             if "```json" in text:
                 json_start = text.find("```json") + 7
@@ -0,0 +1,26 @@
+"""
+Fork Hooks for IdeaGraph AI
+Resets the locks and background threads of live objects in worker processes forked from a preloaded master
+"""
+
+import os
+import weakref
+
+
+# Objects whose _after_fork() runs in every forked child; dropped once garbage collected
+_instances: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def reset_after_fork(obj) -> None:
+    """Call obj._after_fork() in the child after each fork, for as long as obj is alive"""
+    _instances.add(obj)
+
+
+def _after_fork_in_child() -> None:
+    for obj in list(_instances):
+        obj._after_fork()
+
+
+# One hook for the whole process, registered at import (os.register_at_fork cannot unregister)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,203 @@
+"""
+Graph Index for IdeaGraph AI
+Adjacency between ideas (lineage links and shared entities) for multi-hop retrieval
+"""
+
+import math
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from entity_resolution import canonical_key
+from store_index import StoreIndex, entity_nodes
+from tracing import traced
+
+
+# How far and how wide graph expansion walks from the seed ideas
+GRAPH_MAX_HOPS = int(os.getenv("GRAPH_MAX_HOPS", "2"))
+GRAPH_FANOUT = int(os.getenv("GRAPH_FANOUT", "5"))
+# Entities named by more ideas than this are hubs ("AI", "Productivity") and link nothing
+GRAPH_ENTITY_MAX_IDEAS = int(os.getenv("GRAPH_ENTITY_MAX_IDEAS", "50"))
+
+# Edge weight of each lineage field, and the name of the edge seen from the other end
+LINK_WEIGHTS = {
+    "parent_idea_id": ("split_from", "split_into", 1.0),
+    "child_idea_ids": ("split_into", "split_from", 1.0),
+    "merged_from_ids": ("merged_from", "merged_into", 0.9),
+    "linked_idea_ids": ("linked", "linked", 0.8),
+}
+# Weight of sharing one entity named by two ideas; rarer entities count more, capped in total
+SHARED_ENTITY_WEIGHT = 0.4
+SHARED_ENTITY_MAX = 0.8
+
+# (neighbor idea_id, edge weight, how they are connected)
+Neighbor = Tuple[str, float, str]
+
+
+class GraphIndex(StoreIndex):
+    """
+    Ideas as a graph: lineage edges (split, merge, manual links) in both
+    directions, and shared-entity edges between ideas naming the same
+    entity. Entities are compared by the resolver's canonical id, so
+    "LLM" and "Large Language Model" link once a resolution pass merged
+    them; names not resolved yet fall back to their spelling key (see
+    entity_resolution.canonical_key). A new resolution pass rebuilds the
+    graph on next use.
+
+    Lineage edges are kept as out / in adjacency maps; shared-entity edges
+    come from an entity -> ideas inverted index, so the neighbors of an
+    idea cost the postings of its own entities, never a scan of all ideas.
+    Like the other indexes it follows the store change by change and is
+    rebuilt lazily after a full reload.
+    """
+
+    def __init__(self, store, resolver=None, entity_max_ideas: int = GRAPH_ENTITY_MAX_IDEAS):
+        super().__init__(store)
+        self.resolver = resolver
+        self.entity_max_ideas = entity_max_ideas
+        self._out: Dict[str, Dict[str, Tuple[float, str]]] = {}  # idea_id -> {linked id: (weight, relation)}
+        self._in: Dict[str, Dict[str, Tuple[float, str]]] = {}   # idea_id -> {linking id: (weight, relation seen from here)}
+        self._idea_entities: Dict[str, Dict[str, str]] = {}      # idea_id -> {entity key: spelling}
+        self._entity_ideas: Dict[str, Set[str]] = {}
+        self._canonical: Dict[str, str] = {}         # normalized entity name -> canonical entity id
+        self._canonical_by_key: Dict[str, str] = {}  # spelling key -> canonical entity id
+        self._resolved_at = None  # (version, generated_at) of the resolution pass in use
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ideas": len(self._out),
+            "links": sum(len(links) for links in self._out.values()),
+            "entities": len(self._entity_ideas),
+            "stale": self._stale,
+        }
+
+    # ============ Traversal ============
+
+    def neighbors(self, idea_id: str) -> List[Neighbor]:
+        """Ideas one hop away, strongest edge first"""
+        self._ensure_built()
+        with self._lock:
+            return self._neighbors(idea_id)
+
+    def _neighbors(self, idea_id: str) -> List[Neighbor]:
+        edges: Dict[str, Tuple[float, str]] = {}
+        for links in (self._out.get(idea_id, {}), self._in.get(idea_id, {})):
+            for other, (weight, relation) in links.items():
+                if other != idea_id and other in self._out and weight > edges.get(other, (0.0, ""))[0]:
+                    edges[other] = (weight, relation)
+
+        shared: Dict[str, Tuple[float, List[str]]] = {}
+        for key, spelling in self._idea_entities.get(idea_id, {}).items():
+            ideas = self._entity_ideas.get(key, ())
+            if not 2 <= len(ideas) <= self.entity_max_ideas:
+                continue
+            weight = SHARED_ENTITY_WEIGHT / math.log2(len(ideas))
+            for other in ideas:
+                if other != idea_id:
+                    total, names = shared.get(other, (0.0, []))
+                    shared[other] = (total + weight, names + [spelling])
+        for other, (total, names) in shared.items():
+            weight = min(SHARED_ENTITY_MAX, total)
+            if weight > edges.get(other, (0.0, ""))[0]:
+                edges[other] = (weight, "shares " + ", ".join(sorted(names)[:3]))
+
+        return sorted(((other, w, via) for other, (w, via) in edges.items()), key=lambda n: (-n[1], n[0]))
+
+    @traced("graph.expand")
+    def expand(self, seeds: Dict[str, float], max_hops: int = GRAPH_MAX_HOPS, fanout: int = GRAPH_FANOUT,
+               exclude: Optional[Set[str]] = None, top_k: int = 5) -> List[Tuple[str, float, List[Dict[str, Any]]]]:
+        """
+        Bounded breadth-first expansion from seed ideas (idea_id -> weight).
+
+        Each hop follows the `fanout` strongest edges of every frontier idea
+        that reach an idea by a better path than known so far.
+        An idea's score is the best product of edge weights over the paths
+        that reach it (times its seed's weight), so distant and weakly
+        connected ideas fade. Seeds and `exclude` are walked through but
+        not returned.
+
+        Returns up to top_k (idea_id, score, path) best first; path lists
+        the {"from", "to", "relation", "weight"} hops from a seed.
+        """
+        self._ensure_built()
+        best: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {s: (w, []) for s, w in seeds.items()}
+        frontier = list(seeds)
+        with self._lock:
+            for _ in range(max_hops):
+                reached = []
+                for idea_id in frontier:
+                    score, path = best[idea_id]
+                    improved = [(other, weight, relation) for other, weight, relation in self._neighbors(idea_id)
+                                if other not in seeds and score * weight > best.get(other, (0.0,))[0]]
+                    for other, weight, relation in improved[:fanout]:
+                        new_score = score * weight
+                        best[other] = (new_score, path + [{"from": idea_id, "to": other, "relation": relation,
+                                                           "weight": round(weight, 4)}])
+                        reached.append(other)
+                frontier = list(dict.fromkeys(reached))
+                if not frontier:
+                    break
+        skip = set(seeds) | (exclude or set())
+        hits = [(idea_id, round(score, 4), path) for idea_id, (score, path) in best.items()
+                if idea_id not in skip and path]
+        return sorted(hits, key=lambda h: (-h[1], len(h[2]), h[0]))[:top_k]
+
+    # ============ Maintenance ============
+
+    def _ensure_built(self) -> None:
+        if self.resolver is not None and self._pass_of(self.resolver.state()) != self._resolved_at:
+            self._stale = True
+        super()._ensure_built()
+
+    def _rebuild(self, ideas: Dict[str, Dict[str, Any]]) -> None:
+        if self.resolver is not None:
+            resolved = self.resolver.state()
+            self._canonical = resolved["names"]
+            self._canonical_by_key = {canonical_key(name): cid for name, cid in resolved["names"].items()}
+            self._resolved_at = self._pass_of(resolved)
+        super()._rebuild(ideas)
+
+    @staticmethod
+    def _pass_of(resolved: Dict[str, Any]) -> Tuple[Any, Any]:
+        return resolved["version"], resolved["generated_at"]
+
+    def _clear(self) -> None:
+        for table in (self._out, self._in, self._idea_entities, self._entity_ideas):
+            table.clear()
+
+    def _add(self, idea_id: str, idea: Dict[str, Any]) -> None:
+        out = self._out[idea_id] = {}
+        for field, (relation, reverse, weight) in LINK_WEIGHTS.items():
+            linked = idea.get(field)
+            for other in ([linked] if isinstance(linked, str) else linked or []):
+                if isinstance(other, str) and other != idea_id and weight > out.get(other, (0.0, ""))[0]:
+                    out[other] = (weight, relation)
+                    self._in.setdefault(other, {})[idea_id] = (weight, reverse)
+
+        entities = {}
+        for name, _, _, spelling in entity_nodes(idea):
+            key = self._entity_key(name, spelling)
+            if key:
+                entities.setdefault(key, spelling)
+                self._entity_ideas.setdefault(key, set()).add(idea_id)
+        self._idea_entities[idea_id] = entities
+
+    def _entity_key(self, name: str, spelling: str) -> str:
+        """Canonical entity id of a name, or its spelling key if no pass resolved it yet"""
+        key = canonical_key(spelling)
+        if not key:
+            return ""
+        return self._canonical.get(name) or self._canonical_by_key.get(key) or key
+
+    def _remove(self, idea_id: str) -> None:
+        for other in self._out.pop(idea_id, {}):
+            linking = self._in.get(other)
+            if linking is not None:
+                linking.pop(idea_id, None)
+                if not linking:
+                    del self._in[other]
+        for key in self._idea_entities.pop(idea_id, {}):
+            ideas = self._entity_ideas.get(key)
+            if ideas is not None:
+                ideas.discard(idea_id)
+                if not ideas:
+                    del self._entity_ideas[key]
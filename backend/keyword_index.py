@@ -0,0 +1,144 @@
+"""
+Keyword Index for IdeaGraph AI
+Entity-name and theme lookups for dual-level keyword retrieval, plus reciprocal-rank fusion
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from store_index import StoreIndex, normalize
+from tracing import traced
+
+
+# Reciprocal-rank fusion constant: higher values flatten the advantage of top ranks
+RRF_K = 60
+
+_TOKEN = re.compile(r"[^\W_]+")
+_STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of",
+              "on", "or", "that", "the", "this", "to", "with"}
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-cased word tokens without stop words (a run of CJK characters is one token)"""
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Fuse several best-first rankings of ids: each id scores sum(1 / (k + rank)).
+    Returns (id, score) pairs, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+class KeywordIndex(StoreIndex):
+    """
+    In-memory lookups from keywords to ideas, kept in step with the store.
+
+    Two levels, matching the two kinds of keywords /api/extract_keywords
+    returns:
+      - low level: names of knowledge-graph entities (people, tools, ...),
+        looked up in the EntityIndex
+      - high level: tags, one-liners and summaries (themes), indexed here
+
+    An exact (normalized) match scores 1.0; otherwise the share of the
+    keyword's tokens found scores up to 0.8, and shares under half are
+    ignored. Changed ideas are re-indexed as the store publishes them; a
+    full reload marks the index stale and it is rebuilt on the next lookup.
+    """
+
+    def __init__(self, store, entities):
+        super().__init__(store)
+        self.entities = entities
+        self._idea_themes: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        self._tag_ideas: Dict[str, Set[str]] = {}
+        self._theme_tokens: Dict[str, Set[str]] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tags": len(self._tag_ideas), "stale": self._stale}
+
+    # ============ Lookups ============
+
+    @traced("keywords.match_entities")
+    def match_entities(self, keywords: Iterable[str]) -> List[Tuple[str, float, List[str]]]:
+        """Ideas whose graph entities match the low-level keywords: (idea_id, score, matched names)"""
+        hits: Dict[str, Tuple[float, List[str]]] = {}
+        for keyword in keywords:
+            key, tokens = normalize(keyword), set(tokenize(keyword))
+            best: Dict[str, Tuple[float, str]] = {}
+            for name, idea_ids in self.entities.matching(keyword).items():
+                score = 1.0 if name == key else self._partial(tokens, set(tokenize(name)))
+                if score:
+                    for idea_id in idea_ids:
+                        if score > best.get(idea_id, (0.0, ""))[0]:
+                            best[idea_id] = (score, name)
+            self._accumulate(hits, best)
+        return self._ranked(hits)
+
+    @traced("keywords.match_themes")
+    def match_themes(self, keywords: Iterable[str]) -> List[Tuple[str, float, List[str]]]:
+        """Ideas whose tags / one-liner / summary match the high-level keywords: (idea_id, score, matched keywords)"""
+        self._ensure_built()
+        hits: Dict[str, Tuple[float, List[str]]] = {}
+        with self._lock:
+            for keyword in keywords:
+                key, tokens = normalize(keyword), set(tokenize(keyword))
+                best: Dict[str, Tuple[float, str]] = {idea_id: (1.0, keyword) for idea_id in self._tag_ideas.get(key, ())}
+                candidates = set()
+                for token in tokens:
+                    candidates |= self._theme_tokens.get(token, set())
+                for idea_id in candidates - best.keys():
+                    score = self._partial(tokens, self._idea_themes[idea_id][1])
+                    if score:
+                        best[idea_id] = (score, keyword)
+                self._accumulate(hits, best)
+        return self._ranked(hits)
+
+    @staticmethod
+    def _partial(wanted: Set[str], present: Set[str]) -> float:
+        if not wanted:
+            return 0.0
+        share = len(wanted & present) / len(wanted)
+        return 0.8 * share if share >= 0.5 else 0.0
+
+    @staticmethod
+    def _accumulate(hits, best) -> None:
+        for idea_id, (score, matched) in best.items():
+            total, names = hits.get(idea_id, (0.0, []))
+            hits[idea_id] = (total + score, names + [matched])
+
+    @staticmethod
+    def _ranked(hits) -> List[Tuple[str, float, List[str]]]:
+        return sorted(((i, s, m) for i, (s, m) in hits.items()), key=lambda x: x[1], reverse=True)
+
+    # ============ Maintenance ============
+
+    def _clear(self) -> None:
+        for table in (self._idea_themes, self._tag_ideas, self._theme_tokens):
+            table.clear()
+
+    def _add(self, idea_id: str, idea: Dict[str, Any]) -> None:
+        distilled = idea.get('distilled_data') or {}
+        tags = {normalize(tag) for tag in distilled.get('tags', []) if isinstance(tag, str)}
+        tokens = set()
+        for text in list(tags) + [distilled.get('one_liner'), distilled.get('summary')]:
+            tokens.update(tokenize(text if isinstance(text, str) else None))
+        self._idea_themes[idea_id] = (tags, tokens)
+        for tag in tags:
+            self._tag_ideas.setdefault(tag, set()).add(idea_id)
+        for token in tokens:
+            self._theme_tokens.setdefault(token, set()).add(idea_id)
+
+    def _remove(self, idea_id: str) -> None:
+        tags, tokens = self._idea_themes.pop(idea_id, ((), ()))
+        for table, keys in ((self._tag_ideas, tags), (self._theme_tokens, tokens)):
+            for key in keys:
+                ideas = table.get(key)
+                if ideas is not None:
+                    ideas.discard(idea_id)
+                    if not ideas:
+                        del table[key]
@@ -0,0 +1,138 @@
+"""
+Structured Logging for IdeaGraph AI
+Queue-based handlers, JSON or text output, request-id correlation and sampled body logs
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Optional
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for humans, "json" for log collectors
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Fraction of requests whose body is logged (at DEBUG level)
+LOG_BODY_SAMPLE_RATE = float(os.getenv("LOG_BODY_SAMPLE_RATE", "0.01"))
+LOG_BODY_MAX_CHARS = 200
+
+# Id of the request being handled by the current thread ("-" outside requests)
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id (must run in the logging thread, not the listener)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed via `extra=` become top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with the request id and any extra fields appended"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(request_id)s] %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {k: v for k, v in record.__dict__.items() if k not in _RESERVED and not k.startswith("_")}
+        if fields:
+            line += " " + " ".join(f"{k}={_short(v)}" for k, v in fields.items())
+        return line
+
+
+def _short(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+
+def _start_listener() -> None:
+    """(Re)start the thread that writes queued records to stdout"""
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()  # drains the queue
+
+
+def configure_logging(level: str = LOG_LEVEL) -> logging.Logger:
+    """
+    Route the "ideagraph" loggers through a queue so request threads never block on stdout.
+
+    Safe to call more than once. The listener thread does not survive fork(),
+    so gunicorn workers forked from a preloaded master start their own.
+    """
+    global _queue_handler
+    logger = logging.getLogger("ideagraph")
+    logger.setLevel(level)
+    if _queue_handler is None:
+        _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        _queue_handler.addFilter(RequestIdFilter())
+        logger.addHandler(_queue_handler)
+        logger.propagate = False
+        _start_listener()
+        atexit.register(_stop_listener)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_start_listener)
+    return logger
+
+
+def queue_depth() -> int:
+    """Log records waiting to be written"""
+    return _queue_handler.queue.qsize() if _queue_handler is not None else 0
+
+
+def should_log_body() -> bool:
+    """Sampling decision for request body logs (cheap: no body access unless sampled)"""
+    return LOG_BODY_SAMPLE_RATE > 0 and random.random() < LOG_BODY_SAMPLE_RATE
+
+
+def body_preview(raw: bytes) -> str:
+    """First LOG_BODY_MAX_CHARS characters of a raw request body, without parsing it"""
+    return raw[:LOG_BODY_MAX_CHARS * 4].decode("utf-8", errors="replace")[:LOG_BODY_MAX_CHARS]
+
+
+def new_request_id() -> str:
+    return f"{int(time.time() * 1000) & 0xffffffff:08x}{random.getrandbits(32):08x}"
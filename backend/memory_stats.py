@@ -0,0 +1,172 @@
+"""
+Memory Accounting for IdeaGraph AI
+Size breakdown of the idea store and tracemalloc snapshots for finding regressions
+"""
+
+import os
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from storage import VectorTable
+
+
+_SNAPSHOT_NAME = re.compile(r'^snapshot-\d+-\d+\.tracemalloc$')
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """Approximate bytes held by obj and everything it references (objects counted once)"""
+    if seen is None:
+        seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        # ndarray.__sizeof__ only includes the data buffer when the array owns
+        # it, so rows of the store's mapped vector segments count as their header only
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return total
+
+
+def store_breakdown(snapshot) -> Dict[str, Any]:
+    """
+    Bytes held by one store snapshot, split into vectors, idea documents and
+    the parts of the documents that usually dominate: chat histories, graph
+    structures and the embedding copies inside `idea_data['embedding_vector']`.
+
+    Vectors are split into those private to this process (changed since the
+    last compaction) and the store's float64 segments, which are mapped from
+    disk and held once by the page cache for all workers.
+    """
+    vectors = snapshot.vectors
+    private, vectors_shared = vectors, 0
+    if isinstance(vectors, VectorTable):
+        private = vectors.delta
+        vectors_shared = sum(ids.nbytes + matrix.nbytes for ids, matrix in vectors.segments)
+    vectors_owned = sum(deep_sizeof(vec) for vec in private.values() if vec is not None)
+
+    seen: set = set()
+    documents = chat = graphs = embedded = 0
+    chat_messages = embedded_count = 0
+    for idea in snapshot.ideas.values():
+        # Count the big sub-objects first so `documents` below is what is left
+        history = idea.get('chat_history')
+        if history:
+            chat += deep_sizeof(history, seen)
+            chat_messages += len(history)
+        graph = (idea.get('distilled_data') or {}).get('graph_structure')
+        if graph:
+            graphs += deep_sizeof(graph, seen)
+        embedding = idea.get('embedding_vector')
+        if embedding is not None:
+            embedded += deep_sizeof(embedding, seen)
+            embedded_count += 1
+        documents += deep_sizeof(idea, seen)
+
+    return {
+        "ideas": len(snapshot.ideas),
+        "version": snapshot.version,
+        "bytes": {
+            "vectors_private": vectors_owned,
+            "vectors_shared_mapping": vectors_shared,
+            "idea_documents": documents,
+            "chat_histories": chat,
+            "graph_structures": graphs,
+            "embedded_embedding_copies": embedded,
+        },
+        "chat_messages": chat_messages,
+        "ideas_with_embedded_embedding": embedded_count,
+    }
+
+
+def process_memory() -> Dict[str, Any]:
+    """Resident set size of this process (Linux /proc, falling back to peak RSS)"""
+    info: Dict[str, Any] = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:", "RssAnon:", "RssFile:", "RssShmem:")):
+                    key, value = line.split(":", 1)
+                    info[key.lower()] = int(value.split()[0]) * 1024
+    except OSError:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            info["vmhwm"] = peak if sys.platform == "darwin" else peak * 1024
+        except ImportError:
+            pass
+    return info
+
+
+class TracemallocSession:
+    """Start/stop tracemalloc and keep snapshots on disk so they can be diffed later"""
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        status: Dict[str, Any] = {"tracing": tracing, "pid": os.getpid(), "snapshots": self.snapshots()}
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            status.update(traced_bytes=current, traced_peak_bytes=peak, frames=tracemalloc.get_traceback_limit())
+        return status
+
+    def start(self, frames: int = 1) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, frames))
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+
+    def take_snapshot(self) -> str:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running (start it first)")
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        name = f"snapshot-{os.getpid()}-{time.time_ns()}.tracemalloc"
+        tracemalloc.take_snapshot().dump(str(self.output_dir / name))
+        return name
+
+    def snapshots(self) -> List[str]:
+        if not self.output_dir.exists():
+            return []
+        return sorted(p.name for p in self.output_dir.iterdir() if _SNAPSHOT_NAME.match(p.name))
+
+    def _load(self, name: str) -> tracemalloc.Snapshot:
+        if not _SNAPSHOT_NAME.match(name) or not (self.output_dir / name).is_file():
+            raise FileNotFoundError(name)
+        return tracemalloc.Snapshot.load(str(self.output_dir / name))
+
+    def diff(self, base: str, current: Optional[str] = None, top: int = 20) -> Dict[str, Any]:
+        """Largest allocation changes between two snapshots (current defaults to a fresh one)"""
+        old = self._load(base)
+        current = current or self.take_snapshot()
+        new = self._load(current)
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>")]
+        stats = new.filter_traces(filters).compare_to(old.filter_traces(filters), "lineno")
+        return {
+            "base": base,
+            "current": current,
+            "same_process": base.split("-")[1] == current.split("-")[1],
+            "total_size_diff": sum(s.size_diff for s in stats),
+            "top": [
+                {
+                    "location": str(s.traceback[0]) if s.traceback else "?",
+                    "size_diff": s.size_diff,
+                    "size": s.size,
+                    "count_diff": s.count_diff,
+                }
+                for s in stats[:top]
+            ],
+        }
@@ -0,0 +1,246 @@
+"""
+Metrics for IdeaGraph AI
+In-process counters, gauges and histograms rendered in Prometheus text format
+"""
+
+import bisect
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Latency buckets (seconds): sub-millisecond DB reads up to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Directory where each worker process dumps its counters so any worker can
+# serve the totals of all of them (unset = single process)
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+DUMP_INTERVAL = 5.0
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def values(self) -> Dict[Tuple, object]:
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+    def render(self, values: Dict[Tuple, float]) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1], value[2]]
+
+    @staticmethod
+    def merge(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def render(self, values) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = ("le", _format_number(bound) if bound == float('inf') else repr(float(bound)))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time (per process, never merged)"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def render(self, values=None) -> List[str]:
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [f"{self.name} {_format_number(value)}"]
+
+
+class Registry:
+    """Collection of metrics; dumps and merges per-process state in multi-process mode"""
+
+    def __init__(self, multiproc_dir: Optional[str] = MULTIPROC_DIR):
+        self._metrics: List[_Metric] = []
+        self.multiproc_dir = Path(multiproc_dir) if multiproc_dir else None
+        self._last_dump = 0.0
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback) -> Gauge:
+        return self._register(Gauge(name, documentation, callback))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    # ============ Multi-process ============
+
+    def _dump_path(self) -> Path:
+        return self.multiproc_dir / f"metrics-{os.getpid()}.pkl"
+
+    def dump(self) -> None:
+        """Write this process' counters and histograms for other workers to merge"""
+        if not self.multiproc_dir:
+            return
+        self.multiproc_dir.mkdir(parents=True, exist_ok=True)
+        state = {m.name: m.values() for m in self._metrics if not isinstance(m, Gauge)}
+        path = self._dump_path()
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._last_dump = time.monotonic()
+
+    def maybe_dump(self) -> None:
+        """Dump at most every DUMP_INTERVAL seconds (called after each request)"""
+        if self.multiproc_dir and time.monotonic() - self._last_dump >= DUMP_INTERVAL:
+            self.dump()
+
+    def _other_processes(self) -> List[Dict]:
+        states = []
+        if not self.multiproc_dir or not self.multiproc_dir.exists():
+            return states
+        own = self._dump_path()
+        for path in self.multiproc_dir.glob("metrics-*.pkl"):
+            if path == own:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    states.append(pickle.load(f))
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue
+        return states
+
+    # ============ Exposition ============
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format (0.0.4)"""
+        others = self._other_processes()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            if isinstance(metric, Gauge):
+                lines.extend(metric.render())
+                continue
+            values = metric.values()
+            for state in others:
+                for key, value in state.get(metric.name, {}).items():
+                    values[key] = metric.merge(values[key], value) if key in values else value
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+# ============ IdeaGraph metrics ============
+
+registry = Registry()
+
+requests_total = registry.counter(
+    "ideagraph_requests_total", "HTTP requests handled", ("route", "method", "status"))
+request_errors_total = registry.counter(
+    "ideagraph_request_errors_total", "HTTP requests that failed with a 5xx status", ("route",))
+request_duration = registry.histogram(
+    "ideagraph_request_duration_seconds", "Total request latency", ("route",))
+stage_duration = registry.histogram(
+    "ideagraph_stage_duration_seconds", "Latency of individual request stages", ("route", "stage"))
+cache_requests_total = registry.counter(
+    "ideagraph_cache_requests_total", "Cache lookups", ("cache", "result"))
+upstream_requests_total = registry.counter(
+    "ideagraph_upstream_requests_total", "Calls to the LLM / embedding providers", ("provider", "operation", "outcome"))
+upstream_duration = registry.histogram(
+    "ideagraph_upstream_duration_seconds", "Latency of calls to the LLM / embedding providers", ("provider", "operation"))
+upstream_tokens_total = registry.counter(
+    "ideagraph_upstream_tokens_total", "Tokens reported by the providers", ("provider", "kind"))
+
+
+def observe_stage(route: str, stage: str, seconds: float) -> None:
+    stage_duration.observe(seconds, route=route, stage=stage)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests_total.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,184 @@
+"""
+On-demand Profiling for IdeaGraph AI
+Profile the next N requests of a route with cProfile or a sampling profiler
+"""
+
+import cProfile
+import itertools
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+MODES = ("cprofile", "sampling")
+DEFAULT_INTERVAL_MS = 5
+_SAFE_NAME = re.compile(r'^[\w.-]+\.(pstats|collapsed)$')
+_sequence = itertools.count(1)
+# Only one cProfile profiler can be active per process (enforced by Python 3.12+),
+# so overlapping requests on threaded workers take turns
+_cprofile_lock = threading.Lock()
+
+
+class _Sampler:
+    """Samples one thread's stack every `interval` seconds and counts collapsed stacks"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: Path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    """One profiled request; cProfile sessions must hold _cprofile_lock"""
+
+    def __init__(self, route: str, mode: str, interval: float):
+        self.route = route
+        self.mode = mode
+        self.started = time.time()
+        if mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()  # ValueError if another profiling tool is active
+        else:
+            self._sampler = _Sampler(threading.get_ident(), interval)
+            self._sampler.start()
+
+    def stop(self, output_dir: Path) -> Path:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        route = re.sub(r'[^\w.-]', '_', self.route)
+        name = f"{route}-{stamp}-{os.getpid()}-{next(_sequence)}"
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if self.mode == "cprofile":
+            self._profile.disable()
+            _cprofile_lock.release()
+            path = output_dir / f"{name}.pstats"
+            self._profile.dump_stats(str(path))
+        else:
+            self._sampler.stop()
+            path = output_dir / f"{name}.collapsed"
+            self._sampler.write(path)
+        return path
+
+
+class Profiler:
+    """
+    Arms profiling for the next `count` requests of one route.
+
+    The arming state lives in shared memory created before gunicorn forks its
+    workers, so arming through any worker applies to all of them. When nothing
+    is armed the per-request cost is a single shared integer read (`armed`).
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        # Raw (lock-free) shared values so the `armed` check takes no lock;
+        # every change goes through the one process-shared lock
+        self._lock = multiprocessing.Lock()
+        self._remaining = multiprocessing.RawValue('i', 0)
+        self._route = multiprocessing.RawArray('c', 128)
+        self._mode = multiprocessing.RawValue('i', 0)
+        self._interval_ms = multiprocessing.RawValue('i', DEFAULT_INTERVAL_MS)
+
+    @property
+    def armed(self) -> bool:
+        return self._remaining.value > 0
+
+    def arm(self, route: str, count: int = 1, mode: str = "cprofile",
+            interval_ms: int = DEFAULT_INTERVAL_MS) -> Dict[str, Any]:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if not route or len(route.encode()) >= 128:
+            raise ValueError("route must be an endpoint name or path (< 128 bytes)")
+        if count < 1:
+            raise ValueError("count must be >= 1")
+        with self._lock:
+            self._route.value = route.encode()
+            self._mode.value = MODES.index(mode)
+            self._interval_ms.value = max(1, int(interval_ms))
+            self._remaining.value = count
+        return self.status()
+
+    def disarm(self) -> None:
+        with self._lock:
+            self._remaining.value = 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "armed": self.armed,
+            "route": self._route.value.decode() or None,
+            "remaining": self._remaining.value,
+            "mode": MODES[self._mode.value],
+            "interval_ms": self._interval_ms.value,
+        }
+
+    def start(self, endpoint: Optional[str], path: str) -> Optional[ProfileSession]:
+        """
+        Claim one of the armed slots if this request matches the armed route.
+
+        In cprofile mode a request that overlaps one already being profiled
+        in this process runs unprofiled and leaves the slot for a later one.
+        """
+        with self._lock:
+            route = self._route.value.decode()
+            if self._remaining.value <= 0 or route not in (endpoint, path):
+                return None
+            mode, interval = MODES[self._mode.value], self._interval_ms.value / 1000.0
+            if mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+                return None
+            self._remaining.value -= 1
+        try:
+            return ProfileSession(route, mode, interval)
+        except ValueError:
+            # Profiled by something else (a debugger, py-spy in-process, ...): give the slot back
+            with self._lock:
+                self._remaining.value += 1
+            if mode == "cprofile":
+                _cprofile_lock.release()
+            return None
+
+    def stop(self, session: ProfileSession) -> Path:
+        return session.stop(self.output_dir)
+
+    def results(self) -> List[Dict[str, Any]]:
+        if not self.output_dir.exists():
+            return []
+        files = [p for p in self.output_dir.iterdir() if _SAFE_NAME.match(p.name)]
+        files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        return [{"name": p.name, "bytes": p.stat().st_size, "created": p.stat().st_mtime} for p in files]
+
+    def result_path(self, name: str) -> Optional[Path]:
+        """Path of a result file, or None for unknown / unsafe names"""
+        if not _SAFE_NAME.match(name):
+            return None
+        path = self.output_dir / name
+        return path if path.is_file() else None
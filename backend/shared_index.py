@@ -0,0 +1,325 @@
+"""
+Shared Embedding Index for IdeaGraph AI
+Embedding matrix and id table memory-mapped from disk, shared by all worker processes
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from forking import reset_after_fork
+from tracing import traced
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only coordinated within one process
+    fcntl = None
+
+
+logger = logging.getLogger("ideagraph.index")
+
+# Number of changed ideas tolerated before a new generation is built
+MAX_DELTA = int(os.getenv("SHARED_INDEX_MAX_DELTA", "64"))
+
+
+class _Generation:
+    """One immutable, memory-mapped build of the index (one segment per vector dimension)"""
+
+    def __init__(self, index_dir: Path, meta: Dict[str, Any]):
+        self.number = meta["generation"]
+        self.version = meta["version"]
+        self.segments: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        for seg in meta["segments"]:
+            ids = np.load(index_dir / seg["ids"], mmap_mode='r')
+            matrix = np.load(index_dir / seg["matrix"], mmap_mode='r')
+            norms = np.load(index_dir / seg["norms"], mmap_mode='r')
+            self.segments[seg["dim"]] = (ids, matrix, norms)
+
+    @property
+    def size(self) -> int:
+        return sum(len(ids) for ids, _, _ in self.segments.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(ids.nbytes + matrix.nbytes + norms.nbytes for ids, matrix, norms in self.segments.values())
+
+    @staticmethod
+    def rows(ids: np.ndarray, wanted: List[str]) -> np.ndarray:
+        """Row numbers of `wanted` ids present in the (sorted) id table"""
+        if not wanted or not len(ids):
+            return np.empty(0, dtype=np.int64)
+        wanted = np.asarray(wanted, dtype=ids.dtype)
+        pos = np.searchsorted(ids, wanted)
+        pos = np.minimum(pos, len(ids) - 1)
+        return pos[ids[pos] == wanted]
+
+
+class SharedEmbeddingIndex:
+    """
+    Cosine-similarity index over the store's vectors, shared between processes.
+
+    Each build ("generation") writes the vectors as float32 .npy files that
+    every worker maps read-only, so the page cache holds one copy of the
+    matrix regardless of the worker count. The store's own vectors stay at
+    full precision in its float64 segments (also mapped, see VectorTable), so
+    compaction and exported ideas are never rounded; this float32 copy only
+    halves the bytes each search scans.
+
+    Ideas changed since the mapped generation are scored exactly from the
+    store snapshot; once more than `max_delta` have changed, a background
+    thread builds a new generation and every worker switches to it on its
+    next search.
+    """
+
+    def __init__(self, store, index_dir, max_delta: int = MAX_DELTA):
+        self.store = store
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.pointer_path = self.index_dir / "CURRENT"
+        self.lock_path = self.index_dir / "index.lock"
+        self.max_delta = max_delta
+
+        self._lock = threading.Lock()
+        self._generation: Optional[_Generation] = None
+        self._pointer_stamp = None
+        self._changed: Dict[str, int] = {}  # idea_id -> seq of its latest change
+        self._reloaded_at = 0  # store version of the last full reload (changes unknown)
+        self._syncing = False
+        self._thread: Optional[threading.Thread] = None
+
+        store.subscribe(self._on_store_change)
+        reset_after_fork(self)
+
+    # ============ Status ============
+
+    @property
+    def state(self) -> str:
+        if self._syncing:
+            return "building"
+        if self._generation is None:
+            return "empty"
+        return "ready" if self._generation.version >= self._reloaded_at else "stale"
+
+    def stats(self) -> Dict[str, Any]:
+        gen = self._generation
+        return {
+            "state": self.state,
+            "generation": gen.number if gen else None,
+            "version": gen.version if gen else None,
+            "rows": gen.size if gen else 0,
+            "mapped_bytes": gen.nbytes if gen else 0,
+            "pending_changes": len(self._dirty_ids(gen)[0]),
+        }
+
+    # ============ Search ============
+
+    @traced("index.search")
+    def search(self, query_embedding, top_k: int = 3, exclude_id: Optional[str] = None):
+        """
+        Return up to top_k (idea_id, similarity, idea_data) tuples, most similar first.
+        """
+        snap = self.store.snapshot()
+        gen = self._attach_latest()
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        dim = len(query)
+
+        dirty, unknown = self._dirty_ids(gen)
+        scored: List[Tuple[str, float]] = []
+
+        if gen is None or unknown:
+            # No usable generation: exact scan of the snapshot
+            candidates = snap.vectors.keys()
+            self._schedule_sync()
+        else:
+            candidates = [i for i in dirty if i in snap.vectors]
+            segment = gen.segments.get(dim)
+            if segment is not None and len(segment[0]):
+                ids, matrix, norms = segment
+                sims = self._cosine(matrix, norms, query, query_norm)
+                masked = list(dirty)
+                if exclude_id:
+                    masked.append(exclude_id)
+                sims[_Generation.rows(ids, masked)] = -np.inf
+                k = min(top_k, len(sims))
+                top = np.argpartition(-sims, k - 1)[:k] if k else []
+                scored.extend((str(ids[row]), float(sims[row])) for row in top if sims[row] != -np.inf)
+
+        for idea_id in candidates:
+            if idea_id == exclude_id:
+                continue
+            vec = np.asarray(snap.vectors[idea_id], dtype=np.float32)
+            if len(vec) != dim:
+                continue
+            sim = self._cosine(vec[None, :], np.array([np.linalg.norm(vec)]), query, query_norm)[0]
+            scored.append((idea_id, float(sim)))
+
+        scored.sort(key=lambda x: x[1], reverse=True)
+        results = []
+        for idea_id, sim in scored:
+            if idea_id in snap.ideas:
+                results.append((idea_id, float(np.clip(sim, -1.0, 1.0)), snap.ideas[idea_id]))
+            if len(results) == top_k:
+                break
+        return results
+
+    @staticmethod
+    def _cosine(matrix, norms, query, query_norm) -> np.ndarray:
+        denom = np.asarray(norms, dtype=np.float32) * query_norm
+        dots = np.asarray(matrix @ query, dtype=np.float32)
+        sims = np.zeros(len(dots), dtype=np.float32)
+        np.divide(dots, denom, out=sims, where=denom > 0)
+        return sims
+
+    # ============ Maintenance ============
+
+    def sync(self, wait: bool = True) -> None:
+        """Attach the newest generation, building one first if the store moved on"""
+        if not wait:
+            self._schedule_sync()
+            return
+        snap = self.store.snapshot()
+        gen = self._attach_latest()
+        dirty, unknown = self._dirty_ids(gen)
+        if gen is None or unknown or len(dirty) > self.max_delta:
+            if gen is None or gen.version < snap.version:
+                self._build(snap)
+                self._attach_latest()
+
+    def _on_store_change(self, snapshot, changes: Optional[Dict[str, int]]) -> None:
+        with self._lock:
+            if changes is None:
+                self._changed.clear()
+                self._reloaded_at = snapshot.version
+            else:
+                self._changed.update(changes)
+            pending = len(self._changed)
+        if changes is None or pending > self.max_delta:
+            self._schedule_sync()
+
+    def _dirty_ids(self, gen: Optional[_Generation]) -> Tuple[List[str], bool]:
+        """Ids changed after `gen` was built, and whether unknown changes exist"""
+        if gen is None:
+            return [], True
+        with self._lock:
+            return [i for i, seq in self._changed.items() if seq > gen.version], gen.version < self._reloaded_at
+
+    def _schedule_sync(self) -> None:
+        with self._lock:
+            if self._syncing:
+                return
+            self._syncing = True
+
+        def run():
+            try:
+                self.sync(wait=True)
+            except Exception as e:
+                logger.warning("Shared index sync failed: %s", e)
+            finally:
+                self._syncing = False
+
+        self._thread = threading.Thread(target=run, name="shared-index-sync", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait for a background sync to finish"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._syncing = False
+        self._thread = None
+
+    def _read_pointer(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _attach_latest(self) -> Optional[_Generation]:
+        """Map the generation named by the pointer file if it changed (one stat() otherwise)"""
+        try:
+            st = self.pointer_path.stat()
+            stamp = (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            return self._generation
+        if stamp == self._pointer_stamp:
+            return self._generation
+
+        meta = self._read_pointer()
+        if meta and (self._generation is None or meta["generation"] > self._generation.number):
+            try:
+                gen = _Generation(self.index_dir, meta)
+            except FileNotFoundError:
+                return self._generation  # superseded while we were opening it
+            with self._lock:
+                self._generation = gen
+                # Forget changes already contained in the new generation
+                self._changed = {i: seq for i, seq in self._changed.items() if seq > gen.version}
+        self._pointer_stamp = stamp
+        return self._generation
+
+    @traced("index.build")
+    def _build(self, snap) -> bool:
+        """Write a new generation from `snap`; skipped if another process is already building"""
+        with open(self.lock_path, 'a+b') as lock_file:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+            try:
+                current = self._read_pointer()
+                if current and current["version"] >= snap.version:
+                    return False
+                number = (current["generation"] if current else 0) + 1
+
+                by_dim: Dict[int, List[str]] = {}
+                for idea_id, vec in snap.vectors.items():
+                    by_dim.setdefault(len(vec), []).append(idea_id)
+
+                segments = []
+                for dim, ids in by_dim.items():
+                    ids.sort()
+                    matrix = np.empty((len(ids), dim), dtype=np.float32)
+                    for row, idea_id in enumerate(ids):
+                        matrix[row] = snap.vectors[idea_id]
+                    names = {part: f"{part}-{number}-{dim}.npy" for part in ("ids", "matrix", "norms")}
+                    self._save(names["ids"], np.array(ids))
+                    self._save(names["matrix"], matrix)
+                    self._save(names["norms"], np.linalg.norm(matrix, axis=1).astype(np.float32))
+                    segments.append({"dim": dim, **names})
+
+                meta = {"generation": number, "version": snap.version, "segments": segments}
+                tmp_path = self.pointer_path.with_name(f"CURRENT.{os.getpid()}.tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+                os.replace(tmp_path, self.pointer_path)
+                self._remove_old_generations(keep={number, number - 1})
+                return True
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _save(self, name: str, array: np.ndarray) -> None:
+        tmp_path = self.index_dir / f"{name}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, self.index_dir / name)
+
+    def _remove_old_generations(self, keep) -> None:
+        # Workers still mapping an old generation keep their mapping after unlink
+        for path in self.index_dir.glob("*-*-*.npy"):
+            try:
+                if int(path.name.split('-')[1]) not in keep:
+                    path.unlink()
+            except (ValueError, OSError):
+                continue
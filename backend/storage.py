@@ -0,0 +1,675 @@
+"""
+Idea Storage for IdeaGraph AI
+Multi-process safe persistence of ideas and their embedding vectors
+"""
+
+import copy
+import json
+import os
+import pickle
+import threading
+from collections import namedtuple
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from tracing import span, traced
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, only one process may use the data directory
+    fcntl = None
+
+
+# Number of journal records after which the pickle snapshots are rewritten
+COMPACT_EVERY = int(os.getenv("STORE_COMPACT_EVERY", "200"))
+
+# Key under which callers (and older databases) embed the vector in the idea
+# document. The store keeps vectors only in `vectors` and strips this key.
+EMBEDDED_VECTOR_KEY = 'embedding_vector'
+
+# Immutable view of the store at one version. The vector table, the ideas dict
+# and the documents inside them are shared between threads and must never be mutated.
+Snapshot = namedtuple('Snapshot', ['vectors', 'ideas', 'version'])
+
+
+class VectorTable(MutableMapping):
+    """
+    The vectors of a snapshot, as a mapping idea_id -> vector.
+
+    Vectors written by the last compaction are rows of float64 .npy segments
+    (one per dimension, ids sorted) that every process maps read-only, so the
+    page cache holds them once however many workers share the data directory.
+    Only the vectors changed since are held by the process, in `delta` (None
+    marks a deleted one). A table is mutated only before it is published.
+    """
+
+    def __init__(self, segments: Iterable[Tuple[np.ndarray, np.ndarray]] = (),
+                 delta: Optional[Dict[str, Any]] = None, size: Optional[int] = None):
+        self.segments = tuple(segments)
+        self.delta = delta if delta is not None else {}
+        self._size = sum(len(ids) for ids, _ in self.segments) if size is None else size
+
+    @classmethod
+    def from_dict(cls, vectors: Dict[str, Any]) -> 'VectorTable':
+        """A table holding every vector privately (no segments)"""
+        return cls(delta=dict(vectors), size=len(vectors))
+
+    def copy(self) -> 'VectorTable':
+        """Private copy to apply changes to; shares the segments, copies only the delta"""
+        return VectorTable(self.segments, dict(self.delta), self._size)
+
+    def _row(self, key):
+        if not isinstance(key, str):
+            return None
+        for ids, matrix in self.segments:
+            pos = int(np.searchsorted(ids, key))
+            if pos < len(ids) and ids[pos] == key:
+                return matrix[pos]
+        return None
+
+    def __getitem__(self, key):
+        if key in self.delta:
+            vector = self.delta[key]
+        else:
+            vector = self._row(key)
+        if vector is None:
+            raise KeyError(key)
+        return vector
+
+    def __contains__(self, key) -> bool:
+        if key in self.delta:
+            return self.delta[key] is not None
+        return self._row(key) is not None
+
+    def __setitem__(self, key, vector) -> None:
+        if key not in self:
+            self._size += 1
+        self.delta[key] = vector
+
+    def __delitem__(self, key) -> None:
+        if key not in self:
+            raise KeyError(key)
+        if self._row(key) is None:
+            del self.delta[key]
+        else:
+            self.delta[key] = None
+        self._size -= 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        return (key for key, _ in self._iter_items())
+
+    def _iter_items(self):
+        delta = self.delta
+        for ids, matrix in self.segments:
+            for pos, key in enumerate(ids.tolist()):
+                if key not in delta:
+                    yield key, matrix[pos]
+        for key, vector in delta.items():
+            if vector is not None:
+                yield key, vector
+
+    def items(self):
+        return _VectorItems(self)
+
+    def values(self):
+        return _VectorValues(self)
+
+
+class _VectorItems(ItemsView):
+    def __iter__(self):
+        return self._mapping._iter_items()
+
+
+class _VectorValues(ValuesView):
+    def __iter__(self):
+        return (vector for _, vector in self._mapping._iter_items())
+
+
+class Transaction:
+    """
+    A batch of changes applied atomically by IdeaStore.transaction().
+
+    Reads see the latest committed state plus the transaction's own writes.
+    """
+
+    def __init__(self, base: Snapshot):
+        self._base = base
+        self._puts: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+        self._deleted = set()
+        self.ops: List[tuple] = []
+
+    def get(self, idea_id: str) -> Optional[Dict[str, Any]]:
+        if idea_id in self._deleted:
+            return None
+        if idea_id in self._puts:
+            return self._puts[idea_id][1]
+        return self._base.ideas.get(idea_id)
+
+    def vector(self, idea_id: str):
+        if idea_id in self._deleted:
+            return None
+        if idea_id in self._puts:
+            return self._puts[idea_id][0]
+        return self._base.vectors.get(idea_id)
+
+    def put(self, idea_id: str, vector, idea: Dict[str, Any]) -> None:
+        """Insert or replace one idea; an embedded `embedding_vector` is moved out of the document"""
+        idea, embedded = _strip_embedded_vector(idea)
+        if vector is None:
+            vector = embedded
+        vector = np.asarray(vector) if vector is not None else None
+        self._puts[idea_id] = (vector, idea)
+        self._deleted.discard(idea_id)
+        self.ops.append(("put", idea_id, vector, idea))
+
+    def delete(self, idea_id: str) -> bool:
+        """Delete one idea; returns False if it did not exist"""
+        if self.get(idea_id) is None and self.vector(idea_id) is None:
+            return False
+        self._puts.pop(idea_id, None)
+        self._deleted.add(idea_id)
+        self.ops.append(("delete", idea_id))
+        return True
+
+    def update(self, idea_id: str, mutate: Callable[[Dict[str, Any]], None],
+               vector=None) -> Optional[Dict[str, Any]]:
+        """
+        Read-modify-write one idea.
+
+        `mutate` receives a private copy of the latest version and edits it in
+        place. The stored vector is kept unless a new one is given. Returns
+        the updated idea, or None if it does not exist.
+        """
+        current = self.get(idea_id)
+        if current is None:
+            return None
+        idea = copy.deepcopy(current)
+        mutate(idea)
+        if vector is None and idea.get(EMBEDDED_VECTOR_KEY) is None:
+            vector = self.vector(idea_id)
+        self.put(idea_id, vector, idea)
+        return self.get(idea_id)
+
+
+def _strip_embedded_vector(idea: Dict[str, Any]) -> Tuple[Dict[str, Any], Any]:
+    """Return (idea without `embedding_vector`, the removed vector or None); never mutates idea"""
+    if EMBEDDED_VECTOR_KEY not in idea:
+        return idea, None
+    idea = dict(idea)
+    return idea, idea.pop(EMBEDDED_VECTOR_KEY)
+
+
+def with_embedding(idea: Dict[str, Any], vector) -> Dict[str, Any]:
+    """Copy of a stored idea with its vector re-attached as a JSON-friendly list"""
+    idea = dict(idea)
+    if vector is not None:
+        idea[EMBEDDED_VECTOR_KEY] = np.asarray(vector, dtype=np.float64).tolist()
+    return idea
+
+
+class IdeaStore:
+    """
+    Ideas and their embeddings, kept in memory and persisted to disk.
+
+    On disk the store is made of:
+      - vector_db.pkl / ideas_db.pkl: snapshots (plain dicts, same format as before)
+      - vectors-<generation>-<dim>.npy / vector_ids-<generation>-<dim>.npy:
+        the vectors of vector_db.pkl as float64 segments, listed in
+        vector_segments.json and memory-mapped by every process (rebuilt
+        from the pickle when missing or older than it)
+      - store.journal: append-only log of changes made since the snapshot
+      - store.meta: snapshot generation and last sequence number
+      - store.lock: target of the inter-process file lock
+
+    Writers take an exclusive file lock, replay any records appended by other
+    processes, then append their own record. Readers detect new records with a
+    stat() and replay only the part of the journal they have not seen yet, so
+    several worker processes can safely share one data directory.
+
+    Inside a process, writers are serialized and publish a new copy-on-write
+    Snapshot when they commit. Readers grab the current snapshot without
+    taking any lock, so searches never wait for a write to finish. A
+    process keeps privately only the ideas and the vectors changed since
+    the last compaction; the other vectors are read from the shared
+    segments (see VectorTable).
+    """
+
+    def __init__(self, data_dir, compact_every: int = COMPACT_EVERY):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.vector_path = self.data_dir / "vector_db.pkl"
+        self.ideas_path = self.data_dir / "ideas_db.pkl"
+        self.segments_path = self.data_dir / "vector_segments.json"
+        self.journal_path = self.data_dir / "store.journal"
+        self.meta_path = self.data_dir / "store.meta"
+        self.lock_path = self.data_dir / "store.lock"
+        self.compact_every = compact_every
+
+        # Serializes writers (and catch-up) within this process
+        self._mutex = threading.RLock()
+        self._snapshot: Optional[Snapshot] = None  # None until the first load
+        self._generation = 0
+        self._legacy_embedded = 0  # documents loaded with an embedded vector (see migrate)
+        self._offset = 0
+        self._journal_records = 0
+        self._snapshot_stamp = None
+        self._stamp = None
+        self._listeners: List[Callable] = []
+
+    def subscribe(self, listener: Callable[[Snapshot, Optional[Dict[str, int]]], None]) -> None:
+        """
+        Call `listener(snapshot, changes)` whenever a new snapshot is published.
+
+        `changes` maps each changed idea_id to the sequence number of the
+        change, or is None when the whole store was reloaded from disk and the
+        individual changes are unknown. Listeners run while the writer lock is
+        held, so they must be quick (hand heavy work to a background thread).
+        """
+        self._listeners.append(listener)
+
+    # ============ Reading ============
+
+    @property
+    def version(self) -> int:
+        """Sequence number of the last change applied to this process' view"""
+        return self._snapshot.version if self._snapshot else 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def status(self) -> Dict[str, Any]:
+        """Loaded state, version and size of this process' view, without touching disk"""
+        snap = self._snapshot
+        return {
+            "loaded": snap is not None,
+            "version": snap.version if snap else None,
+            "ideas": len(snap.ideas) if snap else 0,
+            "journal_records": self._journal_records,
+        }
+
+    def snapshot(self) -> Snapshot:
+        """Return the current immutable snapshot (picking up other processes' writes)"""
+        self.refresh()
+        return self._snapshot
+
+    def refresh(self) -> None:
+        """
+        Pick up changes written by other processes.
+
+        Cheap when nothing changed. Once loaded, never blocks: if a writer in
+        this or another process holds the lock, the current snapshot is kept
+        and the next call catches up.
+        """
+        if self._snapshot is not None and self._disk_stamp() == self._stamp:
+            return
+        blocking = self._snapshot is None
+        if not self._mutex.acquire(blocking=blocking):
+            return
+        try:
+            with self._file_lock(exclusive=False, blocking=blocking) as locked:
+                if locked:
+                    self._catch_up()
+                    self._stamp = self._disk_stamp()
+        finally:
+            self._mutex.release()
+
+    def load(self) -> Tuple[Mapping[str, np.ndarray], Dict[str, Dict[str, Any]]]:
+        """Return (vectors, ideas) of the current snapshot; treat them as read-only"""
+        snap = self.snapshot()
+        return snap.vectors, snap.ideas
+
+    def get(self, idea_id: str) -> Optional[Dict[str, Any]]:
+        """Return a single idea (read-only), or None if it does not exist"""
+        return self.snapshot().ideas.get(idea_id)
+
+    def count(self) -> int:
+        return len(self.snapshot().ideas)
+
+    def get_with_embedding(self, idea_id: str) -> Optional[Dict[str, Any]]:
+        """Copy of one idea with `embedding_vector` re-attached (documents are stored without it)"""
+        snap = self.snapshot()
+        idea = snap.ideas.get(idea_id)
+        return with_embedding(idea, snap.vectors.get(idea_id)) if idea is not None else None
+
+    # ============ Writing ============
+
+    @contextmanager
+    def transaction(self):
+        """
+        Atomically apply a group of changes.
+
+            with store.transaction() as txn:
+                txn.put(...)
+                txn.update(parent_id, mutate)
+
+        The block runs against the latest state of all processes while holding
+        the writer lock, and its changes are committed as one journal record.
+        If the block raises, nothing is written.
+        """
+        with self._mutex, self._file_lock(exclusive=True):
+            self._catch_up()
+            txn = Transaction(self._snapshot)
+            yield txn
+            if txn.ops:
+                self._commit({"op": "batch", "ops": txn.ops, "seq": self._snapshot.version + 1})
+            self._stamp = self._disk_stamp()
+
+    def put(self, idea_id: str, vector, idea: Dict[str, Any]) -> None:
+        """Insert or replace one idea"""
+        self.put_many([(idea_id, vector, idea)])
+
+    def put_many(self, items: Iterable[Tuple[str, Any, Dict[str, Any]]]) -> None:
+        """Insert or replace several ideas atomically"""
+        with self.transaction() as txn:
+            for idea_id, vector, idea in items:
+                txn.put(idea_id, vector, idea)
+
+    def delete(self, idea_ids: Iterable[str]) -> List[str]:
+        """Delete ideas atomically; returns the ids that actually existed"""
+        with self.transaction() as txn:
+            return [idea_id for idea_id in idea_ids if txn.delete(idea_id)]
+
+    def update(self, idea_id: str, mutate: Callable[[Dict[str, Any]], None],
+               vector=None) -> Optional[Dict[str, Any]]:
+        """Atomically read-modify-write one idea (see Transaction.update)"""
+        with self.transaction() as txn:
+            return txn.update(idea_id, mutate, vector)
+
+    def migrate(self) -> int:
+        """
+        Persist the removal of embeddings duplicated inside idea documents.
+
+        Databases written before vectors were de-duplicated keep a copy of each
+        vector in `idea['embedding_vector']`. Loading strips them in memory;
+        this rewrites the snapshot files so the copies are gone from disk too.
+        Returns the number of documents migrated.
+        """
+        with self._mutex, self._file_lock(exclusive=True):
+            self._catch_up()
+            migrated = self._legacy_embedded
+            if migrated:
+                self._compact()
+                self._legacy_embedded = 0
+            self._stamp = self._disk_stamp()
+            return migrated
+
+    def compact(self) -> None:
+        """Fold the journal into fresh snapshot files"""
+        with self._mutex, self._file_lock(exclusive=True):
+            self._catch_up()
+            if self._journal_records:
+                self._compact()
+            self._stamp = self._disk_stamp()
+
+    # ============ Internals ============
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool, blocking: bool = True):
+        """Inter-process lock; yields False if non-blocking and the lock is busy"""
+        with open(self.lock_path, 'a+b') as f:
+            if fcntl:
+                flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                try:
+                    fcntl.flock(f.fileno(), flags if blocking else flags | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _stat(path: Path):
+        try:
+            st = path.stat()
+            return (st.st_ino, st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def _disk_stamp(self):
+        return (self._stat(self.meta_path), self._stat(self.journal_path), self._current_snapshot_stamp())
+
+    def _current_snapshot_stamp(self):
+        return (self._stat(self.vector_path), self._stat(self.ideas_path))
+
+    def _read_meta(self) -> Dict[str, int]:
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"generation": 0, "seq": 0}
+
+    def _catch_up(self) -> None:
+        """Bring the published snapshot up to date with disk (caller holds both locks)"""
+        meta = self._read_meta()
+        if (self._snapshot is None
+                or meta.get("generation", 0) != self._generation
+                or self._current_snapshot_stamp() != self._snapshot_stamp):
+            self._load_snapshot(meta)
+            self._notify(None)
+            return
+
+        records = self._read_journal()
+        if records:
+            with span("store.replay_journal", records=len(records)):
+                vectors, ideas = self._snapshot.vectors.copy(), dict(self._snapshot.ideas)
+                version = self._snapshot.version
+                changes = {}
+                for record in records:
+                    version = self._apply(record, vectors, ideas, version, changes)
+                self._snapshot = Snapshot(vectors, ideas, version)
+                self._notify(changes)
+
+    def _notify(self, changes: Optional[Dict[str, int]]) -> None:
+        for listener in self._listeners:
+            listener(self._snapshot, changes)
+
+    @traced("store.load_snapshot")
+    def _load_snapshot(self, meta: Dict[str, int]) -> None:
+        vectors, ideas = VectorTable(), {}
+        if self.vector_path.exists() and self.ideas_path.exists():
+            vectors = self._map_vectors(meta.get("generation", 0))
+            with open(self.ideas_path, 'rb') as f:
+                ideas = pickle.load(f)
+
+        self._generation = meta.get("generation", 0)
+        self._offset = 0
+        self._journal_records = 0
+        self._snapshot_stamp = self._current_snapshot_stamp()
+
+        # Migration: move embeddings duplicated inside documents out of them
+        self._legacy_embedded = 0
+        for idea_id, idea in ideas.items():
+            if EMBEDDED_VECTOR_KEY in idea:
+                ideas[idea_id], embedded = _strip_embedded_vector(idea)
+                if idea_id not in vectors and embedded is not None:
+                    vectors[idea_id] = np.asarray(embedded)
+                self._legacy_embedded += 1
+
+        version = meta.get("seq", 0)
+        for record in self._read_journal():
+            version = self._apply(record, vectors, ideas, version)
+        self._snapshot = Snapshot(vectors, ideas, version)
+
+    def _map_vectors(self, generation: int) -> VectorTable:
+        """Vectors of vector_db.pkl mapped from its segments, which are written first if missing or stale"""
+        manifest = self._read_segments()
+        if (manifest is not None and manifest.get("generation") == generation
+                and manifest.get("source") == list(self._stat(self.vector_path))):
+            try:
+                return self._open_segments(manifest)
+            except (OSError, ValueError):
+                pass  # removed or torn segment: rewrite it from the pickle
+        with open(self.vector_path, 'rb') as f:
+            vectors = pickle.load(f)
+        try:
+            return self._open_segments(self._write_segments(generation, vectors))
+        except OSError:
+            # e.g. a read-only data directory: this process keeps its vectors privately
+            return VectorTable.from_dict(vectors)
+
+    def _read_segments(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.segments_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _open_segments(self, manifest: Dict[str, Any]) -> VectorTable:
+        return VectorTable(
+            (np.load(self.data_dir / seg["ids"], mmap_mode='r'),
+             np.asarray(np.load(self.data_dir / seg["matrix"], mmap_mode='r')))
+            for seg in manifest["segments"])
+
+    def _write_segments(self, generation: int, vectors: Mapping[str, Any]) -> Dict[str, Any]:
+        """Write the float64 segments of vector_db.pkl (already written) and point the manifest at them"""
+        by_dim: Dict[int, List[str]] = {}
+        for idea_id, vec in vectors.items():
+            by_dim.setdefault(len(vec), []).append(idea_id)
+
+        segments = []
+        for dim, ids in sorted(by_dim.items()):
+            ids.sort()
+            matrix = np.empty((len(ids), dim), dtype=np.float64)
+            for row, idea_id in enumerate(ids):
+                matrix[row] = vectors[idea_id]
+            names = {"ids": f"vector_ids-{generation}-{dim}.npy", "matrix": f"vectors-{generation}-{dim}.npy"}
+            self._atomic_save(self.data_dir / names["ids"], np.array(ids))
+            self._atomic_save(self.data_dir / names["matrix"], matrix)
+            segments.append({"dim": dim, **names})
+
+        manifest = {"generation": generation, "source": list(self._stat(self.vector_path)), "segments": segments}
+        self._atomic_write(self.segments_path, json.dumps(manifest).encode('utf-8'))
+        self._remove_old_segments(keep={generation, generation - 1})
+        return manifest
+
+    def _remove_old_segments(self, keep) -> None:
+        # Processes still mapping an old segment keep their mapping after unlink
+        for path in self.data_dir.glob("vector*-*-*.npy"):
+            try:
+                if int(path.name.split('-')[1]) not in keep:
+                    path.unlink()
+            except (ValueError, OSError):
+                continue
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        """Read the records appended since the last read"""
+        records = []
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return records
+        with f:
+            f.seek(self._offset)
+            while True:
+                try:
+                    record = pickle.load(f)
+                except Exception:
+                    # End of journal, or a torn record left by a crashed writer
+                    # (the next writer truncates it before appending)
+                    break
+                records.append(record)
+                self._offset = f.tell()
+                self._journal_records += 1
+        return records
+
+    @staticmethod
+    def _apply(record: Dict[str, Any], vectors: VectorTable, ideas: Dict, version: int,
+               changes: Optional[Dict[str, int]] = None) -> int:
+        """Apply one journal record to a private (unpublished) vector table and ideas dict"""
+        if record["op"] == "batch":
+            ops = record["ops"]
+        elif record["op"] == "put":
+            ops = [("put", idea_id, vector, idea) for idea_id, vector, idea in record["items"]]
+        else:
+            ops = [("delete", idea_id) for idea_id in record["ids"]]
+
+        for op in ops:
+            if op[0] == "put":
+                _, idea_id, vector, idea = op
+                idea, embedded = _strip_embedded_vector(idea)  # records from older versions
+                if vector is None and embedded is not None:
+                    vector = np.asarray(embedded)
+                if vector is None:
+                    vectors.pop(idea_id, None)
+                else:
+                    vectors[idea_id] = vector
+                ideas[idea_id] = idea
+            else:
+                vectors.pop(op[1], None)
+                ideas.pop(op[1], None)
+            if changes is not None:
+                changes[op[1]] = record["seq"]
+        return max(version, record["seq"])
+
+    @traced("store.commit")
+    def _commit(self, record: Dict[str, Any]) -> None:
+        """Append one record to the journal and publish the new snapshot (caller holds both locks)"""
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.journal_path, 'ab') as f:
+            if f.tell() != self._offset:
+                f.truncate(self._offset)
+                f.seek(self._offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            self._offset = f.tell()
+        self._journal_records += 1
+
+        vectors, ideas = self._snapshot.vectors.copy(), dict(self._snapshot.ideas)
+        changes = {}
+        version = self._apply(record, vectors, ideas, self._snapshot.version, changes)
+        self._snapshot = Snapshot(vectors, ideas, version)
+        self._notify(changes)
+
+        if self._journal_records >= self.compact_every:
+            self._compact()
+
+    @traced("store.compact")
+    def _compact(self) -> None:
+        # Snapshots and their vector segments first, then the new generation,
+        # then an empty journal. Replaying the old journal over the new
+        # snapshot yields the same state, so a crash at any point in between
+        # loses nothing.
+        snap = self._snapshot
+        vectors = dict(snap.vectors.items())
+        self._atomic_write(self.vector_path, pickle.dumps(vectors, protocol=pickle.HIGHEST_PROTOCOL))
+        self._atomic_write(self.ideas_path, pickle.dumps(snap.ideas, protocol=pickle.HIGHEST_PROTOCOL))
+        manifest = self._write_segments(self._generation + 1, vectors)
+        self._generation += 1
+        meta = {"generation": self._generation, "seq": snap.version}
+        self._atomic_write(self.meta_path, json.dumps(meta).encode('utf-8'))
+        self._atomic_write(self.journal_path, b"")
+        self._offset = 0
+        self._journal_records = 0
+        self._snapshot_stamp = self._current_snapshot_stamp()
+        # Same contents, now read from the new segments instead of the delta
+        self._snapshot = Snapshot(self._open_segments(manifest), snap.ideas, snap.version)
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _atomic_save(path: Path, array: np.ndarray) -> None:
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
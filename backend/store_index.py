@@ -0,0 +1,81 @@
+"""
+Store Index for IdeaGraph AI
+Common base of the in-memory indexes kept in step with the store, and the entity nodes they index
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def normalize(text: Optional[str]) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def entity_nodes(idea: Dict[str, Any]) -> List[Tuple[str, str, str, str]]:
+    """Graph nodes of an idea that name an entity, as (normalized name, node_id, type, spelling)"""
+    nodes = ((idea.get('distilled_data') or {}).get('graph_structure') or {}).get('nodes', [])
+    entries = []
+    for node in nodes:
+        spelling = node.get('name')
+        name = normalize(spelling) if isinstance(spelling, str) else ""
+        if name:
+            entries.append((name, str(node.get('id', name)), node.get('type') or "Concept", spelling.strip()))
+    return entries
+
+
+class StoreIndex:
+    """
+    Base of the indexes that follow the store (keyword, BM25, entity, graph).
+
+    Subclasses keep their tables under `self._lock` and implement `_clear`,
+    `_add(idea_id, idea)` and `_remove(idea_id)`. Each published change
+    re-indexes only the changed ideas; a full reload marks the index stale
+    and it is rebuilt from a snapshot by the next `_ensure_built()`, which
+    every lookup calls first.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._stale = True
+        store.subscribe(self._on_store_change)
+
+    def warm(self) -> None:
+        """Build now instead of on the first lookup (e.g. before the server forks its workers)"""
+        self._ensure_built()
+
+    def _ensure_built(self) -> None:
+        if not self._stale:
+            return
+        snap = self.store.snapshot()
+        with self._lock:
+            if not self._stale:
+                return
+            self._rebuild(snap.ideas)
+            # Changes published while building were skipped; rebuild again next time
+            self._stale = self.store.version != snap.version
+
+    def _rebuild(self, ideas: Dict[str, Dict[str, Any]]) -> None:
+        self._clear()
+        for idea_id, idea in ideas.items():
+            self._add(idea_id, idea)
+
+    def _on_store_change(self, snapshot, changes: Optional[Dict[str, int]]) -> None:
+        with self._lock:
+            if changes is None or self._stale:
+                self._stale = True
+                return
+            for idea_id in changes:
+                self._remove(idea_id)
+                idea = snapshot.ideas.get(idea_id)
+                if idea is not None:
+                    self._add(idea_id, idea)
+
+    def _clear(self) -> None:
+        raise NotImplementedError
+
+    def _add(self, idea_id: str, idea: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def _remove(self, idea_id: str) -> None:
+        raise NotImplementedError
@@ -0,0 +1,56 @@
+"""
+Idea documents, passages and app storage shared by the retrieval tests
+"""
+import tempfile
+from contextlib import contextmanager
+
+import app as backend_app
+
+
+def idea(one_liner="", *, summary="", tags=(), content=None, entities=(), edges=(), **fields):
+    """
+    An idea document with only the parts a test needs.
+
+    `entities` become graph nodes n0, n1, ...: a name (type Concept) or a
+    (name, type) / (name, type, desc) tuple. `edges` are (source, target,
+    relation) triples between those node ids. Other keyword arguments are
+    set on the idea itself (idea_id, parent_idea_id, child_idea_ids, ...).
+    """
+    nodes = []
+    for i, entity in enumerate(entities):
+        name, node_type, *desc = (entity, "Concept") if isinstance(entity, str) else entity
+        node = {"id": f"n{i}", "name": name, "type": node_type}
+        if desc:
+            node["desc"] = desc[0]
+        nodes.append(node)
+    doc = {"distilled_data": {
+        "one_liner": one_liner, "tags": list(tags), "summary": summary,
+        "graph_structure": {"nodes": nodes,
+                            "edges": [{"source": s, "target": t, "relation": r} for s, t, r in edges]},
+    }}
+    if content is not None:
+        doc["content_raw"] = content
+    doc.update(fields)
+    return doc
+
+
+def paragraph(topic):
+    """A paragraph long enough to be a passage of its own"""
+    return f"Notes on {topic}. " * 12
+
+
+@contextmanager
+def app_storage():
+    """
+    Point the app at a fresh data directory, removed afterwards.
+
+    Queued indexing is waited for first. Background passes still sleeping
+    when the test ends find their directory gone and only log it.
+    """
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as data_dir:
+        backend_app.init_storage(data_dir)
+        try:
+            yield data_dir
+        finally:
+            backend_app.embedding_index.wait()
+            backend_app.chunk_index.wait()
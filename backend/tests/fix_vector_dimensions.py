@@ -90,8 +90,8 @@ def fix_dimensions():
             embedding = response.data[0].embedding
             new_vectors[idea_id] = embedding
             
-            # 同时更新 idea_data 中的 embedding_vector
-            idea_data['embedding_vector'] = embedding
+            # 向量只保存在 vector_db 中，移除 idea_data 里的旧副本
+            idea_data.pop('embedding_vector', None)
             
             print(f" ✅ ({len(embedding)} 维)")
             
@@ -0,0 +1,70 @@
+"""
+Test the synthetic corpus generator and a tiny run of the storage benchmarks
+"""
+import sys
+import os
+import logging
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+from corpus import generate_corpus, populate
+from storage import IdeaStore
+import bench_store
+
+
+def test_corpus_is_deterministic():
+    """Test that the same seed gives the same corpus, shaped like distill output"""
+    print("🔍 Testing synthetic corpus...")
+    first = list(generate_corpus(5, dim=8, seed=7))
+    second = list(generate_corpus(5, dim=8, seed=7))
+    assert [i for i, _, _ in first] == [i for i, _, _ in second]
+    assert all((a[1] == b[1]).all() for a, b in zip(first, second))
+
+    idea = first[0][2]
+    graph = idea["distilled_data"]["graph_structure"]
+    node_ids = {n["id"] for n in graph["nodes"]}
+    assert len(graph["nodes"]) >= 4 and "embedding_vector" not in idea
+    assert all(e["source"] in node_ids and e["target"] in node_ids for e in graph["edges"])
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        ids = populate(store, 30, dim=8, seed=1, batch=7)
+        assert store.count() == 30 and len(ids) == 30
+        assert any(store.get(i)["linked_idea_ids"] for i in ids)
+    print("✅ Corpus deterministic and well-formed")
+
+
+def test_benchmark_report():
+    """Test that a tiny benchmark run produces comparable results for every operation"""
+    print("\n🔍 Testing benchmark run...")
+    level = logging.getLogger("ideagraph").level
+    report = bench_store.run([40], dim=8, repeat=3)
+    assert logging.getLogger("ideagraph").level == level, "benchmark left app logging quieted"
+    result = report["results"][0]
+    for op in bench_store.OPERATIONS:
+        assert result[op]["count"] > 0 and result[op]["p99_ms"] >= result[op]["p50_ms"], op
+    assert result["memory"]["store"]["idea_documents"] > 0
+    assert len(bench_store.compare(report, report)) == len(bench_store.OPERATIONS)
+    print("✅ Benchmark report complete")
+
+
+def main():
+    print("=" * 60)
+    print("Benchmark Suite Tests")
+    print("=" * 60)
+
+    try:
+        test_corpus_is_deterministic()
+        test_benchmark_report()
+
+        print("\n" + "=" * 60)
+        print("✅ All benchmark suite tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
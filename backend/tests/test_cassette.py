@@ -0,0 +1,153 @@
+"""
+Test recording upstream traffic to a cassette and replaying it offline
+"""
+import sys
+import os
+import json
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+from openai import OpenAI, APIStatusError
+
+import app as backend_app
+from cassette import Cassette, CassettePlayer, CassetteRecorder, CassetteMiss, ReplayedError, REDACTED
+from fake_provider import start_server, base_url
+from upstream import InstrumentedClient
+
+API_KEY = "sk-test-0123456789abcdefghij"
+DISTILL = [{"role": "system", "content": "distiller"},
+           {"role": "user", "content": "Distill this idea:\n\nTidal power for island grids"}]
+
+
+def _record(path, **provider_settings):
+    server = start_server(dim=8, **provider_settings)
+    try:
+        client = CassetteRecorder(OpenAI(api_key=API_KEY, base_url=base_url(server), max_retries=0),
+                                  Cassette(path), "llm")
+        chat = client.chat.completions.create(model="m", messages=DISTILL)
+        leak = client.chat.completions.create(model="m", messages=[
+            {"role": "user", "content": f"my key is {API_KEY} and Bearer abcdefgh12345678"}])
+        vector = client.embeddings.create(model="e", input="tidal power").data[0].embedding
+        return chat, leak, vector
+    finally:
+        server.shutdown()
+
+
+def test_record_redacts_secrets():
+    """Test that calls are recorded with timings and without secrets"""
+    print("🔍 Testing cassette recording...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upstream.jsonl")
+        _record(path, chat_latency="fixed:50")
+        text = open(path, encoding="utf-8").read()
+        assert API_KEY not in text and "abcdefgh12345678" not in text, "Secret leaked into cassette"
+        assert REDACTED in text
+        entries = Cassette(path).entries()
+        assert [e["operation"] for e in entries] == ["chat.completions", "chat.completions", "embeddings"]
+        assert entries[0]["duration"] >= 0.05 and entries[0]["error"] is None
+    print("✅ Calls recorded with timings, secrets redacted")
+
+
+def test_replay_with_scaled_latency():
+    """Test that the player returns recorded responses after scaled recorded latencies"""
+    print("\n🔍 Testing replay...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upstream.jsonl")
+        chat, _, vector = _record(path, chat_latency="fixed:100")
+
+        player = CassettePlayer(Cassette(path), "llm", latency_scale=0.5)
+        start = time.perf_counter()
+        replayed = player.chat.completions.create(model="other-model", messages=DISTILL)
+        elapsed = time.perf_counter() - start
+        assert replayed.choices[0].message.content == chat.choices[0].message.content
+        assert 0.05 <= elapsed < 0.1, elapsed
+        instant = CassettePlayer(Cassette(path), "llm", latency_scale=0)
+        assert instant.embeddings.create(model="e", input="tidal power").data[0].embedding == vector
+
+        # Unrecorded requests fall back to a recording of the same operation unless strict
+        other = [{"role": "user", "content": "Distill this idea:\n\nsomething else"}]
+        assert instant.chat.completions.create(model="m", messages=other).choices
+        try:
+            CassettePlayer(Cassette(path), "llm", 0, strict=True).chat.completions.create(model="m", messages=other)
+            raise AssertionError("Strict player answered an unrecorded request")
+        except CassetteMiss:
+            pass
+    print(f"✅ Replayed in {elapsed * 1000:.0f} ms (recorded 100 ms, scale 0.5)")
+
+
+def test_recorded_errors_and_backend_replay():
+    """Test that recorded failures are raised again and the backend runs from a cassette"""
+    print("\n🔍 Testing error replay and backend replay...")
+    with tempfile.TemporaryDirectory() as tmp:
+        failing = os.path.join(tmp, "failing.jsonl")
+        try:
+            _record(failing, failure_rate=1.0)
+            raise AssertionError("Injected failure not raised")
+        except APIStatusError:
+            pass
+        try:
+            CassettePlayer(Cassette(failing), "llm", 0).chat.completions.create(model="m", messages=DISTILL)
+            raise AssertionError("Recorded failure not replayed")
+        except ReplayedError:
+            pass
+
+        path = os.path.join(tmp, "upstream.jsonl")
+        server = start_server(dim=8)
+        try:
+            recorder = CassetteRecorder(OpenAI(api_key="fake", base_url=base_url(server)), Cassette(path), "llm")
+            saved = (backend_app.llm_client, backend_app.embedding_client)
+            backend_app.llm_client = InstrumentedClient(recorder, provider="llm")
+            backend_app.embedding_client = InstrumentedClient(recorder, provider="embedding")
+            client = backend_app.app.test_client()
+            recorded = client.post("/api/distill", json={"text": "Tidal power for island grids"}).json
+        finally:
+            server.shutdown()
+
+        try:
+            player = CassettePlayer(Cassette(path), "llm", 0, strict=True)
+            backend_app.llm_client = InstrumentedClient(player, provider="llm")
+            backend_app.embedding_client = InstrumentedClient(player, provider="embedding")
+            replayed = client.post("/api/distill", json={"text": "Tidal power for island grids"})
+            assert replayed.status_code == 200, replayed.json
+            assert replayed.json["one_liner"] == recorded["one_liner"]
+            assert replayed.json["embedding_vector"] == recorded["embedding_vector"]
+        finally:
+            backend_app.llm_client, backend_app.embedding_client = saved
+
+        # The fake provider serves the same cassette over HTTP
+        server = start_server(dim=8, cassette=path, latency_scale=0)
+        try:
+            http_client = OpenAI(api_key="fake", base_url=base_url(server))
+            content = json.loads(http_client.chat.completions.create(
+                model="m", messages=[{"role": "system", "content": backend_app.DISTILL_SYSTEM_PROMPT},
+                                     {"role": "user", "content": "Distill this idea:\n\nTidal power for island grids"}]
+            ).choices[0].message.content)
+            assert content["one_liner"] == recorded["one_liner"]
+            assert server.provider.calls.get("replayed") == 1
+        finally:
+            server.shutdown()
+    print("✅ Failures replayed; backend and fake provider run from the cassette")
+
+
+def main():
+    print("=" * 60)
+    print("Cassette Tests")
+    print("=" * 60)
+
+    try:
+        test_record_redacts_secrets()
+        test_replay_with_scaled_latency()
+        test_recorded_errors_and_backend_replay()
+
+        print("\n" + "=" * 60)
+        print("✅ All cassette tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
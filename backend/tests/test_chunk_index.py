@@ -0,0 +1,145 @@
+"""
+Test passage chunking, incremental re-indexing and passage retrieval
+"""
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+import app as backend_app
+from chunk_index import ChunkIndex, split_chunks
+from factories import app_storage, idea, paragraph
+from fake_provider import embed
+
+DIM = 64
+TOPICS = ["solar panels rooftop inverter", "medieval poetry rhythm meter", "tidal turbines estuary current",
+          "sourdough starter fermentation flour", "bicycle gear ratio cadence"]
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return [embed(text, DIM) for text in texts]
+
+
+def test_split_chunks():
+    """Test that short paragraphs are merged and long ones split at sentence ends"""
+    print("🔍 Testing split_chunks...")
+    assert split_chunks("") == [] and split_chunks(None) == []
+    assert split_chunks("Title\n\nShort body.", max_chars=100, min_chars=50) == ["Title\n\nShort body."]
+
+    long_text = "One sentence here. " * 30
+    chunks = split_chunks(long_text, max_chars=100, min_chars=20)
+    assert len(chunks) > 1 and all(len(c) <= 100 for c in chunks)
+    assert all(c.endswith(".") for c in chunks), "Long paragraphs should be cut at sentence ends"
+
+    base = "\n\n".join(paragraph(t) for t in TOPICS[:3])
+    appended = split_chunks(base + "\n\n" + paragraph(TOPICS[3]))
+    assert appended[:3] == split_chunks(base), "Appending text must not change earlier passages"
+    print(f"✅ {len(chunks)} passages from one long paragraph, prefix stable on append")
+
+
+def test_incremental_index():
+    """Test that re-indexing embeds only new passages and removes stale ones"""
+    print("\n🔍 Testing incremental re-indexing...")
+    embedder = CountingEmbedder()
+    with tempfile.TemporaryDirectory() as data_dir:
+        index = ChunkIndex(data_dir, embedder, lambda idea_id: None)
+        other_worker = ChunkIndex(data_dir, embedder, lambda idea_id: None)
+        rebuilds = []
+        rebuild = index._passages._rebuild
+        index._passages._rebuild = lambda docs: (rebuilds.append(len(docs)), rebuild(docs))
+        content = "\n\n".join(paragraph(t) for t in TOPICS[:3])
+
+        assert index.index_idea("a", content) == {"added": 3, "kept": 0, "removed": 0}
+        assert len(embedder.texts) == 3
+
+        # refine_idea appends a note: only that passage is embedded
+        refined = content + "\n\n" + paragraph(TOPICS[3])
+        assert index.index_idea("a", refined) == {"added": 1, "kept": 3, "removed": 0}
+        assert len(embedder.texts) == 4
+        assert index.index_idea("a", refined)["added"] == 0, "Unchanged content should not be re-embedded"
+
+        # Dropping the first paragraph removes it and moves the rest up
+        shortened = "\n\n".join(paragraph(t) for t in TOPICS[1:4])
+        assert index.index_idea("a", shortened) == {"added": 0, "kept": 3, "removed": 1}
+        docs = index.store.snapshot().ideas
+        assert [docs[k]["position"] for k in index.chunk_ids("a")] == [0, 1, 2]
+        assert other_worker.chunk_ids("a") == index.chunk_ids("a"), "Other process missed the changes"
+
+        assert index.index_idea("a", None)["removed"] == 3 and not index.indexed("a")
+        assert rebuilds == [0], f"Passage map rebuilt instead of updated: {rebuilds}"
+        print("✅ Only new passages embedded, stale ones dropped")
+
+
+def test_search_and_background_indexing():
+    """Test that passages are searched only within the given ideas, and schedule() indexes in the background"""
+    print("\n🔍 Testing passage search...")
+    contents = {f"idea-{i}": "\n\n".join(paragraph(t) for t in TOPICS[i:] + TOPICS[:i]) for i in range(3)}
+    with tempfile.TemporaryDirectory() as data_dir:
+        index = ChunkIndex(data_dir, CountingEmbedder(), contents.get)
+        index.schedule(contents)
+        index.wait()
+        assert all(index.indexed(idea_id) for idea_id in contents)
+
+        hits = index.search(embed("how does a sourdough starter ferment", DIM), ["idea-1", "idea-2"], top_k=2)
+        assert sorted(h["idea_id"] for h in hits) == ["idea-1", "idea-2"]
+        assert all("sourdough" in h["text"] for h in hits), hits
+        assert hits[0]["similarity"] >= hits[1]["similarity"]
+        print("✅ Closest passages found in the requested ideas")
+
+
+def test_rag_context_uses_relevant_passages():
+    """Test that chat context quotes the passage answering the question, even from a related idea"""
+    print("\n🔍 Testing build_rag_context passage retrieval...")
+    with app_storage() as data_dir:
+        backend_app.chunk_index = ChunkIndex(Path(data_dir) / "chunks", CountingEmbedder(), backend_app.idea_content)
+
+        current = idea("Energy notes", summary="s", content="\n\n".join(paragraph(t) for t in TOPICS[:3]),
+                       idea_id="current")
+        related = idea("Kitchen notes", summary="s", content="\n\n".join(paragraph(t) for t in TOPICS[2:]),
+                       idea_id="related")
+        backend_app.add_to_vector_db("current", embed("energy", DIM), current)
+        backend_app.add_to_vector_db("related", embed("energy", DIM), related)
+        backend_app.chunk_index.schedule(["current", "related"])
+        backend_app.chunk_index.wait()
+
+        context, citations, _ = backend_app.build_rag_context(
+            current, embed("energy", DIM), "current", max_tokens=400,
+            query_embedding=embed("sourdough starter fermentation", DIM))
+        passage = next(c for c in citations if "chunk" in c)
+        assert passage["idea_id"] == "related" and "sourdough" in passage["snippet"], citations
+        assert "(from Kitchen notes)" in context
+
+        # Without a question the current idea's leading paragraphs are used
+        context, citations, _ = backend_app.build_rag_context(current, None, "current", max_tokens=400)
+        assert "solar" in context and "sourdough" not in context
+        print("✅ Passage from the related idea quoted")
+
+
+def main():
+    print("=" * 60)
+    print("Chunk Index Tests")
+    print("=" * 60)
+
+    try:
+        test_split_chunks()
+        test_incremental_index()
+        test_search_and_background_indexing()
+        test_rag_context_uses_relevant_passages()
+
+        print("\n" + "=" * 60)
+        print("✅ All chunk index tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
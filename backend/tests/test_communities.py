@@ -0,0 +1,197 @@
+"""
+Test community detection, cached community summaries and global chat
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+import numpy as np
+from openai import OpenAI
+
+import app as backend_app
+from communities import CommunityIndex, _community_id, membership_change
+from factories import app_storage, idea
+from fake_provider import embed, start_server, base_url
+from graph_index import GraphIndex
+from shared_index import SharedEmbeddingIndex
+from storage import IdeaStore
+from upstream import InstrumentedClient
+
+DIM = 64
+
+
+def _near(axis, seed):
+    """Unit vector close to one of the first axes (cosine > 0.9 with its neighbors)"""
+    vector = np.random.default_rng(seed).normal(0, 0.05, 8)
+    vector[axis] = 1.0
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _index(store, summarize, **kwargs):
+    """Community index with its files next to the store's"""
+    return CommunityIndex(store, GraphIndex(store), SharedEmbeddingIndex(store, store.data_dir / "index"),
+                          store.data_dir / "communities", summarize, delay=3600, **kwargs)
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, ideas):
+        self.calls.append(sorted(idea["idea_id"] for idea in ideas))
+        return {"title": f"Group of {len(ideas)}", "summary": "", "themes": []}
+
+
+def test_detection_and_refresh():
+    """Test that clusters become communities with stable ids and summaries refresh only on enough change"""
+    print("🔍 Testing community detection...")
+    assert membership_change(["a", "b"], ["a", "b"]) == 0.0 and membership_change(["a"], ["b"]) == 1.0
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        summarize = FakeSummarizer()
+        index = _index(store, summarize)
+        searches = []
+        search = index.embedding_index.search
+        index.embedding_index.search = lambda vector, top_k, exclude_id: searches.append(exclude_id) or search(
+            vector, top_k=top_k, exclude_id=exclude_id)
+        for i in range(4):
+            store.put(f"a{i}", _near(0, i), idea(f"A{i}"))
+            store.put(f"b{i}", _near(1, 10 + i), idea(f"B{i}"))
+        # Far from both clusters by embedding, but split from a0
+        store.put("child", _near(2, 99), idea("Child", parent_idea_id="a0"))
+        store.put("loner", _near(3, 98), idea("Loner"))
+
+        counts = index.detect()
+        assert counts["communities"] == 3 and counts["summarized"] == 2, counts
+        groups = {c["id"]: set(c["idea_ids"]) for c in index.communities()}
+        assert {"a0", "a1", "a2", "a3", "child"} in groups.values() and {"b0", "b1", "b2", "b3"} in groups.values()
+        assert index.communities()[-1]["summary"] is None, "single ideas are not summarized"
+        a_id = next(cid for cid, members in groups.items() if "a0" in members)
+
+        assert len(searches) == 10
+
+        # One more member of five: 1/6 changed, summary kept; three more: regenerated, same id
+        store.put("a4", _near(0, 4), idea("A4"))
+        counts = index.detect()
+        assert counts["summarized"] == 0 and counts["kept"] == 2, counts
+        assert searches[10:] == ["a4"], f"Neighbors searched again for unchanged ideas: {searches[10:]}"
+        for i in (5, 6, 7):
+            store.put(f"a{i}", _near(0, i), idea(f"A{i}"))
+        counts = index.detect()
+        assert counts["summarized"] == 1, counts
+        community = next(c for c in index.communities() if c["id"] == a_id)
+        assert community["size"] == 9 and community["summarized_ids"] == community["idea_ids"]
+        assert index.detect() == {}, "nothing changed since the last pass"
+
+        # Closest community to a question first
+        assert set(index.relevant(_near(1, 50), limit=1)[0]["idea_ids"]) == {"b0", "b1", "b2", "b3"}
+        assert index.relevant(limit=5)[0]["id"] == a_id, "largest first without a question"
+        index.embedding_index.wait()
+        print("✅ Communities detected and summaries cached")
+
+
+def test_split_labels_are_unique():
+    """Test that a part split off a label never gets an id already in use"""
+    print("\n🔍 Testing split community ids...")
+    ids = ["a", "b", "c"]
+    edges = {"a": {"b": 1.0}, "b": {"a": 1.0}, "c": {}}
+    # The largest part (a, b) keeps the label, which happens to be the id c would get
+    labels = CommunityIndex._propagate(ids, edges, {i: _community_id("c") for i in ids})
+    assert labels["a"] == labels["b"] == _community_id("c") and labels["c"] != labels["a"], labels
+    print("✅ Split parts get fresh ids")
+
+
+def test_summaries_capped_per_pass():
+    """Test that a pass summarizes at most max_summaries communities and a later pass does the rest"""
+    print("\n🔍 Testing the per-pass summary cap...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        summarize = FakeSummarizer()
+        index = _index(store, summarize, max_summaries=1)
+        for i in range(3):
+            store.put(f"a{i}", _near(0, i), idea(f"A{i}"))
+        for i in range(2):
+            store.put(f"b{i}", _near(1, 10 + i), idea(f"B{i}"))
+
+        counts = index.detect()
+        assert counts["summarized"] == 1 and counts["deferred"] == 1, counts
+        assert summarize.calls == [["a0", "a1", "a2"]], "largest community first"
+        assert index.status()["unsummarized"] == 1 and index.status()["pending"]
+
+        counts = index.detect()
+        assert counts["summarized"] == 1 and counts["kept"] == 1 and counts["deferred"] == 0, counts
+        assert all(c["summary"] for c in index.communities())
+        assert index.detect() == {}, "nothing left to do"
+        index.embedding_index.wait()
+        print("✅ Summaries spread over passes, largest first")
+
+
+def test_global_chat():
+    """Test /api/communities and map-reduce answers over community summaries"""
+    print("\n🔍 Testing global chat...")
+    with app_storage() as data_dir:
+        backend_app.community_index = CommunityIndex(
+            backend_app.store, backend_app.graph_index, backend_app.embedding_index,
+            os.path.join(data_dir, "global-communities"), backend_app.summarize_community, delay=0.05)
+        server = start_server(dim=DIM)
+        original = backend_app.llm_client, backend_app.embedding_client
+        try:
+            client = OpenAI(api_key="fake", base_url=base_url(server), max_retries=0)
+            backend_app.llm_client = InstrumentedClient(client, provider="llm")
+            backend_app.embedding_client = InstrumentedClient(client, provider="embedding")
+            http = backend_app.app.test_client()
+            question = {"current_idea": {}, "retrieval_mode": "global",
+                        "history": [{"role": "user", "text": "What are my main themes?"}]}
+
+            # Before detection: answered from the usual context
+            body = http.post("/api/chat", json=question).get_json()
+            assert "global_search" not in body and "text" in body
+
+            topics = {"garden": "garden compost soil seeds", "music": "music guitar chords rhythm"}
+            for topic, words in topics.items():
+                for i in range(3):
+                    text = f"{words} note {i}"
+                    backend_app.add_to_vector_db(f"{topic}-{i}", embed(text, DIM), idea(text.title(), summary=text))
+            backend_app.community_index.wait()
+
+            body = http.get("/api/communities").get_json()
+            assert body["stale"] is False and body["total"] == 2, body
+            assert all(c["summary"]["title"] for c in body["communities"])
+            assert server.provider.calls["community"] == 2
+
+            body = http.post("/api/chat", json=question).get_json()
+            assert body["global_search"] == {"communities": 2, "failed": 0}, body
+            cited = {c["community_id"] for c in body["citations"]}
+            assert len(cited) == 2 and all(c["retrieval"]["mode"] == "global" for c in body["citations"])
+            assert server.provider.calls["global_map"] == 2
+            assert http.get("/api/communities?limit=x").status_code == 400
+        finally:
+            backend_app.llm_client, backend_app.embedding_client = original
+            backend_app.community_index.wait()
+            server.shutdown()
+        print("✅ Global questions answered from community summaries")
+
+
+def main():
+    print("=" * 60)
+    print("Community Tests")
+    print("=" * 60)
+
+    try:
+        test_detection_and_refresh()
+        test_split_labels_are_unique()
+        test_summaries_capped_per_pass()
+        test_global_chat()
+
+        print("\n" + "=" * 60)
+        print("✅ All community tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Test that embeddings are stored once (in the vector store, not inside idea documents)
+"""
+import sys
+import os
+import pickle
+import tempfile
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+from storage import IdeaStore
+
+
+def test_save_strips_embedding_from_document():
+    """Test that saved ideas keep their embedding only in the vector store"""
+    print("🔍 Testing embedding de-duplication on save...")
+    backend_app.init_storage(tempfile.mkdtemp())
+    store = backend_app.store
+    client = backend_app.app.test_client()
+
+    idea = {"idea_id": "e1", "embedding_vector": [0.5, 0.25], "distilled_data": {"one_liner": "x"}}
+    response = client.post("/api/save_idea", json={"idea_id": "e1", "embedding_vector": [0.5, 0.25], "idea_data": idea})
+    assert response.status_code == 200
+
+    assert "embedding_vector" not in store.get("e1"), "Embedding still stored inside the document"
+    assert np.allclose(store.snapshot().vectors["e1"], [0.5, 0.25])
+
+    plain = client.get("/api/get_all_ideas").json["ideas"][0]
+    assert "embedding_vector" not in plain
+    full = client.get("/api/get_all_ideas?include_embeddings=true").json["ideas"][0]
+    assert full["embedding_vector"] == [0.5, 0.25]
+
+    # Updates that set an embedding inside the document move it to the vector store
+    store.update("e1", lambda doc: doc.update(embedding_vector=[1.0, 0.0]))
+    assert "embedding_vector" not in store.get("e1")
+    assert store.get_with_embedding("e1")["embedding_vector"] == [1.0, 0.0]
+    backend_app.embedding_index.wait()
+    print("✅ Embedding stored once, re-attached on request")
+
+
+def test_migration_of_existing_database():
+    """Test that databases with embeddings inside documents are migrated on load"""
+    print("\n🔍 Testing migration of existing databases...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        vectors = {"a": np.array([1.0, 2.0])}
+        ideas = {
+            "a": {"idea_id": "a", "embedding_vector": [1.0, 2.0]},
+            "b": {"idea_id": "b", "embedding_vector": [3.0, 4.0]},  # vector only inside the document
+        }
+        with open(os.path.join(data_dir, "vector_db.pkl"), 'wb') as f:
+            pickle.dump(vectors, f)
+        with open(os.path.join(data_dir, "ideas_db.pkl"), 'wb') as f:
+            pickle.dump(ideas, f)
+
+        store = IdeaStore(data_dir)
+        assert all("embedding_vector" not in doc for doc in store.snapshot().ideas.values())
+        assert np.allclose(store.snapshot().vectors["b"], [3.0, 4.0]), "Embedded-only vector was lost"
+
+        assert store.migrate() == 2
+        with open(os.path.join(data_dir, "ideas_db.pkl"), 'rb') as f:
+            on_disk = pickle.load(f)
+        assert all("embedding_vector" not in doc for doc in on_disk.values()), "Snapshot file not rewritten"
+        assert IdeaStore(data_dir).migrate() == 0, "Migration is not idempotent"
+    print("✅ Existing database migrated in place")
+
+
+def main():
+    print("=" * 60)
+    print("Embedding De-duplication Tests")
+    print("=" * 60)
+
+    try:
+        test_save_strips_embedding_from_document()
+        test_migration_of_existing_database()
+
+        print("\n" + "=" * 60)
+        print("✅ All de-duplication tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
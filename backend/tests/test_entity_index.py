@@ -0,0 +1,79 @@
+"""
+Test the global entity index and /api/entities
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+from entity_index import EntityIndex
+from factories import app_storage, idea
+from storage import IdeaStore
+
+
+def test_index_follows_writes():
+    """Test postings, type lookups and prefix search across writes and deletes"""
+    print("🔍 Testing entity index...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        store.put("a", None, idea(entities=[("Obsidian", "Tool"), ("Note sprawl", "Problem")]))
+        store.put("b", None, idea(entities=[("obsidian ", "Tool"), ("Obstacle course", "Concept")]))
+        index = EntityIndex(store)
+
+        assert sorted(index.lookup("OBSIDIAN")) == [("a", "n0", "Tool"), ("b", "n0", "Tool")]
+        entities, total = index.search("obs")
+        assert total == 2 and entities[0]["name"] == "obsidian" and entities[0]["idea_count"] == 2
+        assert entities[0]["display_name"] in ("Obsidian", "obsidian")
+        assert [e["name"] for e in index.search(entity_type="Problem")[0]] == ["note sprawl"]
+
+        # Incremental: a new idea, a changed idea and a deleted idea
+        store.put("c", None, idea(entities=[("Obsidian", "Tool"), ("Link rot", "Problem")]))
+        store.update("a", lambda doc: doc["distilled_data"]["graph_structure"]["nodes"].pop(1))
+        assert index.search("obsidian")[0][0]["display_name"] == "Obsidian"
+        assert [e["name"] for e in index.search(entity_type="Problem")[0]] == ["link rot"]
+        store.delete(["b"])
+        assert index.search("obs")[1] == 1, "Obstacle course went with idea b"
+        assert sorted(i for i, _, _ in index.lookup("obsidian")) == ["a", "c"]
+        assert index.stats()["stale"] is False
+        print("✅ Postings, types and prefixes follow the store")
+
+
+def test_entities_endpoint():
+    """Test /api/entities prefix, type and exact-name queries"""
+    print("\n🔍 Testing /api/entities...")
+    with app_storage():
+        backend_app.add_to_vector_db("x", [1.0, 0.0], idea(entities=[("Large Language Model", "Concept"),
+                                                                     ("Latency", "Metric")]))
+        backend_app.add_to_vector_db("y", [0.0, 1.0], idea(entities=[("Large Language Model", "Tool")]))
+        http = backend_app.app.test_client()
+
+        body = http.get("/api/entities?prefix=la").get_json()
+        assert body["total"] == 2 and body["entities"][0]["name"] == "large language model"
+        assert body["entities"][0]["types"] == {"Concept": 1, "Tool": 1}
+        assert http.get("/api/entities?prefix=la&type=Metric").get_json()["entities"][0]["name"] == "latency"
+        body = http.get("/api/entities?name=Large%20Language%20Model&type=Tool").get_json()
+        assert body["mentions"] == [{"idea_id": "y", "node_id": "n0", "type": "Tool"}]
+        assert http.get("/api/entities?limit=abc").status_code == 400
+        print("✅ Prefix, type and exact lookups served")
+
+
+def main():
+    print("=" * 60)
+    print("Entity Index Tests")
+    print("=" * 60)
+
+    try:
+        test_index_follows_writes()
+        test_entities_endpoint()
+
+        print("\n" + "=" * 60)
+        print("✅ All entity index tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
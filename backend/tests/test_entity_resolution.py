@@ -0,0 +1,179 @@
+"""
+Test cross-idea entity resolution and /api/graph/global
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+import entity_resolution
+from entity_resolution import EntityResolver, acronym, canonical_key
+from factories import app_storage, idea
+from storage import IdeaStore
+
+
+class FakeEmbedder:
+    """Unit vectors per name; names listed together in `synonyms` share a vector"""
+
+    def __init__(self, synonyms=()):
+        self.groups = {name: i for i, names in enumerate(synonyms) for name in names}
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        vectors = []
+        for text in texts:
+            name = text.split(":")[0].lower()
+            slot = self.groups.get(name, 10 + sum(map(ord, name)) % 90)
+            vectors.append([1.0 if i == slot else 0.0 for i in range(100)])
+        return vectors
+
+
+def test_keys():
+    """Test spelling keys and acronyms"""
+    print("🔍 Testing canonical keys...")
+    assert canonical_key("Language-Models") == canonical_key("language model") == "language model"
+    assert canonical_key("Class") == "class"
+    assert acronym("Large Language Model") == "llm" and acronym("Obsidian") is None
+    print("✅ Keys computed")
+
+
+def test_resolution_is_incremental():
+    """Test merging by spelling, acronym and embedding, with stable ids and no re-embedding"""
+    print("\n🔍 Testing incremental resolution...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        embed = FakeEmbedder(synonyms=[("zettelkasten", "slip box")])
+        # Passes run only when called
+        resolver = EntityResolver(store, os.path.join(data_dir, "entities"), embed, delay=3600)
+        rebuilds = []
+        rebuild = resolver.mentions._rebuild
+        resolver.mentions._rebuild = lambda ideas: (rebuilds.append(len(ideas)), rebuild(ideas))
+        store.put("a", None, idea(entities=[("Large Language Model", "Tool"), ("Zettelkasten", "Methodology")],
+                                  edges=[("n0", "n1", "supports")]))
+        store.put("b", None, idea(entities=[("LLM", "Tool"), ("Slip box", "Methodology"), ("Latency", "Metric")],
+                                  edges=[("n0", "n1", "supports"), ("n0", "n2", "measured_by")]))
+        counts = resolver.resolve()
+        assert counts["new"] == 5 and counts["merged"] == 2, counts
+
+        graph = resolver.graph()
+        assert graph["level"] == 2 and graph["version"] == store.version
+        nodes = {node["label"]: node for node in graph["nodes"]}
+        assert len(nodes) == 3, nodes.keys()
+        llm = next(node for node in graph["nodes"] if "LLM" in node["aliases"])
+        assert llm["aliases"] == ["LLM", "Large Language Model"] and llm["idea_ids"] == ["a", "b"]
+        supports = [e for e in graph["edges"] if e["relation"] == "supports"]
+        assert len(supports) == 1 and supports[0]["weight"] == 2 and supports[0]["source"] == llm["id"]
+        assert resolver.resolve() == {}, "nothing changed since the last pass"
+
+        # Only the new name is embedded; existing ids are kept; a spelling variant joins its entity
+        embedded = len(embed.texts)
+        store.put("c", None, idea(entities=[("large language models", "Concept"), ("Obsidian", "Tool")]))
+        store.delete(["b"])
+        counts = resolver.resolve()
+        assert len(embed.texts) == embedded + 2 and counts["removed"] == 3, (counts, embed.texts)
+        graph = resolver.graph()
+        llm_now = next(node for node in graph["nodes"] if node["id"] == llm["id"])
+        assert llm_now["idea_ids"] == ["a", "c"] and "LLM" not in llm_now["aliases"]
+        assert resolver.canonical_of("Large Language Models") == llm["id"]
+        assert set(resolver.vectors.snapshot().ideas) == {"large language model", "zettelkasten",
+                                                          "large language models", "obsidian"}, "Names of b kept"
+        assert len(rebuilds) == 1, f"Mentions re-read from every idea: {rebuilds}"
+
+        # Another process reading the persisted result sees the same graph
+        reader = EntityResolver(IdeaStore(store.data_dir), resolver.data_dir, None)
+        assert reader.graph()["nodes"] == graph["nodes"]
+        print("✅ Entities merged incrementally")
+
+
+def test_failed_batch_keeps_earlier_batches():
+    """Test that names embedded before a provider failure are kept and not embedded again"""
+    print("\n🔍 Testing a failing embedding batch...")
+    embed = FakeEmbedder()
+    calls = []
+
+    def flaky(texts):
+        calls.append(len(texts))
+        if len(calls) == 2:
+            raise RuntimeError("provider down")
+        return embed(texts)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        resolver = EntityResolver(store, os.path.join(data_dir, "entities"), flaky, delay=3600)
+        store.put("a", None, idea(entities=[(name, "Tool") for name in ("Anki", "Obsidian", "Roam", "Notion")]))
+        batch, entity_resolution.EMBED_BATCH = entity_resolution.EMBED_BATCH, 2
+        try:
+            assert resolver.resolve()["new"] == 4
+            assert resolver.vectors.count() == 2, "first batch lost with the failing one"
+            store.put("b", None, idea(entities=[("Zotero", "Tool")]))
+            resolver.resolve()
+        finally:
+            entity_resolution.EMBED_BATCH = batch
+        assert resolver.vectors.count() == 5 and calls == [2, 2, 2, 1], calls
+        print("✅ Embedded names kept across a failed batch")
+
+
+def test_background_pass():
+    """Test that writes schedule a pass once they go quiet"""
+    print("\n🔍 Testing background resolution...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        resolver = EntityResolver(store, os.path.join(data_dir, "entities"), FakeEmbedder(), delay=0.05)
+        for i in range(5):
+            store.put(f"i{i}", None, idea(entities=[("Obsidian", "Tool"), (f"Topic {i}", "Concept")]))
+        assert resolver.status()["pending"] is True
+        resolver.wait()
+        status = resolver.status()
+        assert status["version"] == store.version and status["canonical_entities"] == 6, status
+        assert status["pending"] is False
+        print("✅ Resolved after writes")
+
+
+def test_global_graph_endpoint():
+    """Test /api/graph/global serving, filtering and staleness"""
+    print("\n🔍 Testing /api/graph/global...")
+    with app_storage():
+        backend_app.entity_resolver._embed = FakeEmbedder()
+        backend_app.entity_resolver.delay = 0.05
+        http = backend_app.app.test_client()
+        body = http.get("/api/graph/global").get_json()
+        assert body["nodes"] == [] and body["version"] is None
+
+        backend_app.add_to_vector_db("x", [1.0, 0.0], idea(entities=[("Obsidian", "Tool"), ("Link rot", "Problem")],
+                                                            edges=[("n0", "n1", "causes")]))
+        backend_app.add_to_vector_db("y", [0.0, 1.0], idea(entities=[("obsidian", "Tool")]))
+        backend_app.entity_resolver.wait()
+        body = http.get("/api/graph/global").get_json()
+        assert body["stale"] is False and len(body["nodes"]) == 2 and len(body["edges"]) == 1
+        body = http.get("/api/graph/global?min_ideas=2").get_json()
+        assert [n["label"] for n in body["nodes"]] == ["Obsidian"] and body["edges"] == []
+        assert http.get("/api/graph/global?type=Problem").get_json()["nodes"][0]["label"] == "Link rot"
+        assert http.get("/api/graph/global?min_ideas=x").status_code == 400
+        backend_app.entity_resolver.wait()
+        print("✅ Global graph served")
+
+
+def main():
+    print("=" * 60)
+    print("Entity Resolution Tests")
+    print("=" * 60)
+
+    try:
+        test_keys()
+        test_resolution_is_incremental()
+        test_failed_batch_keeps_earlier_batches()
+        test_background_pass()
+        test_global_graph_endpoint()
+
+        print("\n" + "=" * 60)
+        print("✅ All entity resolution tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
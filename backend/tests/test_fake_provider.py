@@ -0,0 +1,132 @@
+"""
+Test the local fake provider, on its own and driving the backend end to end
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+import numpy as np
+from openai import OpenAI, APIStatusError
+
+import app as backend_app
+from evolution_processor import EvolutionProcessor
+from fake_provider import LatencyModel, start_server, base_url
+from upstream import InstrumentedClient
+
+
+def _client(server):
+    return OpenAI(api_key="fake", base_url=base_url(server), max_retries=0)
+
+
+def test_deterministic_payloads():
+    """Test that responses are valid, deterministic and embeddings have the configured dimension"""
+    print("🔍 Testing deterministic payloads...")
+    server = start_server(dim=32)
+    try:
+        client = _client(server)
+        messages = [{"role": "system", "content": backend_app.DISTILL_SYSTEM_PROMPT},
+                    {"role": "user", "content": "Distill this idea:\n\nSolar batteries smooth grid demand peaks"}]
+        first = client.chat.completions.create(model="m", messages=messages).choices[0].message.content
+        second = client.chat.completions.create(model="m", messages=messages).choices[0].message.content
+        assert first == second
+        valid, _, errors = backend_app.validate_and_fix_distilled_data(__import__("json").loads(first))
+        assert valid, errors
+
+        a = client.embeddings.create(model="e", input="solar batteries grid").data[0].embedding
+        b = client.embeddings.create(model="e", input="solar batteries grid").data[0].embedding
+        c = client.embeddings.create(model="e", input="solar batteries storage").data[0].embedding
+        d = client.embeddings.create(model="e", input="medieval poetry rhythm").data[0].embedding
+        assert len(a) == 32 and a == b
+        assert np.dot(a, c) > np.dot(a, d), "Shared words should make embeddings similar"
+        assert server.provider.calls == {"distill": 2, "embeddings": 4}
+    finally:
+        server.shutdown()
+    print("✅ Payloads deterministic and well-formed")
+
+
+def test_latency_and_failures():
+    """Test latency distributions and injected failures"""
+    print("\n🔍 Testing latency and failure injection...")
+    import random
+    rng = random.Random(1)
+    assert LatencyModel("fixed:250").sample(rng) == 0.25
+    assert all(0.1 <= LatencyModel("uniform:100:200").sample(rng) <= 0.2 for _ in range(50))
+    try:
+        LatencyModel("gamma:1")
+        raise AssertionError("Invalid spec accepted")
+    except ValueError:
+        pass
+
+    server = start_server(dim=8, failure_rate=1.0, failure_status=429)
+    try:
+        _client(server).embeddings.create(model="e", input="x")
+        raise AssertionError("Injected failure not returned")
+    except APIStatusError as e:
+        assert e.status_code == 429
+    finally:
+        server.shutdown()
+    print("✅ Latency models and failures behave as configured")
+
+
+def test_backend_end_to_end():
+    """Test distill, save, chat, keywords, merge, split and refine against the fake provider"""
+    print("\n🔍 Testing backend end to end without network...")
+    server = start_server(dim=16)
+    saved = (backend_app.llm_client, backend_app.embedding_client, backend_app.evolution_processor)
+    try:
+        backend_app.init_storage(tempfile.mkdtemp())
+        backend_app.llm_client = InstrumentedClient(_client(server), provider="llm")
+        backend_app.embedding_client = InstrumentedClient(_client(server), provider="embedding")
+        backend_app.evolution_processor = EvolutionProcessor(
+            backend_app.llm_client, backend_app.embedding_client, "m", "e")
+        client = backend_app.app.test_client()
+
+        ids = []
+        for text in ["Solar batteries smooth grid demand peaks", "Grid batteries enable cheaper solar power"]:
+            distilled = client.post("/api/distill", json={"text": text})
+            assert distilled.status_code == 200, distilled.json
+            idea = dict(distilled.json, idea_id=f"idea-{len(ids)}", content_raw=text)
+            saved_response = client.post("/api/save_idea", json={
+                "idea_id": idea["idea_id"], "embedding_vector": idea["embedding_vector"], "idea_data": idea})
+            assert saved_response.status_code == 200
+            ids.append(idea["idea_id"])
+
+        chat = client.post("/api/chat", json={"history": [{"role": "user", "text": "How do batteries help?"}],
+                                              "current_idea": backend_app.store.get(ids[0])})
+        assert chat.status_code == 200 and chat.json["text"], chat.json
+        keywords = client.post("/api/extract_keywords", json={"query": "battery storage for solar"})
+        assert keywords.status_code == 200 and keywords.json["high_level_keywords"]
+
+        assert client.post("/api/merge_ideas", json={"idea_ids": ids}).status_code == 200
+        assert client.post("/api/split_idea", json={"idea_id": ids[0]}).status_code == 200
+        refined = client.post("/api/refine_idea", json={"idea_id": ids[1], "new_context": "Costs keep falling"})
+        assert refined.status_code == 200, refined.json
+        backend_app.embedding_index.wait()
+    finally:
+        backend_app.llm_client, backend_app.embedding_client, backend_app.evolution_processor = saved
+        server.shutdown()
+    print("✅ Full backend exercised offline")
+
+
+def main():
+    print("=" * 60)
+    print("Fake Provider Tests")
+    print("=" * 60)
+
+    try:
+        test_deterministic_payloads()
+        test_latency_and_failures()
+        test_backend_end_to_end()
+
+        print("\n" + "=" * 60)
+        print("✅ All fake provider tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
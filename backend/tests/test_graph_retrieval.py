@@ -0,0 +1,111 @@
+"""
+Test graph-expansion retrieval over lineage links and shared entities
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+from entity_resolution import EntityResolver
+from factories import app_storage, idea
+from graph_index import GraphIndex
+from storage import IdeaStore
+
+
+def test_expansion():
+    """Test lineage in both directions, shared entities, hop limit, fan-out and path weights"""
+    print("🔍 Testing graph expansion...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        store.put("parent", None, idea("Parent", child_idea_ids=["child"], linked_idea_ids=["child"]))
+        store.put("child", None, idea("Child", entities=["Spaced repetition"], parent_idea_id="parent"))
+        store.put("cousin", None, idea("Cousin", entities=["Spaced Repetitions", "Anki"]))
+        store.put("far", None, idea("Far", entities=["Anki"]))
+        store.put("merged", None, idea("Merged", merged_from_ids=["parent"]))
+        index = GraphIndex(store, entity_max_ideas=3)
+
+        neighbors = index.neighbors("parent")
+        assert [(n, w) for n, w, _ in neighbors] == [("child", 1.0), ("merged", 0.9)], neighbors
+        assert neighbors[1][2] == "merged_into", "reverse edge named from the parent's side"
+
+        hits = index.expand({"parent": 1.0}, max_hops=2, fanout=5, top_k=10)
+        assert [h[0] for h in hits] == ["child", "merged", "cousin"], hits
+        cousin = hits[2]
+        assert cousin[1] == 0.4 and [hop["relation"] for hop in cousin[2]] == ["split_into", "shares Spaced repetition"]
+        assert "far" not in [h[0] for h in hits], "three hops away"
+        assert [h[0] for h in index.expand({"parent": 1.0}, max_hops=3, top_k=10)][-1] == "far"
+        assert [h[0] for h in index.expand({"parent": 1.0}, max_hops=2, fanout=1, top_k=10)] == ["child", "cousin"]
+        assert [h[0] for h in index.expand({"parent": 1.0}, exclude={"child"}, top_k=10)] == ["merged", "cousin"]
+
+        # Hub entities link nothing; deletes drop edges both ways
+        for i in range(3):
+            store.put(f"hub{i}", None, idea(f"Hub {i}", entities=["Anki"]))
+        assert [n for n, _, _ in index.neighbors("far")] == []
+        store.delete(["child"])
+        assert [n for n, _, _ in index.neighbors("parent")] == ["merged"]
+        assert index.stats()["stale"] is False
+        print("✅ Expansion bounded and weighted by path")
+
+
+def test_resolved_entities_link_ideas():
+    """Test that names merged by entity resolution link ideas their spellings alone would not"""
+    print("\n🔍 Testing shared entities by canonical id...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        store.put("a", None, idea("Prompt tricks", entities=["LLM"]))
+        store.put("b", None, idea("Local inference", entities=["Large Language Models"]))
+        store.put("c", None, idea("Fine-tuning", entities=["large language model"]))
+        resolver = EntityResolver(store, os.path.join(data_dir, "entities"), None, delay=3600)
+        index = GraphIndex(store, resolver)
+
+        # Before a pass only spelling variants share a key
+        assert [n for n, _, _ in index.neighbors("a")] == []
+        assert [n for n, _, _ in index.neighbors("b")] == ["c"]
+
+        resolver.resolve()
+        assert [n for n, _, _ in index.neighbors("a")] == ["b", "c"], index.neighbors("a")
+        # New ideas use the resolved id as well, before the next pass
+        store.put("d", None, idea("Agents", entities=["LLMs"]))
+        assert "d" in [n for n, _, _ in index.neighbors("a")]
+        print("✅ Acronym and spelling variants linked through the canonical entity")
+
+
+def test_chat_context_includes_linked_ideas():
+    """Test that build_rag_context adds ideas reached through the graph, with their path"""
+    print("\n🔍 Testing linked ideas in chat context...")
+    with app_storage():
+        backend_app.add_to_vector_db("p", [1.0, 0.0], idea("Habit tracker", entities=["Streaks"],
+                                                           child_idea_ids=["c"]))
+        backend_app.add_to_vector_db("c", [0.0, 1.0], idea("Streak freeze", parent_idea_id="p"))
+        backend_app.add_to_vector_db("s", [0.0, 1.0], idea("Duolingo notes", entities=["streaks"]))
+
+        context, citations, _ = backend_app.build_rag_context(backend_app.store.get("p"), None, "p")
+        assert "=== LINKED IDEAS (Graph) ===" in context and "Streak freeze (via: split_into)" in context
+        linked = {c["idea_id"]: c["retrieval"] for c in citations if c.get("retrieval", {}).get("mode") == "graph"}
+        assert set(linked) == {"c", "s"}, citations
+        assert linked["c"]["hops"] == 1 and linked["c"]["path"][0]["relation"] == "split_into"
+        assert linked["c"]["path_weight"] > linked["s"]["path_weight"]
+        print("✅ Linked ideas cited with their path")
+
+
+def main():
+    print("=" * 60)
+    print("Graph Retrieval Tests")
+    print("=" * 60)
+
+    try:
+        test_expansion()
+        test_resolved_entities_link_ideas()
+        test_chat_context_includes_linked_ideas()
+
+        print("\n" + "=" * 60)
+        print("✅ All graph retrieval tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Test the liveness / readiness endpoints and the upstream circuit state they report
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+import upstream
+from storage import IdeaStore
+
+
+class _FailingCreate:
+    def create(self, **kwargs):
+        raise ConnectionError("upstream down")
+
+
+class _FakeClient:
+    embeddings = _FailingCreate()
+
+
+def test_live_and_ready_do_not_load_store():
+    """Test that health checks answer from memory without loading the databases"""
+    print("🔍 Testing liveness and readiness...")
+    client = backend_app.app.test_client()
+    original = backend_app.store
+    backend_app.store = IdeaStore(tempfile.mkdtemp())  # never loaded
+    try:
+        live = client.get("/api/health/live")
+        assert live.status_code == 200 and live.json["status"] == "alive"
+
+        ready = client.get("/api/health/ready")
+        assert ready.status_code == 503, ready.json
+        assert ready.json["store"]["loaded"] is False
+        assert client.get("/api/health").status_code == 200
+        assert not backend_app.store.loaded, "Health check loaded the store"
+
+        backend_app.store.refresh()
+        ready = client.get("/api/health/ready")
+        assert ready.status_code == 200, ready.json
+        assert ready.json["store"]["version"] == 0
+        assert {"log_records", "trace_exports"} <= set(ready.json["queues"])
+        assert "state" in ready.json["index"]
+    finally:
+        backend_app.store = original
+    print("✅ Liveness and readiness answered without loading the store")
+
+
+def test_preload_warms_indexes():
+    """Test that preload() loads the store and builds every index before workers fork"""
+    print("\n🔍 Testing preload...")
+    data_dir = tempfile.mkdtemp()
+    IdeaStore(data_dir).put("w1", [1.0, 0.0], {"distilled_data": {"one_liner": "Warm start", "tags": ["cache"],
+                                                                  "graph_structure": {"nodes": [{"id": "n0", "name": "Gunicorn"}]}}})
+    backend_app.init_storage(data_dir)
+    indexes = (backend_app.keyword_index, backend_app.bm25_index, backend_app.entity_index, backend_app.graph_index)
+    assert all(index.stats()["stale"] for index in indexes)
+
+    backend_app.preload()
+    assert backend_app.store.count() == 1
+    assert not any(index.stats()["stale"] for index in indexes)
+    backend_app.embedding_index.wait()  # a sync scheduled by the reload may still be running
+    assert backend_app.embedding_index.state == "ready"
+    print("✅ Store and indexes warmed by preload")
+
+
+def test_upstream_circuit_state():
+    """Test that consecutive upstream failures open the circuit and a success closes it"""
+    print("\n🔍 Testing upstream circuit state...")
+    wrapped = upstream.InstrumentedClient(_FakeClient(), provider="test-provider")
+    for _ in range(upstream.FAILURE_THRESHOLD):
+        try:
+            wrapped.embeddings.create(model="m", input="x")
+        except ConnectionError:
+            pass
+    status = upstream.upstream_status()["test-provider"]
+    assert status["state"] == "open", status
+    assert status["consecutive_failures"] == upstream.FAILURE_THRESHOLD
+    assert "upstream down" in status["last_error"]
+
+    ready = backend_app.app.test_client().get("/api/health/ready")
+    assert ready.json["upstream"]["test-provider"]["state"] == "open"
+    if ready.json["store"]["loaded"]:
+        assert ready.json["status"] == "degraded"
+
+    upstream.provider_health("test-provider").record()
+    assert upstream.upstream_status()["test-provider"]["state"] == "closed"
+    del upstream._providers["test-provider"]
+    print("✅ Circuit opened after failures and closed after a success")
+
+
+def main():
+    print("=" * 60)
+    print("Health Check Tests")
+    print("=" * 60)
+
+    try:
+        test_live_and_ready_do_not_load_store()
+        test_preload_warms_indexes()
+        test_upstream_circuit_state()
+
+        print("\n" + "=" * 60)
+        print("✅ All health check tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
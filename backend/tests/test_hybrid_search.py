@@ -0,0 +1,117 @@
+"""
+Test the BM25 index and the hybrid /api/search endpoint
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+from openai import OpenAI
+
+import app as backend_app
+from bm25_index import BM25Index, terms
+from factories import app_storage, idea
+from fake_provider import embed, start_server, base_url
+from storage import IdeaStore
+from upstream import InstrumentedClient
+
+DIM = 64
+
+
+def test_bm25_ranking_and_updates():
+    """Test exact-term ranking and incremental updates on put, refine and delete"""
+    print("🔍 Testing BM25 index...")
+    assert terms("RLHF for LLMs") == ["rlhf", "llms"]
+    assert terms("知识图谱") == ["知识", "识图", "图谱"], "CJK runs become bigrams"
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        store.put("a", None, idea("Reward models", content="Notes on RLHF and preference data. RLHF needs labels."))
+        store.put("b", None, idea("Fine tuning", content="Supervised fine tuning of language models."))
+        store.put("c", None, idea("知识图谱构建", content="从笔记中抽取实体"))
+        index = BM25Index(store)
+
+        assert [i for i, _ in index.search("rlhf")] == ["a"]
+        assert index.search("language models")[0][0] == "b"
+        assert [i for i, _ in index.search("图谱")] == ["c"]
+        assert index.search("unknownterm") == []
+
+        # A refine appends text: the new term is searchable without a rebuild
+        store.update("b", lambda doc: doc.update(
+            content_raw=doc["content_raw"] + "\n\n[Refined with: DPO instead of RLHF]"))
+        assert index.stats()["stale"] is False
+        assert {i for i, _ in index.search("dpo rlhf")} == {"a", "b"} and index.search("dpo")[0][0] == "b"
+
+        store.delete(["a"])
+        assert [i for i, _ in index.search("rlhf")] == ["b"]
+        assert index.stats()["documents"] == 2
+        print("✅ Exact terms ranked, index follows store changes")
+
+
+def test_search_endpoint():
+    """Test that /api/search fuses BM25 and vector rankings, and works without an embedding provider"""
+    print("\n🔍 Testing /api/search...")
+    with app_storage():
+        backend_app.query_embedding_cache.clear()
+        server = start_server(dim=DIM)
+        original = backend_app.embedding_client
+        try:
+            for i in range(10):
+                backend_app.add_to_vector_db(f"v{i}", embed("human feedback signals", DIM),
+                                             idea(f"Alignment note {i}", content="aligning language models"))
+            # Mentions the acronym but shares no words with the query embedding
+            backend_app.add_to_vector_db("acronym", embed("garden compost", DIM),
+                                         idea("Reward hacking", content="Seen with RLHF"))
+            http = backend_app.app.test_client()
+
+            backend_app.embedding_client = InstrumentedClient(
+                OpenAI(api_key="fake", base_url=base_url(server), max_retries=0), provider="embedding")
+            body = http.post("/api/search", json={"query": "RLHF human feedback", "top_k": 3}).get_json()
+            assert body["strategy"] == "hybrid"
+            ids = [r["idea_id"] for r in body["results"]]
+            assert len(ids) == 3 and ids[0] == "acronym", ids
+            acronym = next(r for r in body["results"] if r["idea_id"] == "acronym")
+            assert acronym["bm25_rank"] == 1 and acronym["vector_rank"] == 11, "Last by embedding, first by BM25"
+            assert all(r["score"] >= s["score"] for r, s in zip(body["results"], body["results"][1:]))
+
+            backend_app.embedding_client = None
+            body = http.post("/api/search", json={"query": "RLHF", "exclude_id": "v0"}).get_json()
+            assert body["strategy"] == "bm25" and [r["idea_id"] for r in body["results"]] == ["acronym"]
+
+            assert http.post("/api/search", json={"query": " "}).status_code == 400
+            assert http.post("/api/search", json={"query": "x", "top_k": "many"}).status_code == 400
+
+            requested = []
+            bm25_search = backend_app.bm25_index.search
+            backend_app.bm25_index.search = lambda query, top_k: requested.append(top_k) or bm25_search(query, top_k)
+            try:
+                body = http.post("/api/search", json={"query": "RLHF", "top_k": 10 ** 9}).get_json()
+            finally:
+                del backend_app.bm25_index.search
+            assert body["results"] and requested == [401], f"top_k not capped: {requested}"
+        finally:
+            backend_app.embedding_client = original
+            server.shutdown()
+        print("✅ Acronym found by BM25 next to vector matches")
+
+
+def main():
+    print("=" * 60)
+    print("Hybrid Search Tests")
+    print("=" * 60)
+
+    try:
+        test_bm25_ranking_and_updates()
+        test_search_endpoint()
+
+        print("\n" + "=" * 60)
+        print("✅ All hybrid search tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
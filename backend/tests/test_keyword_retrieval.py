@@ -0,0 +1,125 @@
+"""
+Test dual-level keyword retrieval: entity / theme index, rank fusion and chat wiring
+"""
+import sys
+import os
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+from openai import OpenAI
+
+import app as backend_app
+from entity_index import EntityIndex
+from factories import app_storage, idea
+from fake_provider import embed, start_server, base_url
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
+from storage import IdeaStore
+from upstream import InstrumentedClient
+
+DIM = 64
+QUESTION = "productivity systems obsidian zettelkasten"
+
+
+def test_reciprocal_rank_fusion():
+    """Test that items ranked well by several lists win"""
+    print("🔍 Testing reciprocal rank fusion...")
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c"], []], k=60)
+    assert [item for item, _ in fused] == ["b", "c", "a"]
+    assert abs(fused[0][1] - (1 / 62 + 1 / 61)) < 1e-12
+    print("✅ Fused ranking favours agreement")
+
+
+def test_keyword_index_matches_and_updates():
+    """Test entity and theme matching, kept in step with store writes"""
+    print("\n🔍 Testing keyword index...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        store.put("notes", None, idea("Note taking", entities=["Obsidian", "Zettelkasten Method"]))
+        store.put("prod", None, idea("Deep work", tags=["Productivity Systems"], summary="Time blocking for focus"))
+        entities = EntityIndex(store)
+        index = KeywordIndex(store, entities)
+
+        hits = index.match_entities(["obsidian", "zettelkasten"])
+        assert hits[0][0] == "notes" and hits[0][2] == ["obsidian", "zettelkasten method"], hits
+        assert abs(hits[0][1] - (1.0 + 0.8)) < 1e-9, "Exact name plus a partial one"
+        assert [h[0] for h in index.match_themes(["productivity systems"])] == ["prod"]
+        assert [h[0] for h in index.match_themes(["focus blocking"])] == ["prod"], "Summary words match"
+        assert index.match_themes(["productivity gardening tools"]) == [], "Under half the words: no match"
+
+        # Writes are picked up incrementally
+        store.update("notes", lambda doc: doc["distilled_data"]["graph_structure"]["nodes"].append(
+            {"id": "n9", "name": "Logseq", "type": "Tool"}))
+        assert [h[0] for h in index.match_entities(["logseq"])] == ["notes"]
+        store.delete(["notes"])
+        assert index.match_entities(["obsidian"]) == [] and entities.stats()["entities"] == 0
+        print("✅ Entity and theme matches follow store changes")
+
+
+def test_chat_dual_retrieval():
+    """Test that dual mode surfaces keyword matches vector search misses, with extraction run concurrently"""
+    print("\n🔍 Testing dual-level chat retrieval...")
+    with app_storage():
+        backend_app.query_embedding_cache.clear()
+        server = start_server(dim=DIM, chat_latency="fixed:400", embedding_latency="fixed:400")
+        original = backend_app.llm_client, backend_app.embedding_client
+        try:
+            client = OpenAI(api_key="fake", base_url=base_url(server), max_retries=0)
+            backend_app.llm_client = InstrumentedClient(client, provider="llm")
+            backend_app.embedding_client = InstrumentedClient(client, provider="embedding")
+
+            # Fillers are closest to the question by embedding; the targets only match by keywords
+            for i in range(8):
+                backend_app.add_to_vector_db(f"filler-{i}", embed(f"{QUESTION} filler {i}", DIM), idea(f"Filler {i}"))
+            backend_app.add_to_vector_db("notes", embed("garden compost", DIM),
+                                         idea("Note taking", entities=["Obsidian"]))
+            backend_app.add_to_vector_db("prod", embed("kitchen knives", DIM), idea("Deep work", tags=["productivity"]))
+            current = {"idea_id": "filler-0", "distilled_data": {"one_liner": "Filler 0"}}
+            http = backend_app.app.test_client()
+
+            def chat(mode):
+                start = time.perf_counter()
+                response = http.post("/api/chat", json={"current_idea": current, "retrieval_mode": mode,
+                                                        "history": [{"role": "user", "text": QUESTION}]})
+                assert response.status_code == 200, response.data
+                return response.get_json(), time.perf_counter() - start
+
+            body, _ = chat("vector")
+            related = {c["idea_id"] for c in body["citations"] if "retrieval" in c}
+            assert not related & {"notes", "prod"} and "keywords" not in body
+
+            backend_app.query_embedding_cache.clear()
+            body, elapsed = chat("dual")
+            retrieved = {c["idea_id"]: c["retrieval"] for c in body["citations"] if "retrieval" in c}
+            assert body["keywords"]["low_level_keywords"] == ["obsidian", "zettelkasten"], body["keywords"]
+            assert retrieved["notes"]["matched_entities"] == ["obsidian"] and retrieved["notes"]["mode"] == "dual"
+            assert retrieved["prod"]["matched_themes"] == ["productivity"]
+            # Keywords (0.4s), question embedding (0.4s) and reply (0.4s) would take 1.2s one after another
+            assert elapsed < 1.1, f"Keyword extraction did not overlap the embedding call ({elapsed:.2f}s)"
+        finally:
+            backend_app.llm_client, backend_app.embedding_client = original
+            server.shutdown()
+        print(f"✅ Keyword matches fused into related ideas ({elapsed:.2f}s)")
+
+
+def main():
+    print("=" * 60)
+    print("Keyword Retrieval Tests")
+    print("=" * 60)
+
+    try:
+        test_reciprocal_rank_fusion()
+        test_keyword_index_matches_and_updates()
+        test_chat_dual_retrieval()
+
+        print("\n" + "=" * 60)
+        print("✅ All keyword retrieval tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Test the HTTP load-test harness against an in-process backend and the fake provider
+"""
+import sys
+import os
+import argparse
+import tempfile
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+from openai import OpenAI
+from werkzeug.serving import make_server
+
+import app as backend_app
+import loadtest
+from evolution_processor import EvolutionProcessor
+from fake_provider import start_server, base_url
+from upstream import InstrumentedClient
+
+
+def test_budget_parsing_and_checks():
+    """Test budget specs and violation reporting"""
+    print("🔍 Testing latency budgets...")
+    assert loadtest.parse_budget("chat:p95=1500") == ("chat", "p95", 1500.0)
+    assert loadtest.parse_budget("p99=800") == ("*", "p99", 800.0)
+    try:
+        loadtest.parse_budget("chat:p90=1")
+        raise AssertionError("Invalid percentile accepted")
+    except argparse.ArgumentTypeError:
+        pass
+
+    result = loadtest.report({"chat": [0.1, 0.2, 0.3], "save_idea": [0.01, 0.02]}, {"chat": 1}, 1.0, 2)
+    assert result["requests"] == 5 and result["errors"] == 1
+    assert loadtest.check_budgets(result, [("*", "p99", 1000.0)], 0.5) == []
+    violations = loadtest.check_budgets(result, [("chat", "p50", 100.0), ("save_idea", "p50", 100.0)], 0.1)
+    assert len(violations) == 2 and violations[0].startswith("chat p50"), violations
+    print("✅ Budgets parsed and checked")
+
+
+def test_load_run_against_backend():
+    """Test a short mixed-route run reports every route without errors"""
+    print("\n🔍 Testing a short load run...")
+    provider = start_server(dim=16)
+    saved = (backend_app.llm_client, backend_app.embedding_client, backend_app.evolution_processor)
+    backend_app.init_storage(tempfile.mkdtemp())
+    backend_app.llm_client = InstrumentedClient(OpenAI(api_key="fake", base_url=base_url(provider)), provider="llm")
+    backend_app.embedding_client = InstrumentedClient(
+        OpenAI(api_key="fake", base_url=base_url(provider)), provider="embedding")
+    backend_app.evolution_processor = EvolutionProcessor(
+        backend_app.llm_client, backend_app.embedding_client, "m", "e")
+    server = make_server("127.0.0.1", 0, backend_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    try:
+        workload = loadtest.Workload(dim=16)
+        loadtest.seed_ideas(base, workload, 5)
+        result = loadtest.run_load(base, workload, loadtest.DEFAULT_MIX, concurrency=4, requests=60)
+        assert result["requests"] == 60, result
+        assert result["errors"] == 0, result["routes"]
+        assert set(result["routes"]) <= set(loadtest.DEFAULT_MIX)
+        assert all(r["p99_ms"] >= r["p50_ms"] for r in result["routes"].values())
+        backend_app.embedding_index.wait()
+    finally:
+        server.shutdown()
+        provider.shutdown()
+        backend_app.llm_client, backend_app.embedding_client, backend_app.evolution_processor = saved
+    print(f"✅ {result['requests']} requests at {result['throughput_rps']} req/s")
+
+
+def main():
+    print("=" * 60)
+    print("Load Test Harness Tests")
+    print("=" * 60)
+
+    try:
+        test_budget_parsing_and_checks()
+        test_load_run_against_backend()
+
+        print("\n" + "=" * 60)
+        print("✅ All load test harness tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
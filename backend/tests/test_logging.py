@@ -0,0 +1,111 @@
+"""
+Test structured logging: request-id correlation, JSON output and body sampling
+"""
+import sys
+import os
+import json
+import logging
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+import logging_config
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _capture():
+    """Attach a handler next to the queue handler (records already carry request_id)"""
+    handler = _ListHandler()
+    handler.addFilter(logging_config.RequestIdFilter())
+    logging.getLogger("ideagraph").addHandler(handler)
+    return handler
+
+
+def test_request_id_correlation():
+    """Test that every log line of a request carries its X-Request-ID"""
+    print("🔍 Testing request-id correlation...")
+    backend_app.init_storage(tempfile.mkdtemp())
+    client = backend_app.app.test_client()
+    handler = _capture()
+    try:
+        response = client.post("/api/save_idea", headers={"X-Request-ID": "req-42"}, json={
+            "idea_id": "a", "embedding_vector": [1.0], "idea_data": {"idea_id": "a"}
+        })
+        assert response.headers["X-Request-ID"] == "req-42"
+        ids = {r.request_id for r in handler.records}
+        assert ids == {"req-42"}, f"Unexpected request ids: {ids}"
+
+        generated = client.get("/api/health").headers["X-Request-ID"]
+        assert generated and generated != "req-42"
+        assert logging_config.request_id_var.get() == "-", "Request id leaked out of the request"
+    finally:
+        logging.getLogger("ideagraph").removeHandler(handler)
+        backend_app.embedding_index.wait()
+    print("✅ Log lines tagged with the request id")
+
+
+def test_body_logging_is_sampled():
+    """Test that request bodies are only logged when sampled"""
+    print("\n🔍 Testing body log sampling...")
+    logger = logging.getLogger("ideagraph")
+    level, rate = logger.level, logging_config.LOG_BODY_SAMPLE_RATE
+    client = backend_app.app.test_client()
+    handler = _capture()
+    try:
+        logger.setLevel(logging.DEBUG)
+        for sample_rate, expected in ((0.0, 0), (1.0, 3)):
+            logging_config.LOG_BODY_SAMPLE_RATE = sample_rate
+            handler.records.clear()
+            for _ in range(3):
+                client.post("/api/search_similar", json={"query_embedding": [1.0], "top_k": 1})
+            bodies = [r for r in handler.records if r.getMessage().startswith("Body:")]
+            assert len(bodies) == expected, f"rate={sample_rate}: {len(bodies)} body logs"
+    finally:
+        logger.setLevel(level)
+        logging_config.LOG_BODY_SAMPLE_RATE = rate
+        logger.removeHandler(handler)
+    print("✅ Bodies logged only for sampled requests")
+
+
+def test_json_formatter():
+    """Test that the JSON formatter emits one object with extra fields at top level"""
+    print("\n🔍 Testing JSON formatter...")
+    record = logging.LogRecord("ideagraph", logging.INFO, __file__, 1, "saved %s", ("x",), None)
+    record.request_id = "r1"
+    record.duration_ms = 1.5
+    entry = json.loads(logging_config.JsonFormatter().format(record))
+    assert entry["msg"] == "saved x"
+    assert entry["request_id"] == "r1"
+    assert entry["duration_ms"] == 1.5
+    assert entry["level"] == "INFO"
+    print("✅ JSON lines contain message, request id and fields")
+
+
+def main():
+    print("=" * 60)
+    print("Structured Logging Tests")
+    print("=" * 60)
+
+    try:
+        test_request_id_correlation()
+        test_body_logging_is_sampled()
+        test_json_formatter()
+
+        print("\n" + "=" * 60)
+        print("✅ All logging tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Test memory accounting and the tracemalloc snapshot endpoint
+"""
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+import numpy as np
+
+from memory_stats import deep_sizeof, store_breakdown
+from storage import IdeaStore, Snapshot
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def test_store_breakdown():
+    """Test that the breakdown attributes bytes to the right category"""
+    print("🔍 Testing store size breakdown...")
+    history = [{"role": "user", "text": "x" * 5000}]
+    graph = {"nodes": [{"name": "n" * 3000}], "edges": []}
+    embedding = [0.1] * 1000
+    snapshot = Snapshot(
+        {"a": [0.1] * 1000},
+        {"a": {"idea_id": "a", "chat_history": history, "embedding_vector": embedding,
+               "distilled_data": {"graph_structure": graph, "summary": "s"}}},
+        7
+    )
+    breakdown = store_breakdown(snapshot)
+    sizes = breakdown["bytes"]
+
+    assert sizes["chat_histories"] >= deep_sizeof(history) - 100
+    assert sizes["graph_structures"] >= 3000
+    assert sizes["embedded_embedding_copies"] == deep_sizeof(embedding)
+    assert sizes["idea_documents"] < 2000, "Sub-objects were counted twice"
+    assert breakdown["ideas_with_embedded_embedding"] == 1 and breakdown["chat_messages"] == 1
+    assert sizes["vectors_private"] == deep_sizeof([0.1] * 1000) and sizes["vectors_shared_mapping"] == 0
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir, compact_every=2)
+        store.put_many((f"c{i}", np.ones(1000), {"idea_id": f"c{i}"}) for i in range(3))
+        store.compact()
+        store.put("new", np.ones(1000), {"idea_id": "new"})
+        sizes = store_breakdown(store.snapshot())["bytes"]
+        assert sizes["vectors_shared_mapping"] >= 3 * 8000, sizes
+        assert 8000 <= sizes["vectors_private"] < 9000, "Only the vector written since compaction is private"
+    print(f"✅ Breakdown: {sizes}")
+
+
+def test_memory_endpoint_and_tracemalloc_diff():
+    """Test /api/debug/memory report, snapshots and diff"""
+    print("\n🔍 Testing /api/debug/memory...")
+    original = backend_app.ADMIN_TOKEN, backend_app.memory_tracer.output_dir
+    data_dir, snapshot_dir = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+    backend_app.ADMIN_TOKEN = "secret"
+    backend_app.init_storage(data_dir.name)
+    backend_app.memory_tracer.output_dir = Path(snapshot_dir.name)
+    try:
+        client = backend_app.app.test_client()
+
+        assert client.get("/api/debug/memory").status_code == 403
+        report = client.get("/api/debug/memory", headers=ADMIN).json
+        assert report["process"]["pid"] == os.getpid()
+        assert report["store"]["ideas"] == 0
+
+        assert client.post("/api/debug/memory", headers=ADMIN, json={"action": "snapshot"}).status_code == 409
+        client.post("/api/debug/memory", headers=ADMIN, json={"action": "start", "frames": 1})
+        try:
+            base = client.post("/api/debug/memory", headers=ADMIN, json={"action": "snapshot"}).json["snapshot"]
+            leak = [bytearray(1024) for _ in range(2000)]  # ~2 MB that the diff must show
+            report = client.get(f"/api/debug/memory?diff={base}&top=5", headers=ADMIN).json
+        finally:
+            client.post("/api/debug/memory", headers=ADMIN, json={"action": "stop"})
+
+        diff = report["diff"]
+        assert diff["same_process"] and diff["total_size_diff"] > 1_000_000, diff["total_size_diff"]
+        assert "test_memory_stats.py" in diff["top"][0]["location"], diff["top"][0]
+        assert client.get("/api/debug/memory?diff=../x", headers=ADMIN).status_code == 404
+        del leak
+        backend_app.embedding_index.wait()
+        print(f"✅ tracemalloc diff found {diff['total_size_diff']} new bytes")
+    finally:
+        backend_app.ADMIN_TOKEN, backend_app.memory_tracer.output_dir = original
+        data_dir.cleanup()
+        snapshot_dir.cleanup()
+
+
+def main():
+    print("=" * 60)
+    print("Memory Accounting Tests")
+    print("=" * 60)
+
+    try:
+        test_store_breakdown()
+        test_memory_endpoint_and_tracemalloc_diff()
+
+        print("\n" + "=" * 60)
+        print("✅ All memory tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Test the Prometheus metrics endpoint and upstream instrumentation
+"""
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+import metrics
+from upstream import InstrumentedClient
+
+
+def _sample(text, line_prefix):
+    """Value of the first exposition line starting with line_prefix"""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_histogram_exposition():
+    """Test that histogram buckets are cumulative and end with +Inf"""
+    print("🔍 Testing histogram exposition...")
+    registry = metrics.Registry(multiproc_dir=None)
+    hist = registry.histogram("demo_seconds", "Demo", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        hist.observe(value, route='a"b')
+
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert _sample(text, 'demo_seconds_bucket{route="a\\"b",le="0.1"}') == 1
+    assert _sample(text, 'demo_seconds_bucket{route="a\\"b",le="1.0"}') == 3
+    assert _sample(text, 'demo_seconds_bucket{route="a\\"b",le="+Inf"}') == 4
+    assert _sample(text, 'demo_seconds_count{route="a\\"b"}') == 4
+    print("✅ Buckets cumulative, labels escaped")
+
+
+def test_multiprocess_merge():
+    """Test that a worker's /api/metrics includes counters dumped by other workers"""
+    print("\n🔍 Testing multi-process aggregation...")
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        worker_a = metrics.Registry(multiproc_dir=metrics_dir)
+        counter_a = worker_a.counter("jobs_total", "Jobs", ("kind",))
+        counter_a.inc(3, kind="x")
+        worker_a.dump()
+        os.rename(os.path.join(metrics_dir, f"metrics-{os.getpid()}.pkl"),
+                  os.path.join(metrics_dir, "metrics-1.pkl"))  # pretend it was another pid
+
+        worker_b = metrics.Registry(multiproc_dir=metrics_dir)
+        counter_b = worker_b.counter("jobs_total", "Jobs", ("kind",))
+        counter_b.inc(2, kind="x")
+        counter_b.inc(kind="y")
+
+        text = worker_b.render()
+        assert _sample(text, 'jobs_total{kind="x"}') == 5, text
+        assert _sample(text, 'jobs_total{kind="y"}') == 1, text
+    print("✅ Counters summed across workers")
+
+
+def test_metrics_endpoint():
+    """Test that requests, stages, errors and store size show up at /api/metrics"""
+    print("\n🔍 Testing /api/metrics...")
+    backend_app.init_storage(tempfile.mkdtemp())
+    client = backend_app.app.test_client()
+
+    for i in range(3):
+        response = client.post("/api/save_idea", json={
+            "idea_id": f"m{i}", "embedding_vector": [1.0, float(i)],
+            "idea_data": {"idea_id": f"m{i}", "content_raw": "x", "distilled_data": {}}
+        })
+        assert response.status_code == 200
+    client.post("/api/save_idea", json={})  # 400
+
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+
+    assert _sample(text, 'ideagraph_requests_total{route="save_idea",method="POST",status="200"}') >= 3
+    assert _sample(text, 'ideagraph_requests_total{route="save_idea",method="POST",status="400"}') >= 1
+    assert _sample(text, 'ideagraph_stage_duration_seconds_count{route="save_idea",stage="db_write"}') >= 3
+    assert _sample(text, 'ideagraph_request_duration_seconds_count{route="save_idea"}') >= 4
+    assert _sample(text, 'ideagraph_store_ideas') == 3
+    backend_app.embedding_index.wait()
+    print("✅ Route, stage and store metrics exposed")
+
+
+def test_instrumented_client_records_tokens():
+    """Test that wrapped clients record token usage and failures"""
+    print("\n🔍 Testing upstream client instrumentation...")
+
+    def create(**kwargs):
+        if kwargs.get("fail"):
+            raise RuntimeError("upstream down")
+        return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=7, completion_tokens=5, total_tokens=12))
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)), api_key="k")
+    client = InstrumentedClient(fake, provider="test")
+
+    before = metrics.upstream_tokens_total.values().get(("test", "prompt"), 0)
+    client.chat.completions.create(model="m")
+    try:
+        client.chat.completions.create(fail=True)
+        assert False, "Exception was swallowed"
+    except RuntimeError:
+        pass
+
+    assert client.api_key == "k"
+    assert metrics.upstream_tokens_total.values()[("test", "prompt")] == before + 7
+    outcomes = metrics.upstream_requests_total.values()
+    assert outcomes[("test", "chat.completions", "ok")] >= 1
+    assert outcomes[("test", "chat.completions", "error")] >= 1
+    print("✅ Token usage and errors recorded")
+
+
+def main():
+    print("=" * 60)
+    print("Metrics Tests")
+    print("=" * 60)
+
+    try:
+        test_histogram_exposition()
+        test_multiprocess_merge()
+        test_metrics_endpoint()
+        test_instrumented_client_records_tokens()
+
+        print("\n" + "=" * 60)
+        print("✅ All metrics tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
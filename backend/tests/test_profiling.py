@@ -0,0 +1,171 @@
+"""
+Test on-demand request profiling (admin gated, next-N-requests, downloadable results)
+"""
+import sys
+import os
+import pstats
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+from profiling import _Sampler
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def _save(client, idea_id):
+    return client.post("/api/save_idea", json={
+        "idea_id": idea_id, "embedding_vector": [1.0, 0.5], "idea_data": {"idea_id": idea_id}
+    })
+
+
+@contextmanager
+def _profiling_session():
+    """Admin token, fresh store and results directory for one test; restored and removed afterwards"""
+    original = backend_app.ADMIN_TOKEN, backend_app.profiler.output_dir
+    backend_app.ADMIN_TOKEN = "secret"
+    with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as results_dir:
+        backend_app.init_storage(data_dir)
+        backend_app.profiler.output_dir = Path(results_dir)
+        try:
+            yield backend_app.app.test_client()
+        finally:
+            backend_app.embedding_index.wait()
+            backend_app.ADMIN_TOKEN, backend_app.profiler.output_dir = original
+
+
+def test_admin_gate():
+    """Test that profiling endpoints are refused without the admin token"""
+    print("🔍 Testing admin gate...")
+    client = backend_app.app.test_client()
+    original = backend_app.ADMIN_TOKEN
+    try:
+        backend_app.ADMIN_TOKEN = None
+        assert client.get("/api/debug/profile").status_code == 403, "Enabled without ADMIN_TOKEN"
+        backend_app.ADMIN_TOKEN = "secret"
+        assert client.get("/api/debug/profile", headers={"X-Admin-Token": "wrong"}).status_code == 403
+        assert client.get("/api/debug/profile", headers=ADMIN).status_code == 200
+    finally:
+        backend_app.ADMIN_TOKEN = original
+    print("✅ Admin token required")
+
+
+def test_profile_next_requests():
+    """Test that exactly the next N matching requests are profiled"""
+    print("\n🔍 Testing cProfile for the next N requests...")
+    with _profiling_session() as client:
+        response = client.post("/api/debug/profile", headers=ADMIN, json={"route": "save_idea", "count": 2})
+        assert response.status_code == 200 and response.json["remaining"] == 2, response.json
+        assert client.post("/api/debug/profile", headers=ADMIN, json={"route": "x", "mode": "nope"}).status_code == 400
+
+        client.post("/api/debug/profile", headers=ADMIN, json={"route": "/api/save_idea", "count": 2})
+        client.get("/api/health")  # other routes are not profiled
+        for i in range(3):
+            assert _save(client, f"p{i}").status_code == 200
+
+        listing = client.get("/api/debug/profile", headers=ADMIN).json
+        assert not listing["armed"] and listing["remaining"] == 0
+        names = [r["name"] for r in listing["results"]]
+        assert len(names) == 2 and all(n.endswith(".pstats") for n in names), names
+
+        download = client.get(f"/api/debug/profile/{names[0]}", headers=ADMIN)
+        assert download.status_code == 200
+        with tempfile.NamedTemporaryFile(suffix=".pstats", delete=False) as f:
+            f.write(download.data)
+        stats = pstats.Stats(f.name)
+        assert any("add_to_vector_db" in func[2] for func in stats.stats), "Route code missing from profile"
+        os.unlink(f.name)
+
+        assert client.get("/api/debug/profile/..%2Fstore.meta", headers=ADMIN).status_code == 404
+        print(f"✅ 2 of 3 requests profiled: {names}")
+
+
+def test_overlapping_requests():
+    """Test that overlapping armed requests don't fail: one is profiled, the other waits for a later slot"""
+    print("\n🔍 Testing overlapping profiled requests...")
+    with _profiling_session() as client:
+        client.post("/api/debug/profile", headers=ADMIN, json={"route": "save_idea", "count": 2})
+
+        original = backend_app.add_to_vector_db
+        both_inside = threading.Barrier(2, timeout=5)
+
+        def slow_save(*args):
+            both_inside.wait()  # both requests are in the view at the same time
+            return original(*args)
+
+        backend_app.add_to_vector_db = slow_save
+        statuses = []
+        try:
+            threads = [threading.Thread(target=lambda i=i: statuses.append(_save(backend_app.app.test_client(),
+                                                                                 f"o{i}").status_code))
+                       for i in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            backend_app.add_to_vector_db = original
+        assert statuses == [200, 200], statuses
+
+        listing = client.get("/api/debug/profile", headers=ADMIN).json
+        assert len(listing["results"]) == 1 and listing["remaining"] == 1, listing
+        assert _save(client, "o2").status_code == 200
+        listing = client.get("/api/debug/profile", headers=ADMIN).json
+        assert len(listing["results"]) == 2 and not listing["armed"], listing
+        print("✅ Overlapping requests served; slots used one at a time")
+
+
+def test_sampler_collapsed_stacks():
+    """Test that the sampling profiler records collapsed stacks of the target thread"""
+    print("\n🔍 Testing sampling profiler...")
+    ready = threading.Event()
+
+    def busy_wait():
+        ready.set()
+        end = time.time() + 0.2
+        while time.time() < end:
+            pass
+
+    worker = threading.Thread(target=busy_wait)
+    worker.start()
+    ready.wait()
+    sampler = _Sampler(worker.ident, 0.005)
+    sampler.start()
+    worker.join()
+    sampler.stop()
+
+    assert sampler.stacks, "No samples taken"
+    assert any(stack.endswith("busy_wait") for stack in sampler.stacks), list(sampler.stacks)[:3]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "x.collapsed"
+        sampler.write(path)
+        first = path.read_text().splitlines()[0]
+        assert first.rsplit(" ", 1)[1].isdigit()
+    print(f"✅ {sum(sampler.stacks.values())} samples collapsed")
+
+
+def main():
+    print("=" * 60)
+    print("Profiling Tests")
+    print("=" * 60)
+
+    try:
+        test_admin_gate()
+        test_profile_next_requests()
+        test_overlapping_requests()
+        test_sampler_collapsed_stacks()
+
+        print("\n" + "=" * 60)
+        print("✅ All profiling tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
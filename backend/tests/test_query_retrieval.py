@@ -0,0 +1,125 @@
+"""
+Test question-aware retrieval in chat and the query embedding cache
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+import numpy as np
+from openai import OpenAI
+
+import app as backend_app
+import metrics
+from embedding_cache import EmbeddingCache
+from fake_provider import embed, start_server, base_url
+from upstream import InstrumentedClient
+
+DIM = 64
+
+
+def _lookups(cache, result):
+    return metrics.cache_requests_total.values().get((cache, result), 0)
+
+
+def test_embedding_cache():
+    """Test hits, normalization and least-recently-used eviction"""
+    print("🔍 Testing embedding cache...")
+    computed = []
+
+    def compute(text):
+        computed.append(text)
+        return [float(len(text))]
+
+    cache = EmbeddingCache("test_cache", max_entries=2)
+    cache.get("m", "solar panels", compute)
+    cache.get("m", "  solar   panels ", compute)
+    assert computed == ["solar panels"], "Whitespace variants should share an entry"
+    cache.get("other-model", "solar panels", compute)
+    assert len(computed) == 2, "Entries are per model"
+
+    cache.get("m", "solar panels", compute)  # refresh: "other-model" entry is now the oldest
+    cache.get("m", "tidal", compute)
+    cache.get("other-model", "solar panels", compute)
+    assert len(computed) == 4 and cache.stats()["entries"] == 2
+    assert _lookups("test_cache", "hit") == 2 and _lookups("test_cache", "miss") == 4
+    print("✅ Cache hits counted, oldest entry evicted")
+
+
+def test_retrieval_vector():
+    """Test blending and fallbacks of the retrieval vector"""
+    print("\n🔍 Testing retrieval vector...")
+    query, idea = np.array([3.0, 0.0]), np.array([0.0, 10.0])
+    vector, info = backend_app.retrieval_vector(query, idea, 0.6)
+    assert info == {"strategy": "blended", "query_weight": 0.6, "idea_weight": 0.4}
+    assert np.allclose(vector, [0.6, 0.4]), "Both sides normalized before mixing"
+    assert backend_app.retrieval_vector(query, None)[1]["strategy"] == "query"
+    assert backend_app.retrieval_vector(None, idea)[1]["strategy"] == "idea"
+    assert backend_app.retrieval_vector(np.ones(3), idea)[1]["strategy"] == "query", "Dimension mismatch"
+    assert backend_app.retrieval_vector(None, None)[0] is None
+    print("✅ Blended, query-only and idea-only strategies")
+
+
+def test_chat_retrieves_for_the_question():
+    """Test that related ideas follow the question and repeated questions are not re-embedded"""
+    print("\n🔍 Testing question-aware chat retrieval...")
+    backend_app.init_storage(tempfile.mkdtemp())
+    backend_app.query_embedding_cache.clear()
+    server = start_server(dim=DIM)
+    original = backend_app.llm_client, backend_app.embedding_client
+    try:
+        client = OpenAI(api_key="fake", base_url=base_url(server), max_retries=0)
+        backend_app.llm_client = InstrumentedClient(client, provider="llm")
+        backend_app.embedding_client = InstrumentedClient(client, provider="embedding")
+
+        topics = {"bread": "sourdough starter fermentation flour", "bike": "bicycle gear ratio cadence",
+                  "current": "weekend hobby projects"}
+        for idea_id, topic in topics.items():
+            backend_app.add_to_vector_db(idea_id, embed(topic, DIM), {
+                "idea_id": idea_id, "distilled_data": {"one_liner": topic, "summary": topic}})
+        current = {"idea_id": "current", "distilled_data": {"one_liner": topics["current"]}}
+        http = backend_app.app.test_client()
+
+        def related_order(question):
+            response = http.post("/api/chat", json={"current_idea": current,
+                                                    "history": [{"role": "user", "text": question}]})
+            assert response.status_code == 200, response.data
+            related = [c for c in response.get_json()["citations"] if "retrieval" in c]
+            assert related and all(c["retrieval"]["strategy"] == "blended" for c in related)
+            return [c["idea_id"] for c in related]
+
+        assert related_order("how do I feed a sourdough starter")[0] == "bread"
+        assert related_order("which bicycle gear ratio for cadence")[0] == "bike"
+
+        embeddings_before = server.provider.calls.get("embeddings", 0)
+        related_order("which bicycle gear ratio for cadence")
+        assert server.provider.calls.get("embeddings", 0) == embeddings_before, "Repeated question re-embedded"
+        assert _lookups("query_embedding", "hit") >= 1
+    finally:
+        backend_app.llm_client, backend_app.embedding_client = original
+        backend_app.embedding_index.wait()
+        server.shutdown()
+    print("✅ Related ideas follow the question, repeats served from cache")
+
+
+def main():
+    print("=" * 60)
+    print("Query Retrieval Tests")
+    print("=" * 60)
+
+    try:
+        test_embedding_cache()
+        test_retrieval_vector()
+        test_chat_retrieves_for_the_question()
+
+        print("\n" + "=" * 60)
+        print("✅ All query retrieval tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
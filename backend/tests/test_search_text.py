@@ -0,0 +1,94 @@
+"""
+Test /api/search_text: server-side query embedding, filters and lightweight results
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+from openai import OpenAI
+
+import app as backend_app
+from fake_provider import embed, start_server, base_url
+from upstream import InstrumentedClient
+
+DIM = 64
+
+
+def test_search_text():
+    """Test ranking, filters, projections and the query embedding cache"""
+    print("🔍 Testing /api/search_text...")
+    backend_app.init_storage(tempfile.mkdtemp())
+    backend_app.query_embedding_cache.clear()
+    server = start_server(dim=DIM)
+    original = backend_app.embedding_client
+    try:
+        backend_app.embedding_client = InstrumentedClient(
+            OpenAI(api_key="fake", base_url=base_url(server), max_retries=0), provider="embedding")
+        topics = ["solar battery storage", "solar panel cleaning", "sourdough bread baking",
+                  "bicycle commuting", "battery recycling"]
+        for i, topic in enumerate(topics * 6):
+            backend_app.add_to_vector_db(f"idea-{i}", embed(topic, DIM), {
+                "idea_id": f"idea-{i}", "created_at": f"2025-01-{i + 1:02d}T00:00:00Z",
+                "content_raw": topic * 20, "chat_history": [{"role": "user", "text": "hi"}],
+                "distilled_data": {"one_liner": topic, "summary": topic, "tags": [topic.split()[0].title()],
+                                   "graph_structure": {"nodes": [], "edges": []}}})
+        http = backend_app.app.test_client()
+
+        body = http.post("/api/search_text", json={"query": "solar battery", "top_k": 5}).get_json()
+        results = body["results"]
+        assert len(results) == 5 and results[0]["one_liner"] == "solar battery storage"
+        assert set(results[0]) == {"idea_id", "one_liner", "tags", "summary", "created_at", "similarity"}
+        assert all(a["similarity"] >= b["similarity"] for a, b in zip(results, results[1:]))
+        calls = server.provider.calls["embeddings"]
+
+        # top_k is capped like /api/entities' limit, so one request cannot rank the whole store
+        requested = []
+        search_similar_ideas = backend_app.search_similar_ideas
+        backend_app.search_similar_ideas = lambda query, top_k: requested.append(top_k) or search_similar_ideas(query, top_k)
+        try:
+            body = http.post("/api/search_text", json={"query": "solar battery", "top_k": 10 ** 9}).get_json()
+        finally:
+            backend_app.search_similar_ideas = search_similar_ideas
+        assert len(body["results"]) == 30 and requested == [800], requested
+
+        # Filters apply after ranking; the search widens until enough ideas pass
+        body = http.post("/api/search_text", json={"query": "solar battery", "top_k": 6, "filters": {
+            "tags": ["bicycle"], "created_after": "2025-01-10"}}).get_json()
+        assert [r["one_liner"] for r in body["results"]] == ["bicycle commuting"] * 4
+        assert all(r["created_at"] > "2025-01-10" for r in body["results"])
+        assert server.provider.calls["embeddings"] == calls, "Same query should come from the cache"
+
+        body = http.post("/api/search_text", json={"query": "solar battery", "min_similarity": 0.99}).get_json()
+        assert {r["one_liner"] for r in body["results"]} <= {"solar battery storage"}
+
+        assert http.post("/api/search_text", json={"query": ""}).status_code == 400
+        assert http.post("/api/search_text", json={"query": "x", "filters": []}).status_code == 400
+        backend_app.embedding_client = None
+        assert http.post("/api/search_text", json={"query": "x"}).status_code == 500
+    finally:
+        backend_app.embedding_client = original
+        backend_app.embedding_index.wait()
+        server.shutdown()
+    print("✅ Ranked, filtered projections from one request")
+
+
+def main():
+    print("=" * 60)
+    print("Search Text Tests")
+    print("=" * 60)
+
+    try:
+        test_search_text()
+
+        print("\n" + "=" * 60)
+        print("✅ All search text tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
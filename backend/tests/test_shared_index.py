@@ -0,0 +1,170 @@
+"""
+Test the shared (memory-mapped) embedding index
+Results must match a brute-force cosine search while ideas change underneath it
+"""
+import sys
+import os
+import gc
+import tempfile
+import multiprocessing
+import weakref
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from storage import IdeaStore
+from shared_index import SharedEmbeddingIndex
+
+DIM = 16
+
+
+def _brute_force(store, query, top_k, exclude_id=None):
+    vectors, ideas = store.load()
+    q = np.asarray(query, dtype=np.float64)
+    scored = []
+    for idea_id, vec in vectors.items():
+        if idea_id == exclude_id or len(vec) != len(q):
+            continue
+        vec = np.asarray(vec, dtype=np.float64)
+        scored.append((idea_id, float(vec @ q / (np.linalg.norm(vec) * np.linalg.norm(q)))))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return [idea_id for idea_id, _ in scored[:top_k]]
+
+
+def _make_store(data_dir, count, seed=0):
+    rng = np.random.default_rng(seed)
+    store = IdeaStore(data_dir)
+    index = SharedEmbeddingIndex(store, os.path.join(data_dir, "index"), max_delta=5)
+    store.put_many(
+        (f"idea-{i}", rng.normal(size=DIM), {"idea_id": f"idea-{i}"})
+        for i in range(count)
+    )
+    return store, index
+
+
+def test_search_matches_brute_force():
+    """Test that indexed search returns the same ideas as a brute-force scan"""
+    print("🔍 Testing indexed search against brute force...")
+    rng = np.random.default_rng(1)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store, index = _make_store(data_dir, 200)
+        index.sync()
+        index.wait()
+        assert index.state == "ready", f"Index state: {index.state}"
+
+        # Changes below max_delta are served from the snapshot, not the mapping
+        store.put("idea-3", rng.normal(size=DIM), {"idea_id": "idea-3"})
+        store.delete(["idea-4"])
+        store.put("new", rng.normal(size=DIM), {"idea_id": "new"})
+        store.put("other-dim", rng.normal(size=DIM + 1), {"idea_id": "other-dim"})
+
+        for _ in range(20):
+            query = rng.normal(size=DIM)
+            expected = _brute_force(store, query, 5, exclude_id="idea-7")
+            got = [idea_id for idea_id, _, _ in index.search(query, 5, exclude_id="idea-7")]
+            assert got == expected, f"Expected {expected}, got {got}"
+        index.wait()
+        print("✅ Indexed search matches brute force (with pending changes)")
+
+
+def test_rebuild_keeps_store_precision():
+    """Test that a rebuild maps a new matrix and leaves the store's vectors untouched"""
+    print("\n🔍 Testing generation rebuild and store vector precision...")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store, index = _make_store(data_dir, 50)
+        index.sync()
+        index.wait()
+        first = index.stats()["generation"]
+
+        rng = np.random.default_rng(2)
+        extra = [rng.normal(size=DIM) for _ in range(10)]
+        store.put_many((f"extra-{i}", vec, {"idea_id": f"extra-{i}"}) for i, vec in enumerate(extra))
+        index.sync()
+        index.wait()
+
+        stats = index.stats()
+        assert stats["generation"] > first, "No new generation was built"
+        assert stats["rows"] == 60 and stats["pending_changes"] == 0, stats
+        vector = store.snapshot().vectors["extra-3"]
+        assert np.asarray(vector).dtype == np.float64, "Store vector was rounded to float32"
+        assert np.array_equal(vector, extra[3])
+        store.compact()
+        assert np.array_equal(IdeaStore(data_dir).snapshot().vectors["extra-3"], extra[3]), \
+            "Compaction persisted rounded vectors"
+        index.wait()
+        print(f"✅ Generation {stats['generation']} mapped, store vectors kept at full precision")
+
+
+def _attach_and_search(data_dir, query, queue):
+    store = IdeaStore(data_dir)
+    index = SharedEmbeddingIndex(store, os.path.join(data_dir, "index"), max_delta=5)
+    index.sync()
+    queue.put((index.stats()["generation"], [i for i, _, _ in index.search(query, 3)]))
+
+
+def test_other_process_attaches_same_generation():
+    """Test that another worker process maps the existing generation instead of rebuilding"""
+    print("\n🔍 Testing generation sharing across processes...")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store, index = _make_store(data_dir, 100)
+        index.sync()
+        index.wait()
+        query = np.ones(DIM)
+
+        queue = multiprocessing.Queue()
+        p = multiprocessing.Process(target=_attach_and_search, args=(data_dir, query, queue))
+        p.start()
+        generation, results = queue.get(timeout=30)
+        p.join()
+
+        assert generation == index.stats()["generation"], "Worker built its own generation"
+        assert results == [i for i, _, _ in index.search(query, 3)]
+        index.wait()
+        print("✅ Second process attached generation", generation)
+
+
+def test_fork_resets_live_indexes_only():
+    """Test that a forked child resets live indexes and discarded ones are not kept for fork"""
+    print("\n🔍 Testing fork hooks...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        discarded = weakref.ref(SharedEmbeddingIndex(IdeaStore(data_dir), os.path.join(data_dir, "index")))
+    gc.collect()
+    assert discarded() is None, "the fork hook keeps discarded indexes alive"
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        index = SharedEmbeddingIndex(IdeaStore(data_dir), os.path.join(data_dir, "index"))
+        index._syncing = True  # as if a sync thread was running in the parent
+        if not hasattr(os, "fork"):
+            return
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if index._syncing is False and index._thread is None else 1)
+        _, status = os.waitpid(pid, 0)
+        index._syncing = False
+        assert os.waitstatus_to_exitcode(status) == 0, "index not reset in the child"
+    print("✅ Live indexes reset after fork, discarded ones released")
+
+
+def main():
+    print("=" * 60)
+    print("Shared Embedding Index Tests")
+    print("=" * 60)
+
+    try:
+        test_search_matches_brute_force()
+        test_rebuild_keeps_store_precision()
+        test_other_process_attaches_same_generation()
+        test_fork_resets_live_indexes_only()
+
+        print("\n" + "=" * 60)
+        print("✅ All shared index tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
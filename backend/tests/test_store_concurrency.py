@@ -0,0 +1,130 @@
+"""
+Stress test for in-process concurrency of the idea store
+Concurrent Flask threads saving and updating ideas must not lose any update
+"""
+import sys
+import os
+import tempfile
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+from storage import IdeaStore
+
+THREADS = 8
+SAVES_PER_THREAD = 30
+
+
+def _use_temp_store():
+    backend_app.init_storage(tempfile.mkdtemp())
+    return backend_app.store
+
+
+def _run_threads(target, count):
+    errors = []
+
+    def wrapper(idx):
+        try:
+            target(idx)
+        except Exception as e:  # surface failures from worker threads
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrapper, args=(idx,)) for idx in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, f"Worker thread failed: {errors[0]!r}"
+
+
+def test_concurrent_save_idea_requests():
+    """Test that concurrent /api/save_idea calls never drop an idea"""
+    print("🔍 Testing concurrent /api/save_idea requests...")
+    store = _use_temp_store()
+    client = backend_app.app.test_client()
+
+    def saver(thread_idx):
+        for i in range(SAVES_PER_THREAD):
+            idea_id = f"t{thread_idx}-{i}"
+            response = client.post("/api/save_idea", json={
+                "idea_id": idea_id,
+                "embedding_vector": [float(thread_idx), float(i), 1.0],
+                "idea_data": {"idea_id": idea_id, "content_raw": "stress", "distilled_data": {}}
+            })
+            assert response.status_code == 200, response.data
+
+    def searcher(_):
+        for _ in range(SAVES_PER_THREAD):
+            response = client.post("/api/search_similar", json={"query_embedding": [1.0, 1.0, 1.0], "top_k": 3})
+            assert response.status_code == 200, response.data
+            assert len(response.json["results"]) <= 3
+
+    _run_threads(lambda idx: saver(idx) if idx < THREADS else searcher(idx), THREADS + 2)
+
+    expected = THREADS * SAVES_PER_THREAD
+    assert store.count() == expected, f"Lost updates: expected {expected}, got {store.count()}"
+    assert IdeaStore(store.data_dir).count() == expected, "Data on disk does not match memory"
+    response = client.post("/api/search_similar", json={"query_embedding": [1.0, 1.0, 1.0], "top_k": 3})
+    assert len(response.json["results"]) == 3, "Search does not see the saved ideas"
+    backend_app.embedding_index.wait()
+    print(f"✅ {expected} concurrent saves, zero lost")
+
+
+def test_concurrent_read_modify_write():
+    """Test that concurrent read-modify-write updates on one idea are all applied"""
+    print("\n🔍 Testing concurrent read-modify-write updates...")
+    store = _use_temp_store()
+    store.put("shared", [1.0, 0.0], {"idea_id": "shared", "linked_idea_ids": []})
+
+    def linker(thread_idx):
+        for i in range(SAVES_PER_THREAD):
+            with store.transaction() as txn:
+                child_id = f"child-{thread_idx}-{i}"
+                txn.put(child_id, [0.0, 1.0], {"idea_id": child_id, "parent_idea_id": "shared"})
+                txn.update("shared", lambda idea: idea['linked_idea_ids'].append(child_id))
+
+    _run_threads(linker, THREADS)
+
+    links = store.get("shared")['linked_idea_ids']
+    expected = THREADS * SAVES_PER_THREAD
+    assert len(links) == expected, f"Lost parent updates: expected {expected}, got {len(links)}"
+    assert store.count() == expected + 1
+    print(f"✅ {expected} parent updates applied atomically")
+
+
+def test_snapshots_are_isolated():
+    """Test that a snapshot taken before a write is not changed by it"""
+    print("\n🔍 Testing copy-on-write snapshots...")
+    store = _use_temp_store()
+    store.put("a", [1.0], {"idea_id": "a", "chat_history": ["hi"]})
+
+    before = store.snapshot()
+    store.update("a", lambda idea: idea.pop('chat_history'))
+    store.put("b", [2.0], {"idea_id": "b"})
+
+    assert set(before.ideas) == {"a"}, "Old snapshot saw a later insert"
+    assert before.ideas["a"]["chat_history"] == ["hi"], "Old snapshot saw a later update"
+    assert "chat_history" not in store.get("a")
+    print("✅ Readers keep a consistent snapshot while writers commit")
+
+
+def main():
+    print("=" * 60)
+    print("Idea Store Concurrency Stress Test")
+    print("=" * 60)
+
+    try:
+        test_concurrent_save_idea_requests()
+        test_concurrent_read_modify_write()
+        test_snapshots_are_isolated()
+
+        print("\n" + "=" * 60)
+        print("✅ All concurrency tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Test multi-process safety of the idea store
+Several processes write to one data directory at the same time; no update may be lost
+"""
+import sys
+import os
+import tempfile
+import pickle
+import multiprocessing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from storage import IdeaStore
+
+WRITERS = 4
+IDEAS_PER_WRITER = 25
+
+
+def _writer(data_dir, writer_idx, compact_every):
+    store = IdeaStore(data_dir, compact_every=compact_every)
+    for i in range(IDEAS_PER_WRITER):
+        idea_id = f"w{writer_idx}-{i}"
+        store.put(idea_id, [float(writer_idx), float(i)], {"idea_id": idea_id, "content_raw": f"idea {i}"})
+        # Concurrent read-modify-write on a shared idea
+        store.update("counter", lambda idea: idea.__setitem__('count', idea.get('count', 0) + 1))
+
+
+def _run_writers(data_dir, compact_every):
+    IdeaStore(data_dir).put("counter", [0.0, 0.0], {"idea_id": "counter", "count": 0})
+    processes = [
+        multiprocessing.Process(target=_writer, args=(data_dir, idx, compact_every))
+        for idx in range(WRITERS)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0, f"Writer process failed with exit code {p.exitcode}"
+
+
+def test_concurrent_writers_lose_nothing():
+    """Test that concurrent writers from several processes lose no updates"""
+    print("🔍 Testing concurrent writers across processes...")
+
+    for compact_every in (1000, 7):
+        with tempfile.TemporaryDirectory() as data_dir:
+            _run_writers(data_dir, compact_every)
+
+            vectors, ideas = IdeaStore(data_dir).load()
+            assert len(ideas) == WRITERS * IDEAS_PER_WRITER + 1, f"Expected {WRITERS * IDEAS_PER_WRITER + 1} ideas, got {len(ideas)}"
+            assert len(vectors) == len(ideas), "Vectors and ideas out of sync"
+            assert ideas["counter"]["count"] == WRITERS * IDEAS_PER_WRITER, f"Lost updates: count={ideas['counter']['count']}"
+            print(f"✅ {len(ideas)} ideas, counter={ideas['counter']['count']} (compact_every={compact_every})")
+
+
+def test_reader_sees_other_process_writes():
+    """Test that an already-loaded reader picks up writes from another process incrementally"""
+    print("\n🔍 Testing incremental reload in a reader...")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        reader = IdeaStore(data_dir)
+        assert reader.count() == 0
+
+        p = multiprocessing.Process(target=_writer, args=(data_dir, 0, 1000))
+        p.start()
+        p.join()
+
+        assert reader.count() == IDEAS_PER_WRITER, f"Reader sees {reader.count()} ideas"
+        assert reader.get("w0-3")["content_raw"] == "idea 3"
+
+        writer = IdeaStore(data_dir)
+        assert writer.delete(["w0-3", "missing"]) == ["w0-3"]
+        writer.compact()
+
+        assert reader.get("w0-3") is None, "Reader did not see the delete"
+        assert reader.count() == IDEAS_PER_WRITER - 1
+        print("✅ Reader picked up puts, deletes and compaction")
+
+
+def test_torn_journal_tail_is_ignored():
+    """Test that a partially written journal record does not corrupt the store"""
+    print("\n🔍 Testing recovery from a torn journal record...")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = IdeaStore(data_dir)
+        store.put("a", [1.0], {"idea_id": "a"})
+        with open(store.journal_path, 'ab') as f:
+            f.write(b"\x80\x05garbage")
+
+        assert IdeaStore(data_dir).count() == 1
+        IdeaStore(data_dir).put("b", [2.0], {"idea_id": "b"})
+        assert set(IdeaStore(data_dir).load()[1]) == {"a", "b"}
+        print("✅ Torn record truncated by the next writer")
+
+
+def test_vectors_are_mapped_from_shared_segments():
+    """Test that compacted vectors are read from shared full-precision segments, not held per process"""
+    print("\n🔍 Testing shared vector segments...")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        precise = [0.1 + 1e-12, 1 / 3]  # not representable in float32
+        writer = IdeaStore(data_dir, compact_every=3)
+        for i in range(5):
+            writer.put(f"v{i}", [p + i for p in precise], {"idea_id": f"v{i}"})
+
+        reader = IdeaStore(data_dir)
+        vectors = reader.snapshot().vectors
+        assert len(vectors) == 5 and set(vectors) == {f"v{i}" for i in range(5)}
+        assert set(vectors.delta) == {"v3", "v4"}, f"Private vectors: {sorted(vectors.delta)}"
+        mapped = vectors["v1"]
+        assert not mapped.flags.owndata and not mapped.flags.writeable, "Compacted vector is a private copy"
+        assert mapped.tolist() == [p + 1 for p in precise], "Vector rounded by the segment"
+
+        writer.delete(["v0"])  # third record: compacts
+        vectors = reader.snapshot().vectors
+        assert "v0" not in vectors and len(vectors) == 4 and not vectors.delta
+        writer.put("v3", [9.0, 9.0], {"idea_id": "v3"})
+        vectors = reader.snapshot().vectors
+        assert set(vectors.delta) == {"v3"} and vectors["v3"].tolist() == [9.0, 9.0] and len(vectors) == 4
+        segments = sorted(path.name for path in reader.data_dir.glob("vector*-*-*.npy"))
+        assert segments == ["vector_ids-1-2.npy", "vector_ids-2-2.npy", "vectors-1-2.npy", "vectors-2-2.npy"], segments
+
+        # Snapshots rewritten by other tools are re-segmented on load
+        with open(reader.vector_path, 'wb') as f:
+            pickle.dump({"v1": np.array([5.0, 6.0])}, f)
+        assert IdeaStore(data_dir).snapshot().vectors["v1"].tolist() == [5.0, 6.0]
+        print("✅ Compacted vectors mapped at full precision, only the journal delta held privately")
+
+
+def main():
+    print("=" * 60)
+    print("Idea Store Multi-Process Tests")
+    print("=" * 60)
+
+    try:
+        test_concurrent_writers_lose_nothing()
+        test_reader_sees_other_process_writes()
+        test_torn_journal_tail_is_ignored()
+        test_vectors_are_mapped_from_shared_segments()
+
+        print("\n" + "=" * 60)
+        print("✅ All store tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Test token-budgeted RAG context assembly
+"""
+import sys
+import os
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+from factories import app_storage, idea
+from token_budget import ContextBudget, context_budget, estimate_tokens, LLM_CONTEXT_WINDOW
+
+# Six paragraphs and fifteen described entities: enough to overflow small budgets
+TIDAL = {
+    "content": "\n\n".join(f"Paragraph {i} about tidal energy storage. " * 8 for i in range(6)),
+    "tags": ["energy", "storage"],
+    "summary": "Tidal power paired with storage smooths island grids.",
+    "entities": [(f"Entity {i}", "Concept", "d" * 40) for i in range(15)],
+    "edges": [("n0", f"n{i}", "enables") for i in range(1, 15)],
+}
+
+
+def test_budget_packing():
+    """Test that the most relevant items are kept and required items always are"""
+    print("🔍 Testing context budget packing...")
+    assert estimate_tokens("abcd" * 10) == 10 and estimate_tokens("你好") == 2 and estimate_tokens("") == 0
+
+    budget = ContextBudget(30, [("a", "A:"), ("b", "B:")])
+    budget.add("a", "must keep {cite}", required=True, citation={"idea_id": "x"})
+    budget.add("b", "low " * 40, score=0.1)
+    budget.add("b", "high {cite}", score=0.9, citation={"idea_id": "y"})
+    text, citations, usage = budget.build()
+    assert text == "A:\nmust keep [1]\nB:\nhigh [2]", text
+    assert [c["index"] for c in citations] == [1, 2] and citations[1]["idea_id"] == "y"
+    assert usage["dropped"] == 1 and usage["used"] <= 30
+    assert set(usage["sections"]) == {"a", "b"}
+
+    assert context_budget(0, 0) > 0
+    assert context_budget(0, LLM_CONTEXT_WINDOW) == 0, "History larger than the window leaves no room"
+    print("✅ Highest-scoring items packed first")
+
+
+def test_rag_context_respects_budget():
+    """Test that build_rag_context fits the budget and reports usage per section"""
+    print("\n🔍 Testing build_rag_context budget...")
+    with app_storage():
+        rng = np.random.default_rng(0)
+        for i in range(6):
+            backend_app.add_to_vector_db(f"r{i}", rng.standard_normal(8),
+                                         idea(f"Tidal storage idea r{i}", idea_id=f"r{i}", **TIDAL))
+        backend_app.embedding_index.sync()
+        current = idea("Tidal storage idea current", idea_id="current", **TIDAL)
+
+        big_text, big_citations, big_usage = backend_app.build_rag_context(
+            current, rng.standard_normal(8), "current", max_tokens=100000)
+        small_text, small_citations, small_usage = backend_app.build_rag_context(
+            current, rng.standard_normal(8), "current", max_tokens=300)
+        assert big_usage["dropped"] == 0 and "RELATED IDEAS" in big_text
+        assert small_usage["used"] <= 300 and small_usage["dropped"] > 0, small_usage
+        assert estimate_tokens(small_text) < estimate_tokens(big_text)
+        assert small_text.startswith("=== PRIMARY IDEA ===") and small_citations[0]["idea_id"] == "current"
+        assert sum(small_usage["sections"].values()) == small_usage["used"]
+        for c in small_citations:
+            assert f"[{c['index']}]" in small_text
+
+        # A budget of zero still keeps the primary idea
+        _, citations, usage = backend_app.build_rag_context(current, None, "current", max_tokens=0)
+        assert list(usage["sections"]) == ["primary"] and len(citations) == 1
+        print(f"✅ {big_usage['used']} tokens unbounded, {small_usage['used']} within a 300 token budget")
+
+
+def main():
+    print("=" * 60)
+    print("Token Budget Tests")
+    print("=" * 60)
+
+    try:
+        test_budget_packing()
+        test_rag_context_respects_budget()
+
+        print("\n" + "=" * 60)
+        print("✅ All token budget tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Test request tracing: nested spans, trace headers, the slow-trace buffer and exporters
+"""
+import sys
+import os
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as backend_app
+import tracing
+
+
+def test_nested_spans():
+    """Test that spans opened inside a trace form a tree"""
+    print("🔍 Testing span nesting...")
+    root = tracing.start_trace("job")
+    with tracing.span("outer") as outer:
+        with tracing.span("inner", k=1):
+            time.sleep(0.01)
+    try:
+        with tracing.span("failing"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    tracing.finish_trace(root)
+
+    assert [c.name for c in root.children] == ["outer", "failing"]
+    assert outer.children[0].name == "inner" and outer.children[0].attributes == {"k": 1}
+    assert outer.children[0].parent_id == outer.span_id
+    assert outer.duration >= 0.01 and root.duration >= outer.duration
+    assert root.children[1].error == "ValueError: boom"
+    assert tracing.current_span() is None
+    print("✅ Span tree recorded with timings and errors")
+
+
+def test_request_traces_endpoint():
+    """Test the X-Trace-Id header, traceparent propagation and /api/debug/traces"""
+    print("\n🔍 Testing request traces...")
+    original = backend_app.ADMIN_TOKEN
+    data_dir = tempfile.TemporaryDirectory()
+    backend_app.init_storage(data_dir.name)
+    backend_app.ADMIN_TOKEN = "secret"
+    try:
+        tracing.recent_traces.clear()
+        client = backend_app.app.test_client()
+
+        trace_id = "4bf92f3577b34da6a3ce929d0e0736" + "aa"
+        response = client.post("/api/save_idea", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"}, json={
+            "idea_id": "t1", "embedding_vector": [1.0, 0.0], "idea_data": {"idea_id": "t1"}
+        })
+        assert response.headers["X-Trace-Id"] == trace_id
+        client.post("/api/search_similar", json={"query_embedding": [1.0, 0.0], "top_k": 1})
+
+        assert client.get("/api/debug/traces").status_code == 403
+        traces = client.get("/api/debug/traces?limit=50", headers={"X-Admin-Token": "secret"}).json["traces"]
+        save = next(t for t in traces if t["trace_id"] == trace_id)
+        assert save["attributes"]["route"] == "save_idea"
+        db_write = next(c for c in save["children"] if c["name"] == "db_write")
+        assert any(c["name"] == "store.commit" for c in db_write["children"]), db_write
+
+        search = next(t for t in traces if t["name"] == "POST /api/search_similar")
+        names = [c["name"] for c in search["children"][0]["children"]]
+        assert names == ["search_similar_ideas"], names
+
+        durations = [t["duration_ms"] for t in traces]
+        assert durations == sorted(durations, reverse=True), "Traces not sorted slowest first"
+        print("✅ Trace id returned and span tree exposed")
+    finally:
+        backend_app.embedding_index.wait()
+        backend_app.ADMIN_TOKEN = original
+        data_dir.cleanup()
+
+
+class _Collector(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        _Collector.received.append((self.path, json.loads(body)))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_exporters():
+    """Test the JSONL file exporter and the OTLP/HTTP exporter"""
+    print("\n🔍 Testing trace exporters...")
+    server = HTTPServer(("127.0.0.1", 0), _Collector)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "traces.jsonl")
+        file_exporter = tracing.FileExporter(path)
+        otlp = tracing.OtlpHttpExporter(f"http://127.0.0.1:{server.server_port}")
+
+        root = tracing.start_trace("export-me")
+        with tracing.span("child", n=2):
+            pass
+        root.end()
+        tracing._current_span.set(None)
+        file_exporter.export(root)
+        otlp.export(root)
+
+        deadline = time.time() + 5
+        while time.time() < deadline and not (_Collector.received and os.path.exists(path)):
+            time.sleep(0.05)
+
+        with open(path) as f:
+            exported = json.loads(f.readline())
+        assert exported["name"] == "export-me" and exported["children"][0]["name"] == "child"
+
+        url_path, payload = _Collector.received[0]
+        assert url_path == "/v1/traces"
+        spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert {s["name"] for s in spans} == {"export-me", "child"}
+        child = next(s for s in spans if s["name"] == "child")
+        assert child["parentSpanId"] == root.span_id and child["traceId"] == root.trace_id
+    server.shutdown()
+    print("✅ Traces exported to file and OTLP collector")
+
+
+def main():
+    print("=" * 60)
+    print("Tracing Tests")
+    print("=" * 60)
+
+    try:
+        test_nested_spans()
+        test_request_traces_endpoint()
+        test_exporters()
+
+        print("\n" + "=" * 60)
+        print("✅ All tracing tests passed!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Token Budgets for IdeaGraph AI
+Local token estimates and relevance-ordered packing of RAG context into a budget
+"""
+
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Upper bound for the RAG context of one chat request
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+# Model context window and the part of it kept free for the reply
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "128000"))
+LLM_REPLY_TOKENS = int(os.getenv("LLM_REPLY_TOKENS", "1024"))
+
+# CJK characters are roughly one token each; other text roughly four characters per token
+_CJK = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Approximate token count without a tokenizer (within ~20% for BPE models)"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def context_budget(prompt_tokens: int = 0, history_tokens: int = 0) -> int:
+    """Tokens available for RAG context once the prompt, history and reply are accounted for"""
+    free = LLM_CONTEXT_WINDOW - prompt_tokens - history_tokens - LLM_REPLY_TOKENS
+    return max(0, min(RAG_CONTEXT_TOKENS, free))
+
+
+class ContextItem:
+    """One candidate piece of context; `{cite}` in its text becomes its citation marker"""
+
+    __slots__ = ("section", "text", "score", "citation", "required", "tokens", "order")
+
+    def __init__(self, section: str, text: str, score: float, citation: Optional[Dict[str, Any]],
+                 required: bool, order: int):
+        self.section = section
+        self.text = text
+        self.score = score
+        self.citation = citation
+        self.required = required
+        self.tokens = estimate_tokens(text)
+        self.order = order
+
+
+class ContextBudget:
+    """
+    Collects candidate context and keeps the most relevant items that fit.
+
+    Items are chosen by score (required items first, whatever their size),
+    then rendered grouped by section in the order the sections were declared
+    and, within a section, in the order the items were added. Citation
+    numbers are assigned in rendered order.
+    """
+
+    def __init__(self, max_tokens: int, sections: List[Tuple[str, str]]):
+        self.max_tokens = max_tokens
+        self.sections = sections  # (name, header) pairs
+        self._headers = dict(sections)
+        self._items: List[ContextItem] = []
+
+    def add(self, section: str, text: str, score: float = 0.0,
+            citation: Optional[Dict[str, Any]] = None, required: bool = False) -> None:
+        if section not in self._headers:
+            raise ValueError(f"Unknown context section: {section}")
+        self._items.append(ContextItem(section, text, score, citation, required, len(self._items)))
+
+    def _select(self) -> Tuple[List[ContextItem], Dict[str, int]]:
+        used: Dict[str, int] = {}
+        chosen = []
+        total = 0
+        ranked = sorted(self._items, key=lambda i: (not i.required, -i.score, i.order))
+        for item in ranked:
+            header = 0 if item.section in used else estimate_tokens(self._headers[item.section])
+            cost = item.tokens + header
+            if not item.required and total + cost > self.max_tokens:
+                continue
+            chosen.append(item)
+            used[item.section] = used.get(item.section, 0) + cost
+            total += cost
+        return chosen, used
+
+    def build(self) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+        """(context text, citations, token usage report)"""
+        chosen, used = self._select()
+        by_section: Dict[str, List[ContextItem]] = {}
+        for item in sorted(chosen, key=lambda i: i.order):
+            by_section.setdefault(item.section, []).append(item)
+
+        lines: List[str] = []
+        citations: List[Dict[str, Any]] = []
+        for name, header in self.sections:
+            items = by_section.get(name)
+            if not items:
+                continue
+            lines.append(header)
+            for item in items:
+                marker = ""
+                if item.citation is not None:
+                    citations.append({"index": len(citations) + 1, **item.citation})
+                    marker = f"[{len(citations)}]"
+                lines.append(item.text.replace("{cite}", marker))
+
+        usage = {
+            "budget": self.max_tokens,
+            "used": sum(used.values()),
+            "sections": {name: used[name] for name, _ in self.sections if name in used},
+            "candidates": len(self._items),
+            "dropped": len(self._items) - len(chosen),
+        }
+        return "\n".join(lines), citations, usage
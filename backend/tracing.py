@@ -0,0 +1,281 @@
+"""
+Request Tracing for IdeaGraph AI
+Lightweight in-process spans, a buffer of recent traces and optional OTLP / file export
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("ideagraph.tracing")
+
+
+# Completed traces kept in memory for /api/debug/traces
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+# Optional exporters: OTLP/HTTP collector base URL and/or a local JSONL file
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+TRACE_FILE = os.getenv("TRACE_FILE")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ideagraph-backend")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """One timed operation; spans opened while it is current become its children"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_time", "_start",
+                 "duration", "attributes", "children", "error")
+
+    def __init__(self, name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id or _new_id(128)
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.attributes = dict(attributes or {})
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "start": round(self.start_time, 6),
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block as a child of the current span.
+
+    Outside of a trace the span is still timed (callers may read `.duration`)
+    but it is not recorded anywhere.
+    """
+    parent = _current_span.get()
+    current = Span(name, parent.trace_id if parent else None, parent.span_id if parent else None, attributes)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end()
+        _current_span.reset(token)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator form of span()"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+# ============ Traces ============
+
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes) -> Span:
+    """Open the root span of a request (continuing a W3C `traceparent` if one was sent)"""
+    trace_id, parent_id = None, None
+    if traceparent:
+        parts = traceparent.split("-")
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            trace_id, parent_id = parts[1], parts[2]
+    root = Span(name, trace_id, parent_id, attributes)
+    _current_span.set(root)
+    return root
+
+
+def finish_trace(root: Span) -> None:
+    """Close the root span, keep it in the buffer and hand it to the exporters"""
+    root.end()
+    _current_span.set(None)
+    recent_traces.append(root)
+    for exporter in _exporters:
+        exporter.export(root)
+
+
+class TraceBuffer:
+    """Ring buffer of recently completed traces"""
+
+    def __init__(self, size: int = TRACE_BUFFER_SIZE):
+        self._traces = deque(maxlen=size)
+
+    def append(self, root: Span) -> None:
+        self._traces.append(root)
+
+    def slowest(self, limit: int = 20, name_contains: Optional[str] = None) -> List[Dict[str, Any]]:
+        traces = list(self._traces)
+        if name_contains:
+            traces = [t for t in traces if name_contains in t.name]
+        traces.sort(key=lambda t: t.duration or 0.0, reverse=True)
+        return [{"trace_id": t.trace_id, **t.to_dict()} for t in traces[:limit]]
+
+    def clear(self) -> None:
+        self._traces.clear()
+
+    def __len__(self) -> int:
+        return len(self._traces)
+
+
+recent_traces = TraceBuffer()
+
+
+# ============ Exporters ============
+
+class _BackgroundExporter:
+    """Exports traces from a daemon thread so requests never wait on I/O"""
+
+    def __init__(self, max_queue: int = 1000):
+        self._queue: "queue.Queue[Span]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def export(self, root: Span) -> None:
+        if self._pid != os.getpid():  # first use, or the thread was lost in fork()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(root)
+        except queue.Full:
+            pass  # drop rather than slow down requests
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except Exception as e:
+                logger.warning("Trace export failed (%s): %s", type(self).__name__, e)
+
+    def write(self, batch: List[Span]) -> None:
+        raise NotImplementedError
+
+
+class FileExporter(_BackgroundExporter):
+    """Append each trace as one JSON line (for offline analysis)"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = Path(path)
+
+    def write(self, batch: List[Span]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for root in batch:
+                f.write(json.dumps({"trace_id": root.trace_id, **root.to_dict()}, ensure_ascii=False, default=str) + "\n")
+
+
+class OtlpHttpExporter(_BackgroundExporter):
+    """Send traces to an OpenTelemetry collector using OTLP/HTTP with the JSON encoding"""
+
+    def __init__(self, endpoint: str, service_name: str = SERVICE_NAME, timeout: float = 5.0):
+        super().__init__()
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def write(self, batch: List[Span]) -> None:
+        spans = [self._otlp_span(s) for root in batch for s in root.walk()]
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attr("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "ideagraph"}, "spans": spans}],
+            }]
+        }
+        req = urllib.request.Request(self.url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+    @staticmethod
+    def _otlp_span(s: Span) -> Dict[str, Any]:
+        start_ns = int(s.start_time * 1e9)
+        data = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int((s.duration or 0.0) * 1e9)),
+            "attributes": [_otlp_attr(k, v) for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 0},
+        }
+        if s.parent_id:
+            data["parentSpanId"] = s.parent_id
+        return data
+
+
+def _otlp_attr(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+_exporters: List[_BackgroundExporter] = []
+
+if OTLP_ENDPOINT:
+    _exporters.append(OtlpHttpExporter(OTLP_ENDPOINT))
+if TRACE_FILE:
+    _exporters.append(FileExporter(TRACE_FILE))
+
+
+def export_queue_depths() -> Dict[str, int]:
+    """Traces waiting to be exported, per exporter"""
+    return {type(e).__name__: e._queue.qsize() for e in _exporters}
@@ -0,0 +1,134 @@
+"""
+Upstream client instrumentation for IdeaGraph AI
+Wraps the OpenAI-compatible clients to record latency, failures and token usage
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+import metrics
+from tracing import span
+
+
+# Attribute chains leading to a `create` call that we instrument
+_RESOURCES = {"chat", "completions", "embeddings"}
+
+# Consecutive failures after which a provider is reported as unavailable ("open"),
+# and seconds after the last failure before it is considered worth retrying
+FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", "5"))
+COOLDOWN_SECONDS = float(os.getenv("UPSTREAM_COOLDOWN_SECONDS", "30"))
+
+
+class ProviderHealth:
+    """In-memory circuit-breaker style view of one provider, updated on every call"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_failure_at = None
+        self.last_success_at = None
+
+    def record(self, error: Exception = None) -> None:
+        with self._lock:
+            if error is None:
+                self.consecutive_failures = 0
+                self.last_success_at = time.time()
+            else:
+                self.consecutive_failures += 1
+                self.last_error = f"{type(error).__name__}: {str(error)[:200]}"
+                self.last_failure_at = time.time()
+
+    @property
+    def state(self) -> str:
+        if self.consecutive_failures < FAILURE_THRESHOLD:
+            return "closed"
+        if time.time() - (self.last_failure_at or 0) < COOLDOWN_SECONDS:
+            return "open"
+        return "half_open"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_failure_at": self.last_failure_at,
+            "last_success_at": self.last_success_at,
+        }
+
+
+_providers: Dict[str, ProviderHealth] = {}
+
+
+def provider_health(provider: str) -> ProviderHealth:
+    if provider not in _providers:
+        _providers.setdefault(provider, ProviderHealth())
+    return _providers[provider]
+
+
+def upstream_status() -> Dict[str, Dict[str, Any]]:
+    """State of every provider seen so far (O(number of providers))"""
+    return {name: health.status() for name, health in _providers.items()}
+
+
+class InstrumentedClient:
+    """
+    Transparent proxy around an OpenAI client.
+
+    `client.chat.completions.create(...)` and `client.embeddings.create(...)`
+    behave exactly as before, but every call records its latency, outcome and
+    the token usage reported in `response.usage`. Everything else is passed
+    straight through to the wrapped client.
+    """
+
+    def __init__(self, client, provider: str, path: Tuple[str, ...] = ()):
+        self._client = client
+        self._provider = provider
+        self._path = path
+        provider_health(provider)  # listed in readiness even before the first call
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name in _RESOURCES:
+            return InstrumentedClient(attr, self._provider, self._path + (name,))
+        if name == "create" and self._path:
+            return self._wrap_create(attr)
+        return attr
+
+    def _wrap_create(self, create):
+        provider = self._provider
+        operation = ".".join(self._path)
+        health = provider_health(provider)
+
+        def instrumented_create(*args, **kwargs):
+            start = time.perf_counter()
+            with span(f"{provider}.{operation}", model=kwargs.get("model", "")) as call_span:
+                try:
+                    response = create(*args, **kwargs)
+                except Exception as e:
+                    metrics.upstream_requests_total.inc(provider=provider, operation=operation, outcome="error")
+                    health.record(e)
+                    raise
+                finally:
+                    metrics.upstream_duration.observe(time.perf_counter() - start, provider=provider, operation=operation)
+                metrics.upstream_requests_total.inc(provider=provider, operation=operation, outcome="ok")
+                health.record()
+                usage = getattr(response, "usage", None)
+                record_usage(provider, usage)
+                if usage is not None and getattr(usage, "total_tokens", None):
+                    call_span.set(tokens=usage.total_tokens)
+            return response
+
+        return instrumented_create
+
+
+def record_usage(provider: str, usage) -> None:
+    """Add the prompt/completion/total token counts of one response to the metrics"""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        count = getattr(usage, kind, None)
+        if count:
+            metrics.upstream_tokens_total.inc(count, provider=provider, kind=kind.replace("_tokens", ""))
@@ -0,0 +1,66 @@
+# Gunicorn 生产环境配置
+# 用法: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# 所有参数都可以通过环境变量调整，默认值针对长时间的 LLM 调用做了优化
+
+import os
+import glob
+
+# Each worker keeps its own metrics; they are dumped here so that /api/metrics
+# on any worker reports the totals of all of them
+os.environ.setdefault(
+    "METRICS_MULTIPROC_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "data", "metrics"),
+)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '7860')}"
+
+# Worker processes and threads per worker.
+# The API is I/O bound (waiting on LLM / embedding providers), so a few
+# processes with many threads each is a better fit than many sync workers.
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+
+# Distill / merge / split can spend well over a minute inside the LLM call,
+# so the worker timeout has to be generous or gunicorn kills the request.
+timeout = int(os.getenv("WEB_TIMEOUT", "300"))
+# Time given to in-flight requests to finish on SIGTERM before workers are killed
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "60"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+
+# Recycle workers periodically to bound memory growth (0 = disabled)
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "0"))
+
+# Import the app (and load the stores) once in the master process so the
+# loaded data is shared copy-on-write between forked workers.
+preload_app = os.getenv("WEB_PRELOAD", "true").lower() == "true"
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Counters restart from zero with the server; drop the previous run's dumps
+    for path in glob.glob(os.path.join(os.environ["METRICS_MULTIPROC_DIR"], "metrics-*.pkl")):
+        os.remove(path)
+
+
+def when_ready(server):
+    server.log.info(
+        "IdeaGraph AI ready: %s workers x %s threads, timeout=%ss, keepalive=%ss",
+        workers, threads, timeout, keepalive,
+    )
+
+
+def worker_int(worker):
+    worker.log.info("Worker %s interrupted, finishing in-flight requests", worker.pid)
+
+
+def worker_exit(server, worker):
+    # Fold the store journal into the pickle snapshots so tools that read
+    # vector_db.pkl / ideas_db.pkl directly see every saved idea
+    from wsgi import shutdown
+    shutdown()
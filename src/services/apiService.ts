@@ -301,7 +301,9 @@ export async function clearChatHistory(ideaId: string): Promise<void> {
 
 export async function getAllIdeas(): Promise<Idea[]> {
   try {
-    const response = await fetch(`${BACKEND_URL}/get_all_ideas`, {
+    // Embeddings are stored apart from the ideas; ask for them explicitly
+    // (related-idea search and graph similarity need them)
+    const response = await fetch(`${BACKEND_URL}/get_all_ideas?include_embeddings=true`, {
       method: "GET",
       // Don't set Content-Type for GET requests to avoid CORS preflight
     });
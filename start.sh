@@ -15,4 +15,4 @@ mkdir -p /app/backend/data
 
 # 启动应用
 echo "🌐 Starting server on port 7860..."
-python app.py
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py wsgi:app
\ No newline at end of file
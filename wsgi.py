@@ -0,0 +1,13 @@
+# 生产环境 WSGI 入口文件
+# gunicorn -c gunicorn.conf.py wsgi:app
+
+import os
+import sys
+
+# 添加 backend 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app import app, preload, shutdown  # noqa: F401
+
+# 在 fork worker 之前加载数据（gunicorn preload_app=True 时只在主进程执行一次）
+preload()